@@ -0,0 +1 @@
+"""Benchmarks for the budget tracker at scale: python -m benchmarks --help"""
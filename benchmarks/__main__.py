@@ -0,0 +1,108 @@
+"""Runs the benchmark cases over synthetic data of each size and reports the results as JSON.
+
+    python -m benchmarks --sizes 10000 1000000 --output results.json
+
+Data sets are generated once into --work-dir and reused. Each case runs in a fresh process on a fresh copy of the
+data; its time is the best of --repeat runs after the untimed setup, and its memory the process's peak resident size.
+The desktop-app cases need a display: the current one, or Xvfb if it is installed; without either they are skipped."""
+import argparse
+import json
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+from .cases import CASES, GUI_CASES, JSON_ONLY
+from .generate import generate
+
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+XVFB_DISPLAY = ":99"
+
+def prepare_data(work_dir, size, backend, options):
+    """Directory holding the data set of the given size for the backend, creating it on first use."""
+    json_dir = os.path.join(work_dir, f"{size}-json")
+    if not os.path.exists(os.path.join(json_dir, "finances_data.json")):
+        os.makedirs(json_dir, exist_ok=True)
+        generate(json_dir, size, options.accounts, options.categories, options.loans, options.seed)
+    if backend == 'json': return json_dir
+    backend_dir = os.path.join(work_dir, f"{size}-{backend}")
+    if not os.path.exists(backend_dir): # Migrates the JSON data once, outside the timings
+        shutil.copytree(json_dir, backend_dir + ".tmp")
+        subprocess.run([sys.executable, "-c", f"from budget_tracker.core import open_storage; open_storage({backend!r}).close()"],
+                       cwd=backend_dir + ".tmp", env=child_env(backend), check=True)
+        os.replace(backend_dir + ".tmp", backend_dir)
+    return backend_dir
+
+def child_env(backend, display=None):
+    env = dict(os.environ, PYTHONPATH=os.pathsep.join(filter(None, [REPO_DIR, os.environ.get('PYTHONPATH')])),
+               BUDGET_TRACKER_STORAGE=backend)
+    if display: env['DISPLAY'] = display
+    return env
+
+def start_display(mode):
+    """Returns (display, Xvfb process or None); display is None when there is none to use."""
+    if os.environ.get('DISPLAY') and mode != 'xvfb': return os.environ['DISPLAY'], None
+    if mode == 'no' or not shutil.which('Xvfb'): return None, None
+    xvfb = subprocess.Popen(['Xvfb', XVFB_DISPLAY, '-screen', '0', '1280x1024x24'], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    time.sleep(1) # Lets the server start listening
+    return XVFB_DISPLAY, xvfb
+
+def run_case(name, backend, size, data_dir, repeat, display):
+    result = {'case': name, 'backend': backend, 'transactions': size}
+    if name in GUI_CASES and not display: return dict(result, skipped="no display")
+    with tempfile.TemporaryDirectory(prefix="budget-bench-") as run_dir:
+        for entry in os.listdir(data_dir): shutil.copy2(os.path.join(data_dir, entry), run_dir)
+        child = subprocess.run([sys.executable, "-m", "benchmarks.cases", name, backend, str(repeat)], cwd=run_dir,
+                               env=child_env(backend, display), capture_output=True, text=True)
+    if child.returncode != 0:
+        return dict(result, error=(child.stderr.strip().splitlines() or ["exit status %d" % child.returncode])[-1])
+    timing = json.loads(child.stdout.strip().splitlines()[-1])
+    result.update(timing, rows_per_second=round(size / timing['seconds']) if timing['seconds'] else None)
+    return result
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmarks", description="Time loading, saving, filtering and page refreshes at scale.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000], help="Transaction counts (default: 10000 100000)")
+    parser.add_argument('--backends', nargs='+', choices=('json', 'sqlite'), default=['json', 'sqlite'])
+    parser.add_argument('--cases', nargs='+', choices=sorted(CASES), default=list(CASES))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--accounts', type=int, default=3)
+    parser.add_argument('--categories', type=int, default=12)
+    parser.add_argument('--loans', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--work-dir', default=os.path.join(tempfile.gettempdir(), "budget-tracker-bench"),
+                        help="Where generated data sets are kept between runs")
+    parser.add_argument('--display', choices=('auto', 'xvfb', 'no'), default='auto',
+                        help="auto: the current display, else Xvfb; xvfb: always Xvfb; no: skip the desktop-app cases")
+    parser.add_argument('--output', help="File for the JSON report (default: standard output)")
+    args = parser.parse_args(argv)
+
+    display, xvfb = start_display(args.display) if GUI_CASES & set(args.cases) else (None, None)
+    report = {'started': datetime.now().isoformat(timespec='seconds'), 'python': platform.python_version(),
+              'platform': platform.platform(), 'processor': platform.processor() or platform.machine(),
+              'cpu_count': os.cpu_count(), 'repeat': args.repeat, 'results': []}
+    try:
+        for size in args.sizes:
+            for backend in args.backends:
+                cases = [name for name in args.cases if backend == 'json' or name not in JSON_ONLY]
+                if not cases: continue
+                data_dir = prepare_data(args.work_dir, size, backend, args)
+                for name in cases:
+                    result = run_case(name, backend, size, data_dir, args.repeat, display)
+                    report['results'].append(result)
+                    print(f"{size:>10,} {backend:<7} {name:<18} " + (f"{result['seconds']:.4f}s" if 'seconds' in result
+                          else result.get('skipped') or f"error: {result['error']}"), file=sys.stderr)
+    finally:
+        if xvfb: xvfb.terminate()
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f: f.write(text + "\n")
+    else: print(text)
+
+if __name__ == "__main__":
+    main()
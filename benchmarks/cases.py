@@ -0,0 +1,226 @@
+"""The timed cases. Each runs in its own process, in a directory holding a copy of the data, so one case's caches and
+memory don't affect the next: python -m benchmarks.cases CASE BACKEND REPEAT prints one line of JSON."""
+import asyncio
+import http.client
+import json
+import sys
+import threading
+import time
+
+try: import resource
+except ImportError: resource = None # Not on Windows; peak memory isn't reported there
+
+from budget_tracker.api import ApiServer
+from budget_tracker.core import Ledger, cash_flow, convert_snapshot, load_data, months_back, open_storage, save_data, spending_trend
+
+CASES = {}
+GUI_CASES = {'dashboard_refresh', 'expenses_filter', 'populate_tree'} # Need a display
+JSON_ONLY = {'load_data', 'save_data', 'load_binary', 'save_binary', 'open_binary'} # The snapshot files, the same for every backend
+
+def case(name):
+    """Registers a case. The function does the untimed setup and returns the function to time."""
+    def register(function):
+        CASES[name] = function
+        return function
+    return register
+
+def open_ledger(backend):
+    storage = open_storage(backend)
+    storage.load_pending(wait=True)
+    return Ledger(storage)
+
+@case('load_data')
+def setup_load_data(backend):
+    return load_data
+
+@case('save_data')
+def setup_save_data(backend):
+    data = load_data()
+    return lambda: save_data(data)
+
+@case('load_binary')
+def setup_load_binary(backend):
+    convert_snapshot(True)
+    return load_data
+
+@case('save_binary')
+def setup_save_binary(backend):
+    convert_snapshot(True)
+    data = load_data()
+    return lambda: save_data(data)
+
+@case('open_binary')
+def setup_open_binary(backend):
+    """open_storage reading the binary snapshot in batches."""
+    convert_snapshot(True)
+    return lambda: open_ledger('json')
+
+@case('open_storage')
+def setup_open_storage(backend):
+    """Opening and reading everything, as the app's loader thread does."""
+    return lambda: open_ledger(backend)
+
+@case('commit')
+def setup_commit(backend):
+    """Adding one payment and writing it, the cost every change in the app pays."""
+    ledger = open_ledger(backend)
+    account, category = ledger.data['accounts'][0]['name'], ledger.data['categories'][0]
+    def run():
+        ledger.commit(*ledger.add_payment("2025-12-31", 1.0, category, account, "benchmark"))
+        ledger.storage.writer.flush()
+    return run
+
+@case('budget_report')
+def setup_budget_report(backend):
+    """The Dashboard's numbers for the newest month."""
+    ledger = open_ledger(backend)
+    return lambda: ledger.budget_report(2025, 12)
+
+@case('reports')
+def setup_reports(backend):
+    """Five years of spending by category and by account, and the cash flow, as the Reports page shows them."""
+    ledger = open_ledger(backend)
+    ledger.balance_history()
+    months = months_back(2025, 12, 60)
+    def run():
+        spending_trend(ledger.storage, months, 'category'); spending_trend(ledger.storage, months, 'account')
+        cash_flow(ledger, months)
+    return run
+
+@case('balance_history')
+def setup_balance_history(backend):
+    """Building every account's balance history from the events and payments, as the first balance query does."""
+    ledger = open_ledger(backend)
+    ledger.balance_history() # Records the generated accounts' opening balances
+    def run():
+        ledger.history = None
+        ledger.balance_history()
+    return run
+
+@case('balance_as_of')
+def setup_balance_as_of(backend):
+    """A balance on each day of the last year, for every account."""
+    ledger = open_ledger(backend)
+    ledger.balance_history()
+    days = [f"2025-{month:02d}-{day:02d}" for month in range(1, 13) for day in range(1, 29)]
+    names = [acc['name'] for acc in ledger.data['accounts']]
+    return lambda: [ledger.balance_as_of(name, day) for name in names for day in days]
+
+@case('check_integrity')
+def setup_check_integrity(backend):
+    ledger = open_ledger(backend)
+    ledger.balance_history()
+    return ledger.check_integrity
+
+@case('upcoming_payments')
+def setup_upcoming_payments(backend):
+    """A year of occurrences of 100 recurring payments that have run for five years, as the Recurring page lists them."""
+    ledger = open_ledger(backend)
+    account, frequencies = ledger.data['accounts'][0]['name'], ('daily', 'weekly', 'monthly', 'yearly')
+    for i in range(100):
+        ledger.add_recurring(f"2021-01-{i % 28 + 1:02d}", 10.0, ledger.data['categories'][0], account, frequencies[i % 4], i % 3 + 1)
+    return lambda: ledger.upcoming_payments("2025-01-01", "2025-12-31")
+
+@case('loan_projections')
+def setup_loan_projections(backend):
+    """Payoff dates and interest of every loan, and the same with 100 more a month, worked out afresh."""
+    ledger = open_ledger(backend)
+    for loan in ledger.data['loans']: ledger.edit_loan(loan['name'], loan['name'], loan['total_amount'], 6.0, 240)
+    def run():
+        ledger.projections.clear()
+        ledger.loan_projections(); ledger.loan_projections(100.0)
+    return run
+
+@case('api_requests')
+def setup_api_requests(backend):
+    """1000 requests over one keep-alive connection to the local API: accounts, the newest page of transactions, the summary."""
+    server, ready = ApiServer(open_ledger(backend)), threading.Event()
+    ports = []
+    threading.Thread(target=lambda: asyncio.run(server.serve("127.0.0.1", 0, lambda port: (ports.append(port), ready.set()))), daemon=True).start()
+    ready.wait()
+    connection = http.client.HTTPConnection("127.0.0.1", ports[0])
+    paths = ("/accounts", "/transactions?limit=50", "/summary?month=2025-12")
+    def run():
+        for i in range(1000):
+            connection.request("GET", paths[i % 3])
+            connection.getresponse().read()
+    return run
+
+@case('find_all')
+def setup_find_all(backend):
+    storage = open_ledger(backend).storage
+    return lambda: len(storage.find_transactions())
+
+@case('find_text')
+def setup_find_text(backend):
+    storage = open_ledger(backend).storage
+    return lambda: len(storage.find_transactions(text="coffee gro"))
+
+@case('find_range')
+def setup_find_range(backend):
+    storage = open_ledger(backend).storage
+    return lambda: len(storage.find_transactions(date_from="2025-06-01", date_to="2025-06-30", amount_min=50))
+
+@case('find_category')
+def setup_find_category(backend):
+    storage = open_ledger(backend).storage
+    return lambda: len(storage.find_transactions(category="Category 1", sort_by='amount'))
+
+def start_app():
+    """The desktop app, loaded and showing the Dashboard."""
+    import main
+    app = main.BudgetApp()
+    while app.ledger is None or app.storage.loading:
+        app.update()
+        time.sleep(0.01)
+    app.update()
+    return main, app
+
+@case('dashboard_refresh')
+def setup_dashboard_refresh(backend):
+    main, app = start_app()
+    frame = app.frames[main.DashboardFrame]
+    def run():
+        frame.refresh_data()
+        app.update_idletasks()
+    return run
+
+@case('expenses_filter')
+def setup_expenses_filter(backend):
+    main, app = start_app()
+    app.show_frame(main.ExpensesFrame)
+    frame = app.frames[main.ExpensesFrame]
+    frame.filter_desc_entry.insert(0, "coffee")
+    def run():
+        frame.active_filter = {}
+        frame.filter_transactions()
+        app.update_idletasks()
+    return run
+
+@case('populate_tree')
+def setup_populate_tree(backend):
+    main, app = start_app()
+    app.show_frame(main.ExpensesFrame)
+    frame = app.frames[main.ExpensesFrame]
+    storage = app.storage
+    def run():
+        frame.populate_tree(storage.find_transactions())
+        app.update_idletasks()
+    return run
+
+def peak_memory_mb():
+    if resource is None: return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1 << 20 if sys.platform == 'darwin' else 1 << 10), 1) # Bytes on macOS, KiB elsewhere
+
+def run_case(name, backend, repeat):
+    run = CASES[name](backend)
+    times = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        run()
+        times.append(time.perf_counter() - started)
+    return {'seconds': min(times), 'mean_seconds': sum(times) / len(times), 'peak_memory_mb': peak_memory_mb()}
+
+if __name__ == "__main__":
+    print(json.dumps(run_case(sys.argv[1], sys.argv[2], int(sys.argv[3]))))
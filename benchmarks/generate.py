@@ -0,0 +1,71 @@
+"""Synthetic Finances data: python -m benchmarks.generate DIR --transactions 1000000
+
+The snapshot is written the way save_data() writes one (settings first, transactions newest first) but one
+transaction at a time, so ten million transactions need no more memory than ten."""
+import argparse
+import json
+import math
+import os
+import random
+from datetime import date, timedelta
+
+WORDS = ("coffee", "grocery", "market", "fuel", "station", "rent", "online", "store", "pharmacy", "cinema", "taxi",
+         "restaurant", "bakery", "electric", "water", "internet", "gym", "books", "hardware", "insurance")
+
+def loan_payments(loan_names, count, seed):
+    """The loan and amount of each of count loan payments, newest first; the same ones every time for the same seed."""
+    rng = random.Random(f"loans {seed}")
+    for _ in range(count): yield rng.choice(loan_names), round(rng.uniform(1, 250), 2)
+
+def generate(directory, transactions=10000, accounts=3, categories=12, loans=2, seed=1, end=date(2025, 12, 31), years=5):
+    """Writes finances_data.json into directory. Transactions are spread evenly over the years up to end,
+    with a loan payment every twentieth. Each loan's principal is at least 50,000 and a quarter more than its payments,
+    and its remaining balance is what they leave, so the data passes 'check'. Returns the path written."""
+    rng = random.Random(seed)
+    per_day = max(1, transactions // (365 * years))
+    account_names = [f"Account {i + 1}" for i in range(accounts)]
+    category_names = [f"Category {i + 1}" for i in range(categories)]
+    loan_names = [f"Loan {i + 1}" for i in range(loans)]
+    paid = dict.fromkeys(loan_names, 0.0)
+    for name, amount in loan_payments(loan_names, transactions // 20 if loan_names else 0, seed): paid[name] += amount
+    principals = {name: max(50000, math.ceil(paid[name] * 1.25 / 1000) * 1000) for name in loan_names}
+    settings = {
+        'accounts': [{'name': name, 'balance': round(rng.uniform(1000, 100000), 2)} for name in account_names],
+        'categories': category_names,
+        'budgets': {name: rng.choice((100, 250, 500, 1000)) for name in category_names[::2]},
+        'loans': [{'name': name, 'total_amount': principals[name], 'remaining_balance': round(principals[name] - paid[name], 2)}
+                  for name in loan_names],
+        'theme': 'light',
+        'journal_seq': 0,
+        'next_transaction_id': transactions + 1,
+    }
+    path = os.path.join(directory, "finances_data.json")
+    with open(path, 'w') as f:
+        f.write(json.dumps(settings, indent=4)[:-2] + ',\n    "transactions": [')
+        day, payments = end, loan_payments(loan_names, transactions // 20 if loan_names else 0, seed)
+        for trans_id in range(transactions, 0, -1): # Newest first, so ids fall with the dates
+            if trans_id % per_day == 0: day -= timedelta(days=1)
+            if loan_names and trans_id % 20 == 0: loan, amount = next(payments); category = f"Loan: {loan}"
+            else: category, amount = rng.choice(category_names), round(rng.uniform(1, 250), 2)
+            trans = {'id': trans_id, 'date': day.isoformat(),
+                     'description': f"{rng.choice(WORDS)} {rng.choice(WORDS)} {rng.randint(1, 9999)}",
+                     'amount': amount, 'category': category, 'account_name': rng.choice(account_names)}
+            f.write(("\n        " if trans_id == transactions else ",\n        ") + json.dumps(trans))
+        f.write("\n    ]\n}")
+    return path
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(prog="benchmarks.generate", description="Write a synthetic finances_data.json.")
+    parser.add_argument('directory')
+    parser.add_argument('--transactions', type=int, default=10000)
+    parser.add_argument('--accounts', type=int, default=3)
+    parser.add_argument('--categories', type=int, default=12)
+    parser.add_argument('--loans', type=int, default=2)
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--years', type=int, default=5, help="Years of history the transactions are spread over")
+    args = parser.parse_args(argv)
+    os.makedirs(args.directory, exist_ok=True)
+    print(generate(args.directory, args.transactions, args.accounts, args.categories, args.loans, args.seed, years=args.years))
+
+if __name__ == "__main__":
+    main()
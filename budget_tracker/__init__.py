@@ -0,0 +1 @@
+"""Budget tracker: the core ledger library, its command line interface, and (in main.py) the desktop app."""
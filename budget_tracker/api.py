@@ -0,0 +1,348 @@
+"""Local HTTP/JSON API over the ledger, so scripts and other machines can read and change the data while the app runs.
+
+    python -m budget_tracker serve --port 8765             (headless)
+    python main.py --api-port 8765                         (alongside the desktop app)
+
+One asyncio event loop serves every connection (HTTP/1.1 with keep-alive). Reads are answered straight from the
+ledger. Changes go through one queue, applied in order by a single worker that takes whatever has queued up and
+saves it with one commit, so concurrent writers never interleave and a burst of writes costs one save.
+When the desktop app owns the ledger, each read and each batch of changes runs on the Tk thread instead (see TkBridge).
+
+Endpoints (bodies and responses are JSON; errors are {"error": message} with a 4xx status):
+    GET    /accounts                      GET  /accounts/<name>/balance?as_of=YYYY-MM-DD
+    POST   /accounts {name, balance}      POST /accounts/<name>/funds {amount, date?}
+    POST   /transfers {from, to, amount, date?}
+    GET    /transactions?category=&text=&from=&to=&min=&max=&limit=&after=
+           newest first, at most limit (default 100, up to 1000) a page; pass the response's "next" as after= for the next
+    GET    /transactions/<id>             POST /transactions {date, amount, category, account, description?}
+    PUT    /transactions/<id> {...}       DELETE /transactions/<id>
+    GET    /loans                         GET  /budgets        PUT /budgets {category: amount or null}
+    GET    /summary?month=YYYY-MM         the Dashboard's numbers for the month"""
+import asyncio
+import hmac
+import json
+import queue
+import re
+from concurrent.futures import Future
+from datetime import datetime
+from urllib.parse import parse_qsl, unquote, urlsplit
+
+from .core import InsufficientFunds, LedgerError
+
+DEFAULT_PORT = 8765
+PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+MAX_BODY = 1 << 20
+MUTATION_BATCH = 256 # Most changes applied under one commit
+SYNC_SECONDS = 1.0 # How often a headless server takes in changes other copies of the app saved
+REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 401: "Unauthorized", 404: "Not Found", 405: "Method Not Allowed",
+           409: "Conflict", 413: "Payload Too Large", 500: "Internal Server Error"}
+
+class ApiError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+def route(method, pattern):
+    """Marks an ApiServer method as the handler of method requests to paths matching pattern."""
+    def mark(handler):
+        handler.route = method, re.compile(pattern + "$")
+        return handler
+    return mark
+
+def number(value, name):
+    try: return float(value)
+    except (TypeError, ValueError): raise ApiError(400, f"'{name}' must be a number.") from None
+
+def field(body, name, default=None, required=True):
+    if name in body: return body[name]
+    if required and default is None: raise ApiError(400, f"'{name}' is required.")
+    return default
+
+def text(body, name, default=None, required=True):
+    """field() for a string, so a body of the wrong shape is a 400 rather than a failure inside the ledger."""
+    value = field(body, name, default, required)
+    if not isinstance(value, str) and (value is not None or required): raise ApiError(400, f"'{name}' must be a string.")
+    return value
+
+def transaction_json(trans):
+    return {key: trans[key] for key in ('id', 'date', 'description', 'amount', 'category', 'account_name')}
+
+async def run_here(function):
+    return function()
+
+class ApiServer:
+    """The API over ledger. run_in_owner(function) is a coroutine function that runs function where the ledger may be
+    touched and returns its result; commit(collections) saves a batch of changes. Both default to doing it right here.
+    sync_every, in seconds, has the server take in what other copies of the app saved; the desktop app does that itself."""
+    def __init__(self, ledger, run_in_owner=run_here, commit=None, token=None, sync_every=None):
+        self.ledger = ledger
+        self.run_in_owner = run_in_owner
+        self.commit = commit or (lambda collections: ledger.commit(*collections))
+        self.token = token
+        self.sync_every = sync_every
+        self.routes = [getattr(self, name) for name in dir(self) if hasattr(getattr(self, name), 'route')]
+        self.mutations = None
+        self.server = None
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self.mutations = asyncio.Queue()
+        self.worker = asyncio.create_task(self.apply_mutations())
+        self.syncer = asyncio.create_task(self.keep_synced()) if self.sync_every else None
+        self.server = await asyncio.start_server(self.handle_connection, host, port)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def serve(self, host="127.0.0.1", port=DEFAULT_PORT, started=None):
+        """Serves until cancelled. started(port), if given, is called once connections are being accepted."""
+        port = await self.start(host, port)
+        if started: started(port)
+        try:
+            async with self.server: await self.server.serve_forever()
+        finally:
+            self.worker.cancel()
+            if self.syncer: self.syncer.cancel()
+
+    # --- HTTP ---
+    async def handle_connection(self, reader, writer):
+        try:
+            while True:
+                try: head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, asyncio.LimitOverrunError, ConnectionError): break
+                request_line, *header_lines = head.decode('latin-1').rstrip("\r\n").split("\r\n")
+                try: method, target, version = request_line.split(" ", 2)
+                except ValueError: break
+                headers = {}
+                for line in header_lines:
+                    name, _, value = line.partition(":")
+                    headers[name.strip().lower()] = value.strip()
+                try: length = int(headers.get('content-length') or 0)
+                except ValueError: await self.respond(writer, 400, {"error": "Bad Content-Length."}, False); break
+                if length > MAX_BODY: await self.respond(writer, 413, {"error": "Request body too large."}, False); break
+                body = await reader.readexactly(length) if length else b""
+                keep_alive = headers.get('connection', '').lower() != 'close' if version == "HTTP/1.1" else \
+                             headers.get('connection', '').lower() == 'keep-alive'
+                status, payload = await self.dispatch(method, target, body, headers)
+                await self.respond(writer, status, payload, keep_alive)
+                if not keep_alive: break
+        except (asyncio.IncompleteReadError, ConnectionError): pass
+        finally:
+            writer.close()
+
+    async def respond(self, writer, status, payload, keep_alive):
+        data = json.dumps(payload).encode()
+        head = f"HTTP/1.1 {status} {REASONS[status]}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+        if not keep_alive: head += "Connection: close\r\n"
+        writer.write((head + "\r\n").encode() + data)
+        await writer.drain()
+
+    async def dispatch(self, method, target, body, headers):
+        """(status, JSON-able payload) for one request."""
+        if self.token and not hmac.compare_digest(headers.get('authorization', '').encode(), f"Bearer {self.token}".encode()):
+            return 401, {"error": "Missing or wrong API token."}
+        url = urlsplit(target)
+        path_matched = False
+        for handler in self.routes:
+            handler_method, pattern = handler.route
+            match = pattern.match(url.path)
+            if not match: continue
+            path_matched = True
+            if handler_method != method: continue
+            try:
+                request = json.loads(body) if body else {}
+                if not isinstance(request, dict): raise ApiError(400, "The request body must be a JSON object.")
+                query = dict(parse_qsl(url.query))
+                return await handler(*map(unquote, match.groups()), query=query, body=request)
+            except ApiError as e: return e.status, {"error": str(e)}
+            except InsufficientFunds as e: return 409, {"error": str(e)}
+            except LedgerError as e: return 400, {"error": str(e)}
+            except json.JSONDecodeError: return 400, {"error": "The request body is not valid JSON."}
+            except Exception as e:
+                print(f"Warning: API request {method} {url.path} failed: {e!r}")
+                return 500, {"error": "The request failed; see the server's output."}
+        return (405, {"error": f"{method} is not allowed here."}) if path_matched else (404, {"error": "No such endpoint."})
+
+    async def read(self, function):
+        return 200, await self.run_in_owner(function)
+
+    async def mutate(self, change, status=200):
+        """Queues change, a function returning (collections changed, response), behind the others; waits for it to be applied."""
+        future = asyncio.get_running_loop().create_future()
+        self.mutations.put_nowait((change, future))
+        return status, await future
+
+    async def apply_mutations(self):
+        while True:
+            batch = [await self.mutations.get()]
+            while len(batch) < MUTATION_BATCH and not self.mutations.empty(): batch.append(self.mutations.get_nowait())
+            try: outcomes = await self.run_in_owner(lambda: self.apply_batch([change for change, _ in batch]))
+            except Exception as e: outcomes = [(False, e)] * len(batch)
+            for (_, future), (ok, value) in zip(batch, outcomes):
+                if future.done(): continue # The client went away
+                if ok: future.set_result(value)
+                else: future.set_exception(value)
+
+    async def keep_synced(self):
+        while True:
+            await asyncio.sleep(self.sync_every)
+            try: result = await self.run_in_owner(self.ledger.sync)
+            except Exception as e: print(f"Warning: could not take in changes saved elsewhere: {e!r}"); continue
+            for change in result.overridden: print(f"Warning: {change} was changed elsewhere at the same time; that version was kept.")
+
+    def apply_batch(self, changes):
+        """Runs where the ledger lives: applies each change in order and commits everything they touched once, whichever
+        changes failed."""
+        outcomes, changed = [], set()
+        for change in changes:
+            try:
+                collections, response = change()
+                changed.update(collections)
+                outcomes.append((True, response))
+            except (ApiError, LedgerError) as e: outcomes.append((False, e))
+            except Exception as e: # A bug fails only its own change; the ones applied before it must still be saved
+                print(f"Warning: API change failed: {e!r}")
+                outcomes.append((False, e))
+        if changed: self.commit(tuple(changed))
+        return outcomes
+
+    # --- Accounts ---
+    @route('GET', r"/accounts")
+    async def get_accounts(self, query, body):
+        return await self.read(lambda: [{"name": acc['name'], "balance": acc['balance']} for acc in self.ledger.data['accounts']])
+
+    @route('GET', r"/accounts/([^/]+)/balance")
+    async def get_balance(self, name, query, body):
+        as_of = query.get('as_of') or datetime.now().strftime("%Y-%m-%d")
+        return await self.read(lambda: {"account": name, "as_of": as_of, "balance": self.ledger.balance_as_of(name, as_of)})
+
+    @route('POST', r"/accounts")
+    async def post_account(self, query, body):
+        name, balance = text(body, 'name'), number(field(body, 'balance', 0.0), 'balance')
+        return await self.mutate(lambda: (self.ledger.add_account(name, balance), {"name": name.strip(), "balance": balance}), 201)
+
+    @route('POST', r"/accounts/([^/]+)/funds")
+    async def post_funds(self, name, query, body):
+        amount, on = number(field(body, 'amount'), 'amount'), text(body, 'date', required=False)
+        def change():
+            changed = self.ledger.add_funds(name, amount, on)
+            return changed, {"name": name, "balance": self.ledger.account(name)['balance']}
+        return await self.mutate(change)
+
+    @route('POST', r"/transfers")
+    async def post_transfer(self, query, body):
+        from_name, to_name = text(body, 'from'), text(body, 'to')
+        amount, on = number(field(body, 'amount'), 'amount'), text(body, 'date', required=False)
+        def change():
+            changed = self.ledger.transfer(from_name, to_name, amount, on)
+            return changed, {name: self.ledger.account(name)['balance'] for name in (from_name, to_name)}
+        return await self.mutate(change)
+
+    # --- Transactions ---
+    @route('GET', r"/transactions")
+    async def get_transactions(self, query, body):
+        try: limit = min(int(query.get('limit', PAGE_SIZE)), MAX_PAGE_SIZE)
+        except ValueError: raise ApiError(400, "'limit' must be a whole number.") from None
+        if limit < 1: raise ApiError(400, "'limit' must be 1 or more.")
+        after = None
+        if query.get('after'):
+            after_date, _, after_id = query['after'].rpartition("_")
+            try: after = after_date, int(after_id)
+            except ValueError: raise ApiError(400, "'after' is not a cursor from a previous page.") from None
+        amount_min = number(query['min'], 'min') if 'min' in query else None
+        amount_max = number(query['max'], 'max') if 'max' in query else None
+
+        def page():
+            rows = self.ledger.storage.transactions_page(limit + 1, after, query.get('category'), query.get('text'), query.get('from'),
+                                                         query.get('to'), amount_min, amount_max)
+            more = len(rows) > limit
+            rows = [transaction_json(t) for t in rows[:limit]]
+            return {"transactions": rows, "next": f"{rows[-1]['date']}_{rows[-1]['id']}" if more else None}
+        return await self.read(page)
+
+    @route('GET', r"/transactions/(\d+)")
+    async def get_transaction(self, trans_id, query, body):
+        trans = await self.run_in_owner(lambda: self.ledger.storage.get_transaction(int(trans_id)))
+        if not trans: raise ApiError(404, "Transaction not found.")
+        return 200, transaction_json(trans)
+
+    def payment_fields(self, body):
+        return (text(body, 'date'), number(field(body, 'amount'), 'amount'), text(body, 'category'), text(body, 'account'),
+                text(body, 'description', required=False) or "N/A")
+
+    @route('POST', r"/transactions")
+    async def post_transaction(self, query, body):
+        date, amount, category, account_name, description = self.payment_fields(body)
+        def change():
+            self.ledger.validate_payment(date, amount, category, account_name)
+            trans = {"date": date, "description": description, "amount": amount, "category": category, "account_name": account_name}
+            return self.ledger.post_payments([trans]), transaction_json(trans)
+        return await self.mutate(change, 201)
+
+    @route('PUT', r"/transactions/(\d+)")
+    async def put_transaction(self, trans_id, query, body):
+        date, amount, category, account_name, description = self.payment_fields(body)
+        def change():
+            if not self.ledger.storage.get_transaction(int(trans_id)): raise ApiError(404, "Transaction not found.")
+            changed = self.ledger.edit_payment(int(trans_id), date, amount, category, account_name, description)
+            return changed, transaction_json(self.ledger.storage.get_transaction(int(trans_id)))
+        return await self.mutate(change)
+
+    @route('DELETE', r"/transactions/(\d+)")
+    async def delete_transaction(self, trans_id, query, body):
+        def change():
+            if not self.ledger.storage.get_transaction(int(trans_id)): raise ApiError(404, "Transaction not found.")
+            return self.ledger.delete_payment(int(trans_id)), {"deleted": int(trans_id)}
+        return await self.mutate(change)
+
+    # --- Loans, budgets, summary ---
+    @route('GET', r"/loans")
+    async def get_loans(self, query, body):
+        def loans():
+            projections = self.ledger.loan_projections()
+            return [dict(loan, payoff=projections[loan['name']] and projections[loan['name']].payoff,
+                         interest_left=projections[loan['name']] and projections[loan['name']].interest)
+                    for loan in self.ledger.data['loans']]
+        return await self.read(loans)
+
+    @route('GET', r"/budgets")
+    async def get_budgets(self, query, body):
+        return await self.read(lambda: dict(self.ledger.data['budgets']))
+
+    @route('PUT', r"/budgets")
+    async def put_budgets(self, query, body):
+        budgets = {category: None if amount is None else number(amount, category) for category, amount in body.items()}
+        return await self.mutate(lambda: (self.ledger.set_budgets(budgets), dict(self.ledger.data['budgets'])))
+
+    @route('GET', r"/summary")
+    async def get_summary(self, query, body):
+        try: month = datetime.strptime(query['month'], "%Y-%m") if 'month' in query else datetime.now()
+        except ValueError: raise ApiError(400, "'month' must be YYYY-MM.") from None
+        def summary():
+            ledger = self.ledger
+            return {"month": f"{month:%Y-%m}",
+                    "accounts": [{"name": acc['name'], "balance": acc['balance']} for acc in ledger.data['accounts']],
+                    "total_balance": ledger.total_balance(), "total_debt": ledger.total_debt(),
+                    "debt_free": ledger.debt_free_month(),
+                    "budgets": [{"category": category, "spent": spent, "budget": budget, "percent": percent}
+                                for category, spent, budget, percent in ledger.budget_report(month.year, month.month)]}
+        return await self.read(summary)
+
+class TkBridge:
+    """Runs functions for the API's event loop thread on the Tk thread, which owns the ledger in the desktop app.
+    The Tk side calls poll() from after(); run_in_owner is the ApiServer's hook."""
+    def __init__(self):
+        self.calls = queue.SimpleQueue()
+
+    async def run_in_owner(self, function):
+        future = Future()
+        self.calls.put((function, future))
+        return await asyncio.wrap_future(future)
+
+    def poll(self):
+        """Runs every call waiting; returns how many there were."""
+        count = 0
+        while True:
+            try: function, future = self.calls.get_nowait()
+            except queue.Empty: return count
+            count += 1
+            try: future.set_result(function())
+            except Exception as e: future.set_exception(e)
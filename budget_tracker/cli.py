@@ -0,0 +1,315 @@
+"""Command line interface to the ledger: python -m budget_tracker <command> ..."""
+import argparse
+import asyncio
+import os
+import sys
+from datetime import date, datetime, timedelta
+from itertools import islice
+
+from .api import DEFAULT_PORT, SYNC_SECONDS, ApiServer
+from .core import instrumentation
+from .core import (FREQUENCIES, Ledger, LedgerError, StatementError, cash_flow, convert_snapshot, export_budget_report, export_columnar,
+                   export_csv, frequency_text, months_back, next_due, read_statement, spending_trend)
+
+def month_arg(text):
+    return datetime.strptime(text, "%Y-%m").date()
+
+def date_arg(text):
+    datetime.strptime(text, "%Y-%m-%d")
+    return text
+
+def show_summary(ledger, args):
+    month = args.month or date.today()
+    print("Accounts:")
+    for acc in ledger.data['accounts']: print(f"  {acc['name']}: {acc.get('balance', 0):,.2f}")
+    print(f"  Total Balance: {ledger.total_balance():,.2f}")
+    print("Loans:")
+    for loan in ledger.data['loans']: print(f"  {loan['name']}: {loan.get('remaining_balance', 0):,.2f}")
+    print(f"  Total Owed: {ledger.total_debt():,.2f}")
+    print(f"Budgets for {month:%B %Y}:")
+    for category, spent, budget, percentage in ledger.budget_report(month.year, month.month):
+        print(f"  {category}: Spent {spent:,.2f} of {budget:,.2f} ({percentage:.0f}%)")
+
+def show_report(ledger, args):
+    end = args.month or date.today()
+    months = months_back(end.year, end.month, args.months)
+    print("\t".join((args.by.capitalize(), *months, "Total")))
+    for name, totals in sorted(spending_trend(ledger.storage, months, args.by).items()):
+        print("\t".join((name, *(f"{total:.2f}" for total in totals), f"{sum(totals):.2f}")))
+    print("\nMonth\tAdded\tSpent\tNet\tBalance at month end")
+    for month, added, spent, net, balance in cash_flow(ledger, months):
+        print(f"{month}\t{added:.2f}\t{spent:.2f}\t{net:.2f}\t{balance:.2f}")
+
+def show_balance(ledger, args):
+    as_of = args.as_of or date.today().isoformat()
+    print(f"{args.account} on {as_of}: {ledger.balance_as_of(args.account, as_of):,.2f}")
+
+def check_balances(ledger, args):
+    problems = ledger.check_integrity()
+    for problem in problems: print(problem)
+    if problems: raise LedgerError(f"{len(problems)} balance(s) do not match their history.")
+    print("All account and loan balances match their history.")
+
+def list_transactions(ledger, args):
+    found = ledger.storage.find_transactions(args.category, args.text, args.date_from, args.date_to, args.amount_min, args.amount_max,
+                                             args.sort, not args.ascending)
+    for trans in islice(found, args.limit or None):
+        print(f"{trans['id']}\t{trans['date']}\t{trans['amount']:.2f}\t{trans['category']}\t{trans['account_name']}\t{trans['description']}")
+    if args.limit and len(found) > args.limit: print(f"... {len(found) - args.limit:,} more", file=sys.stderr)
+
+def add_payment(ledger, args):
+    return ledger.add_payment(args.date, args.amount, args.category, args.account, args.description)
+
+def delete_payment(ledger, args):
+    return ledger.delete_payment(args.id)
+
+def add_funds(ledger, args):
+    return ledger.add_funds(args.account, args.amount, args.date)
+
+def transfer(ledger, args):
+    return ledger.transfer(args.from_account, args.to_account, args.amount, args.date)
+
+def show_loans(ledger, args):
+    print("Loan\tRemaining\tRate\tPayment\tPaid off\tInterest left")
+    for name, projection in ledger.loan_projections(args.extra).items():
+        loan = ledger.loan(name)
+        if projection is None: plan = "-\t-\t-"
+        elif projection.months is None: plan = f"{projection.payment:.2f}\tnever\t-"
+        else: plan = f"{projection.payment:.2f}\t{projection.payoff}\t{projection.interest:.2f}"
+        print(f"{name}\t{loan['remaining_balance']:.2f}\t{loan.get('rate', 0):.2f}%\t{plan}")
+    debt_free = ledger.debt_free_month(args.extra)
+    print(f"Debt-free by {debt_free}" if debt_free else "Some loans have no plan that pays them off.")
+
+def show_loan_schedule(ledger, args):
+    if ledger.loan_projection(args.loan) is None: raise LedgerError(f"Loan '{args.loan}' has no monthly payment set; see loan-plan.")
+    print("Month\tPayment\tInterest\tPrincipal\tBalance")
+    for row in ledger.loan_schedule(args.loan, args.extra): print(row[0] + "".join(f"\t{value:.2f}" for value in row[1:]))
+
+def set_loan_plan(ledger, args):
+    loan = ledger.loan(args.loan)
+    if args.rate is None and args.term is None and args.payment is None: raise LedgerError("Give --rate, --term or --payment.")
+    rate = loan.get('rate', 0.0) if args.rate is None else args.rate
+    if args.term is None and args.payment is None: term, payment = loan.get('term_months'), loan.get('payment')
+    else: term, payment = args.term, args.payment # Either one sets the payment, so a new one replaces both
+    return ledger.edit_loan(loan['name'], loan['name'], loan['total_amount'], rate, term, payment)
+
+def serve_api(ledger, args):
+    server = ApiServer(ledger, token=args.token or os.environ.get("BUDGET_TRACKER_API_TOKEN"), sync_every=args.sync_every or None)
+    started = lambda port: print(f"Serving the API on http://{args.host}:{port}/ (Ctrl+C stops it)", flush=True)
+    try: asyncio.run(server.serve(args.host, args.port, started))
+    except KeyboardInterrupt: pass
+    except OSError as e: raise LedgerError(f"Could not listen on {args.host}:{args.port}: {e.strerror}") from None
+
+def list_recurring(ledger, args):
+    for rule in ledger.data['recurring']:
+        due = next_due(rule)
+        print(f"{rule['id']}\t{rule['amount']:.2f}\t{rule['category']}\t{rule['account_name']}\t{frequency_text(rule)}"
+              f"\tnext {due.isoformat() if due else 'ended'}\t{rule['description']}")
+    today = date.today()
+    print(f"\nDue in the next {args.days} days:")
+    for day, rule in ledger.upcoming_payments(today.isoformat(), (today + timedelta(days=args.days)).isoformat()):
+        print(f"{day.isoformat()}\t{rule['amount']:.2f}\t{rule['category']}\t{rule['account_name']}\t{rule['description']}")
+
+def add_recurring(ledger, args):
+    return ledger.add_recurring(args.start, args.amount, args.category, args.account, args.frequency, args.every, args.until, args.description)
+
+def delete_recurring(ledger, args):
+    return ledger.delete_recurring(args.id)
+
+def post_due(ledger, args):
+    result = ledger.post_due_payments(args.today)
+    print(f"Posted {result.posted:,} recurring payments." + (f" {result.held:,} rule(s) held back: their account or loan is gone." if result.held else ""))
+    return result.changed
+
+def import_statement(ledger, args):
+    columns = {field: column for field, column in (('date', args.date_col), ('amount', args.amount_col), ('description', args.description_col),
+                                                   ('category', args.category_col), ('account_name', args.account_col)) if column}
+    try:
+        lines = read_statement(args.file, columns, args.date_format)
+        result = ledger.import_statement(lines, args.account, args.category, args.payments_positive)
+    except OSError as e: raise LedgerError(f"Could not read {args.file}: {e.strerror}") from None
+    except StatementError as e: raise LedgerError(f"{args.file}: {e}") from None
+    print(f"Imported {result.imported:,} payments; skipped {result.duplicates:,} already recorded and {result.skipped:,} incoming or zero amounts.")
+    return result.changed
+
+def export_transactions(ledger, args):
+    export_format = args.format or ('csv' if args.file.lower().endswith('.csv') else 'columnar')
+    export = export_csv if export_format == 'csv' else export_columnar
+    try: count = export(ledger.storage, args.file, args.category, args.date_from, args.date_to)
+    except OSError as e: raise LedgerError(f"Could not write {args.file}: {e.strerror}") from None
+    print(f"Exported {count:,} transactions to {args.file}.")
+
+def export_report(ledger, args):
+    first = args.from_month or date.today()
+    last = args.to_month or first
+    months = [(year, month) for year in range(first.year, last.year + 1) for month in range(1, 13)
+              if (first.year, first.month) <= (year, month) <= (last.year, last.month)]
+    try: count = export_budget_report(ledger, args.file, months)
+    except OSError as e: raise LedgerError(f"Could not write {args.file}: {e.strerror}") from None
+    print(f"Exported {count:,} budget rows for {len(months)} month(s) to {args.file}.")
+
+def convert_snapshot_file(ledger, args):
+    try: path = convert_snapshot(args.format == 'binary', args.output)
+    except FileNotFoundError as e: raise LedgerError(str(e)) from None
+    except ValueError as e: raise LedgerError(f"Could not convert: {e}") from None
+    except OSError as e: raise LedgerError(f"Could not write {args.output or 'the snapshot'}: {e.strerror}") from None
+    print(f"Wrote {path} ({os.path.getsize(path):,} bytes).")
+
+def build_parser():
+    parser = argparse.ArgumentParser(prog="budget_tracker", description="Work with the Finances data without the desktop app.")
+    parser.add_argument('--data-dir', help="Directory holding the data files (default: the current directory)")
+    parser.add_argument('--storage', choices=('json', 'sqlite'), help="Storage backend (default: BUDGET_TRACKER_STORAGE or json)")
+    parser.add_argument('--instrument', action='store_true', help="Log timings to budget_tracker_perf.log in the data directory")
+    parser.add_argument('--profile', metavar='FILE', help="Write a cProfile dump of the command to FILE")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    summary = commands.add_parser('summary', help="Account and loan balances and the month's budgets")
+    summary.add_argument('--month', type=month_arg, help="YYYY-MM (default: this month)")
+    summary.set_defaults(run=show_summary)
+
+    report = commands.add_parser('report', help="Spending per month by category or account, and month-end balances")
+    report.add_argument('--months', type=int, default=12, help="Months to show (default: 12)")
+    report.add_argument('--by', choices=('category', 'account'), default='category')
+    report.add_argument('--month', type=month_arg, help="Last month, YYYY-MM (default: this month)")
+    report.set_defaults(run=show_report)
+
+    balance = commands.add_parser('balance', help="An account's balance at the end of a day")
+    balance.add_argument('account')
+    balance.add_argument('--as-of', type=date_arg, help="YYYY-MM-DD (default: today)")
+    balance.set_defaults(run=show_balance)
+
+    check = commands.add_parser('check', help="Recompute account and loan balances from their history and report mismatches")
+    check.set_defaults(run=check_balances)
+
+    listing = commands.add_parser('list', help="List transactions, newest first")
+    listing.add_argument('--category')
+    listing.add_argument('--text', help="Words that descriptions must contain (prefixes match)")
+    listing.add_argument('--from', dest='date_from', type=date_arg, help="First date, YYYY-MM-DD")
+    listing.add_argument('--to', dest='date_to', type=date_arg, help="Last date, YYYY-MM-DD")
+    listing.add_argument('--min', dest='amount_min', type=float)
+    listing.add_argument('--max', dest='amount_max', type=float)
+    listing.add_argument('--sort', default='date', choices=('date', 'description', 'category', 'amount', 'account_name'))
+    listing.add_argument('--ascending', action='store_true')
+    listing.add_argument('--limit', type=int, default=50, help="Rows to print, 0 for all (default: 50)")
+    listing.set_defaults(run=list_transactions)
+
+    payment = commands.add_parser('add-payment', help="Record a payment from an account")
+    payment.add_argument('date', type=date_arg)
+    payment.add_argument('amount', type=float)
+    payment.add_argument('category', help="An expense category, or 'Loan: <name>' to pay down a loan")
+    payment.add_argument('account')
+    payment.add_argument('--description', default="N/A")
+    payment.set_defaults(run=add_payment)
+
+    delete = commands.add_parser('delete-payment', help="Delete a payment and refund its account")
+    delete.add_argument('id', type=int)
+    delete.set_defaults(run=delete_payment)
+
+    funds = commands.add_parser('add-funds', help="Add money to an account")
+    funds.add_argument('account')
+    funds.add_argument('amount', type=float)
+    funds.add_argument('--date', type=date_arg, help="YYYY-MM-DD (default: today)")
+    funds.set_defaults(run=add_funds)
+
+    move = commands.add_parser('transfer', help="Move money between accounts")
+    move.add_argument('from_account')
+    move.add_argument('to_account')
+    move.add_argument('amount', type=float)
+    move.add_argument('--date', type=date_arg, help="YYYY-MM-DD (default: today)")
+    move.set_defaults(run=transfer)
+
+    loans = commands.add_parser('loans', help="Loan balances, payoff dates and interest left")
+    loans.add_argument('--extra', type=float, default=0.0, help="See the payoffs with this much more paid on each loan a month")
+    loans.set_defaults(run=show_loans)
+
+    loan_schedule = commands.add_parser('loan-schedule', help="Every payment left on a loan")
+    loan_schedule.add_argument('loan')
+    loan_schedule.add_argument('--extra', type=float, default=0.0, help="Pay this much more each month")
+    loan_schedule.set_defaults(run=show_loan_schedule)
+
+    plan = commands.add_parser('loan-plan', help="Set a loan's interest rate and monthly payment")
+    plan.add_argument('loan')
+    plan.add_argument('--rate', type=float, help="Yearly interest in percent (default: the loan's current rate)")
+    plan.add_argument('--term', type=int, help="Months left, to work the payment out from (default: the current plan's)")
+    plan.add_argument('--payment', type=float, help="Monthly payment (default: the current plan's)")
+    plan.set_defaults(run=set_loan_plan)
+
+    recurring = commands.add_parser('list-recurring', help="Recurring payments and what falls due soon")
+    recurring.add_argument('--days', type=int, default=30, help="How far ahead to list due payments (default: 30)")
+    recurring.set_defaults(run=list_recurring)
+
+    schedule = commands.add_parser('add-recurring', help="Schedule a payment that repeats")
+    schedule.add_argument('start', type=date_arg, help="First date, YYYY-MM-DD")
+    schedule.add_argument('amount', type=float)
+    schedule.add_argument('category', help="An expense category, or 'Loan: <name>' for loan installments")
+    schedule.add_argument('account')
+    schedule.add_argument('--frequency', choices=FREQUENCIES, default='monthly')
+    schedule.add_argument('--every', type=int, default=1, help="Repeat every N days, weeks, months or years (default: 1)")
+    schedule.add_argument('--until', type=date_arg, help="Last date, YYYY-MM-DD (default: no end)")
+    schedule.add_argument('--description', default="N/A")
+    schedule.set_defaults(run=add_recurring)
+
+    unschedule = commands.add_parser('delete-recurring', help="Stop a recurring payment; what it has posted stays")
+    unschedule.add_argument('id', type=int)
+    unschedule.set_defaults(run=delete_recurring)
+
+    due = commands.add_parser('post-due', help="File the recurring payments that have come due")
+    due.add_argument('--today', type=date_arg, help="Post what is due by this date instead, YYYY-MM-DD")
+    due.set_defaults(run=post_due)
+
+    statement = commands.add_parser('import', help="Import the payments in a CSV or OFX bank statement")
+    statement.add_argument('file')
+    statement.add_argument('--account', help="Account the payments come out of, unless the file has an account column")
+    statement.add_argument('--category', default="Misc", help="Category for lines without one (default: Misc)")
+    statement.add_argument('--date-col', help="CSV column names; by default they are guessed from the header")
+    statement.add_argument('--amount-col')
+    statement.add_argument('--description-col')
+    statement.add_argument('--category-col')
+    statement.add_argument('--account-col')
+    statement.add_argument('--date-format', help="strptime format of the CSV dates, e.g. %%d/%%m/%%Y (default: detected)")
+    statement.add_argument('--payments-positive', action='store_true', help="Payments are positive amounts (default: negative, as banks show them)")
+    statement.set_defaults(run=import_statement)
+
+    export = commands.add_parser('export', help="Write transactions, oldest first, to a CSV or columnar file")
+    export.add_argument('file')
+    export.add_argument('--format', choices=('csv', 'columnar'), help="Default: csv for .csv files, columnar otherwise")
+    export.add_argument('--category')
+    export.add_argument('--from', dest='date_from', type=date_arg, help="First date, YYYY-MM-DD")
+    export.add_argument('--to', dest='date_to', type=date_arg, help="Last date, YYYY-MM-DD")
+    export.set_defaults(run=export_transactions)
+
+    api = commands.add_parser('serve', help="Serve the ledger as a local HTTP/JSON API until stopped")
+    api.add_argument('--host', default="127.0.0.1", help="Address to listen on (default: 127.0.0.1, this machine only)")
+    api.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Default: {DEFAULT_PORT}")
+    api.add_argument('--token', help="Require 'Authorization: Bearer TOKEN' (default: BUDGET_TRACKER_API_TOKEN, if set)")
+    api.add_argument('--sync-every', type=float, default=SYNC_SECONDS, metavar='SECONDS',
+                     help=f"Take in changes the desktop app or other commands saved this often (default: {SYNC_SECONDS:g}; 0 never)")
+    api.set_defaults(run=serve_api)
+
+    budget_export = commands.add_parser('export-report', help="Write the monthly budget report to a CSV file")
+    budget_export.add_argument('file')
+    budget_export.add_argument('--from', dest='from_month', type=month_arg, help="First month, YYYY-MM (default: this month)")
+    budget_export.add_argument('--to', dest='to_month', type=month_arg, help="Last month, YYYY-MM (default: the first month)")
+    budget_export.set_defaults(run=export_report)
+
+    convert = commands.add_parser('convert-snapshot', help="Save the JSON data file in the binary format, or back")
+    convert.add_argument('format', choices=('binary', 'json'))
+    convert.add_argument('--output', metavar='FILE', help="Write a copy to FILE and leave the data files as they are")
+    convert.set_defaults(run=convert_snapshot_file)
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    if args.data_dir: os.chdir(args.data_dir) # The data files are looked up relative to the working directory
+    if args.instrument or args.profile: instrumentation.enable(profile_to=args.profile)
+    else: instrumentation.enable_from_environment()
+    ledger = Ledger.open(args.storage)
+    try:
+        changed = args.run(ledger, args)
+        if changed: ledger.commit(*changed)
+    except LedgerError as e:
+        print(f"Error: {e}", file=sys.stderr)
+        return 1
+    finally:
+        ledger.close()
+    return 0
@@ -0,0 +1,12 @@
+"""The headless core: storage, indexes and the ledger's business rules. Nothing here imports tkinter."""
+from .balances import CHECKPOINT_INTERVAL, BalanceHistory
+from .binary import BinarySnapshot
+from .exporters import EXPORT_CHUNK_SIZE, export_budget_report, export_columnar, export_csv, read_columnar
+from .importers import StatementError, guess_columns, read_csv_header, read_statement
+from .ledger import LOAN_PREFIX, ImportResult, InsufficientFunds, Ledger, LedgerError, PostingResult, SyncResult
+from .merging import merge
+from .persistence import (BINARY_FILE, DATA_FILE, JOURNAL_FILE, LOCK_FILE, SETTINGS_KEYS, FileLock, convert_snapshot, load_data,
+                          read_snapshot, save_data, write_snapshot)
+from .recurring import FREQUENCIES, frequency_text, next_due, occurrences
+from .reports import REPORT_PERIODS, cash_flow, months_back, spending_trend
+from .storage import SQLITE_FILE, TRANSACTION_FIELDS, JsonStorage, SqliteStorage, open_storage
@@ -0,0 +1,59 @@
+"""Loan amortization: monthly payments, payoff dates and interest, from a loan's balance, yearly rate and payment.
+
+Payoff months and interest come from the closed-form annuity formulas, so projecting a loan costs the same whether it
+has a year or thirty left; the month-by-month schedule is only built when it is asked for. Interest is charged
+monthly at rate / 12 on the balance, and the last payment is whatever is left."""
+import math
+from collections import namedtuple
+
+Projection = namedtuple('Projection', 'payment months payoff interest') # months and payoff are None if it never pays off
+
+def monthly_rate(rate):
+    """The monthly rate, as a fraction, of a yearly rate in percent."""
+    return rate / 100 / 12
+
+def payment_for(balance, rate, months):
+    """The monthly payment that pays balance off in months at rate (percent a year)."""
+    r = monthly_rate(rate)
+    if r == 0: return balance / months
+    return balance * r / (1 - (1 + r) ** -months)
+
+def balance_after(balance, rate, payment, months):
+    """What is left after months payments."""
+    r = monthly_rate(rate)
+    if r == 0: return balance - payment * months
+    growth = (1 + r) ** months
+    return balance * growth - payment * (growth - 1) / r
+
+def payoff_months(balance, rate, payment):
+    """Number of payments to clear balance, the last one possibly smaller; None when payment doesn't cover the interest."""
+    if balance <= 0: return 0
+    r = monthly_rate(rate)
+    if r == 0: return math.ceil(balance / payment - 1e-9)
+    if payment <= balance * r: return None
+    return math.ceil(-math.log(1 - r * balance / payment) / math.log(1 + r) - 1e-9)
+
+def add_months(month, count):
+    """'YYYY-MM' count months after month."""
+    index = int(month[:4]) * 12 + int(month[5:7]) - 1 + count
+    return f"{index // 12:04d}-{index % 12 + 1:02d}"
+
+def project(balance, rate, payment, month):
+    """Projection of paying payment a month from the month after month ('YYYY-MM') until balance is cleared."""
+    months = payoff_months(balance, rate, payment)
+    if months is None: return Projection(payment, None, None, None)
+    if months == 0: return Projection(payment, 0, month, 0.0)
+    last = balance_after(balance, rate, payment, months - 1) * (1 + monthly_rate(rate))
+    return Projection(payment, months, add_months(month, months), payment * (months - 1) + last - balance)
+
+def schedule(balance, rate, payment, month, limit=1200):
+    """(month, payment, interest, principal, balance left) for each payment from the month after month, at most limit rows."""
+    r = monthly_rate(rate)
+    rows = []
+    for count in range(1, limit + 1):
+        if balance <= 0.005: break
+        interest = balance * r
+        paid = min(payment, balance + interest)
+        balance = balance + interest - paid
+        rows.append((add_months(month, count), paid, interest, paid - interest, max(balance, 0.0)))
+    return rows
@@ -0,0 +1,73 @@
+"""Account balance history: every change to a balance as a dated event, and balances as of any date.
+
+Payments are their own events, stored as transactions. Everything else that moves a balance (an account's
+opening balance, funds added, transfers) is kept in data['balance_events'] as {'date', 'account', 'amount', 'kind'}
+records, with amount the signed change; a transfer is a pair of records, one per account, and deleting an account
+records a 'close' that brings it to zero. An account's balance is its events less its payments, which is what
+Ledger.check_integrity() verifies."""
+from array import array
+from bisect import bisect_left, bisect_right
+
+from .indexes import date_ordinal
+
+CHECKPOINT_INTERVAL = 64 # Days of history between balance checkpoints
+EVENT_KINDS = ('open', 'funds', 'transfer', 'close')
+
+class AccountHistory:
+    """Net change per day for one account, in day order, with the running balance checkpointed every CHECKPOINT_INTERVAL
+    days. A balance as of a date is a bisection, a checkpoint and at most CHECKPOINT_INTERVAL additions. Changes to past
+    days only mark the checkpoints after them stale; those are recomputed when a query first needs them."""
+    def __init__(self):
+        self.days = array('l') # date.toordinal()
+        self.deltas = array('d')
+        self.checkpoints = array('d', [0.0]) # checkpoints[c] is the sum of the first c * CHECKPOINT_INTERVAL deltas
+        self.valid = 1 # Checkpoints before this one are up to date
+
+    def add(self, day, amount):
+        i = bisect_left(self.days, day)
+        if i < len(self.days) and self.days[i] == day: self.deltas[i] += amount
+        else: self.days.insert(i, day); self.deltas.insert(i, amount)
+        self.valid = min(self.valid, i // CHECKPOINT_INTERVAL + 1)
+
+    def balance(self, day):
+        """Balance at the end of the day (an ordinal)."""
+        end = bisect_right(self.days, day)
+        block = end // CHECKPOINT_INTERVAL
+        while self.valid <= block:
+            c = self.valid
+            value = self.checkpoints[c - 1] + sum(self.deltas[(c - 1) * CHECKPOINT_INTERVAL:c * CHECKPOINT_INTERVAL])
+            if c < len(self.checkpoints): self.checkpoints[c] = value
+            else: self.checkpoints.append(value)
+            self.valid += 1
+        return self.checkpoints[block] + sum(self.deltas[block * CHECKPOINT_INTERVAL:end])
+
+    def first_day(self):
+        return self.days[0] if self.days else None
+
+class BalanceHistory:
+    """AccountHistory per account, built from the balance events and the storage's daily spending."""
+    def __init__(self, events, daily_spending):
+        self.accounts = {}
+        for event in events: self.add(event['account'], event['date'], event['amount'])
+        for (account, day), total in daily_spending.items(): self.account(account).add(day, -total)
+
+    def account(self, name):
+        history = self.accounts.get(name)
+        if history is None: history = self.accounts[name] = AccountHistory()
+        return history
+
+    def add(self, account, date_text, amount):
+        self.account(account).add(date_ordinal(date_text), amount)
+
+    def balance(self, account, date_text):
+        """The account's balance at the end of the day."""
+        history = self.accounts.get(account)
+        return history.balance(date_ordinal(date_text)) if history else 0.0
+
+    def total(self, date_text):
+        """All accounts' balances at the end of the day."""
+        day = date_ordinal(date_text)
+        return sum(history.balance(day) for history in self.accounts.values())
+
+def event(date_text, account, amount, kind):
+    return {'date': date_text, 'account': account, 'amount': amount, 'kind': kind}
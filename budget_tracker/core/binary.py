@@ -0,0 +1,163 @@
+"""The binary snapshot: the same data as finances_data.json, laid out to be read without parsing.
+
+    header    MAGIC, then HEADER: format version, record size and count, and where the other sections start
+    records   one fixed-width RECORD per transaction, newest first: id, day number, flags, amount, and the string-table
+              indexes of the description, category, account and extra fields
+    strings   the end offset of each string (uint64), then every distinct string once, UTF-8
+    settings  everything but the transactions (accounts, loans, journal_seq, ...) as compact JSON; it is small
+
+BinarySnapshot maps the file with mmap and decodes records only as they are read, one or a batch at a time, so opening
+one costs the settings and the string offsets however many transactions it holds. Values the fixed-width fields can't
+hold exactly (an amount that isn't a float, a date that isn't YYYY-MM-DD, fields beyond the usual six) go in the
+record's extra JSON, so JSON -> binary -> JSON gives back the same data."""
+import json
+import mmap
+import struct
+import sys
+from array import array
+from datetime import date
+from itertools import accumulate
+
+from .indexes import InternTable
+
+MAGIC = b"BTSNAP\x00\x01"
+VERSION = 1
+HEADER = struct.Struct('<8sIIQQQQQ') # magic, version, record size, records, strings offset, strings, settings offset, settings size
+RECORD = struct.Struct('<qiHxxdIIII') # id, day, flags, amount, description, category, account, extra: 40 bytes
+FIELDS = ('id', 'date', 'description', 'amount', 'category', 'account_name')
+AMOUNT_INT = 1 # The amount was a whole number, not a float
+DATE_TEXT = 2 # The date isn't a YYYY-MM-DD date; the day field holds its string instead
+NO_STRING = 0xFFFFFFFF
+WRITE_SIZE = 1 << 20
+
+def is_binary_snapshot(path):
+    try:
+        with open(path, 'rb') as f: return f.read(len(MAGIC)) == MAGIC
+    except OSError: return False
+
+def encode_record(trans, strings):
+    """The RECORD fields of trans, adding its strings to strings (an InternTable)."""
+    missing = [field for field in FIELDS if field not in trans]
+    if missing: raise ValueError(f"transaction {trans.get('id')!r} has no {', '.join(missing)}")
+    extra, flags = {key: value for key, value in trans.items() if key not in FIELDS}, 0
+    trans_id, text, amount = trans['id'], trans['date'], trans['amount']
+    if type(trans_id) is not int: raise ValueError(f"transaction id {trans_id!r} is not a whole number")
+    try: day = date.fromisoformat(text).toordinal()
+    except (TypeError, ValueError): day = None
+    if day is None or date.fromordinal(day).isoformat() != text:
+        if isinstance(text, str): day, flags = strings.intern(text), flags | DATE_TEXT
+        else: day, extra['date'] = 1, text
+    if type(amount) is int and abs(amount) <= 1 << 53: amount, flags = float(amount), flags | AMOUNT_INT
+    elif type(amount) is not float: amount, extra['amount'] = 0.0, amount
+    codes = []
+    for field in ('description', 'category', 'account_name'):
+        if isinstance(trans[field], str): codes.append(strings.intern(trans[field]))
+        else: codes.append(NO_STRING); extra[field] = trans[field]
+    codes.append(strings.intern(json.dumps(extra, separators=(',', ':'))) if extra else NO_STRING)
+    return (trans_id, day, flags, amount, *codes)
+
+def write_binary(f, settings, transactions):
+    """Writes settings (everything but the transactions) and transactions, in the order given, to f, a file opened for
+    binary writing. Raises ValueError, having written part of f, for a transaction the format can't hold."""
+    strings = InternTable()
+    f.write(bytes(HEADER.size))
+    count, chunk = 0, bytearray()
+    try:
+        for trans in transactions:
+            chunk += RECORD.pack(*encode_record(trans, strings))
+            count += 1
+            if len(chunk) >= WRITE_SIZE: f.write(chunk); chunk = bytearray()
+    except struct.error as e: raise ValueError(f"transaction {trans.get('id')!r} is out of range: {e}") from None
+    f.write(chunk)
+    strings_offset = f.tell()
+    encoded = [name.encode('utf-8', 'surrogatepass') for name in strings.names]
+    ends = array('Q', accumulate(map(len, encoded)))
+    if sys.byteorder == 'big': ends.byteswap()
+    f.write(ends.tobytes())
+    for start in range(0, len(encoded), 10000): f.write(b"".join(encoded[start:start + 10000]))
+    settings_offset = f.tell()
+    text = json.dumps(settings, separators=(',', ':')).encode()
+    f.write(text)
+    f.seek(0)
+    f.write(HEADER.pack(MAGIC, VERSION, RECORD.size, count, strings_offset, len(encoded), settings_offset, len(text)))
+    return count
+
+class BinarySnapshot:
+    """A binary snapshot file mapped into memory. settings holds everything but the transactions; len() counts those,
+    and snapshot[i] and read(start, stop) decode them, newest first, without touching the rest."""
+    def __init__(self, path):
+        self.file = open(path, 'rb')
+        self.map = None
+        try:
+            self.map = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+            (magic, version, record_size, self.count, strings_offset, string_count, settings_offset,
+             settings_size) = HEADER.unpack_from(self.map)
+            if magic != MAGIC: raise ValueError(f"{path} is not a binary snapshot")
+            if version != VERSION or record_size != RECORD.size: raise ValueError(f"{path} was written by a newer version")
+            self.text_offset = strings_offset + 8 * string_count
+            if HEADER.size + self.count * RECORD.size > strings_offset or self.text_offset > settings_offset \
+               or settings_offset + settings_size > len(self.map): raise ValueError(f"{path} is incomplete")
+            self.settings = json.loads(self.map[settings_offset:settings_offset + settings_size])
+            self.ends = array('Q')
+            self.ends.frombytes(self.map[strings_offset:self.text_offset])
+            if sys.byteorder == 'big': self.ends.byteswap()
+        except (ValueError, struct.error) as e:
+            self.close()
+            raise ValueError(str(e)) from None
+        self.names = {} # String index -> text, for the categories and accounts, which repeat
+        self.dates = {} # Day number -> 'YYYY-MM-DD'
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, index):
+        if not -self.count <= index < self.count: raise IndexError("transaction index out of range")
+        return self.decode(RECORD.unpack_from(self.map, HEADER.size + (index % self.count) * RECORD.size))
+
+    def read(self, start=0, stop=None):
+        """Transactions start to stop (to the end if None), decoded from one slice of the map."""
+        stop = self.count if stop is None else min(stop, self.count)
+        if start >= stop: return []
+        records = self.map[HEADER.size + start * RECORD.size:HEADER.size + stop * RECORD.size]
+        names, dates, ends, data, text_offset = self.names, self.dates, self.ends, self.map, self.text_offset
+        transactions = []
+        for values in RECORD.iter_unpack(records):
+            trans_id, day, flags, amount, description, category, account, extra = values
+            if flags or extra != NO_STRING or description == NO_STRING or category not in names or account not in names \
+               or day not in dates:
+                transactions.append(self.decode(values)) # Fills the caches the common case below reads
+                continue
+            text = data[text_offset + (ends[description - 1] if description else 0):text_offset + ends[description]]
+            transactions.append({"id": trans_id, "date": dates[day], "description": text.decode('utf-8', 'surrogatepass'),
+                                 "amount": amount, "category": names[category], "account_name": names[account]})
+        return transactions
+
+    def string(self, index):
+        start = self.text_offset + (self.ends[index - 1] if index else 0)
+        return self.map[start:self.text_offset + self.ends[index]].decode('utf-8', 'surrogatepass')
+
+    def name(self, index):
+        name = self.names.get(index)
+        if name is None: name = self.names[index] = self.string(index)
+        return name
+
+    def decode(self, values):
+        trans_id, day, flags, amount, description, category, account, extra = values
+        text = self.dates.get(day) if not flags & DATE_TEXT else self.string(day)
+        if text is None: text = self.dates[day] = date.fromordinal(day).isoformat()
+        trans = {"id": trans_id, "date": text, "description": self.string(description) if description != NO_STRING else None,
+                 "amount": int(amount) if flags & AMOUNT_INT else amount,
+                 "category": self.name(category) if category != NO_STRING else None,
+                 "account_name": self.name(account) if account != NO_STRING else None}
+        if extra != NO_STRING: trans.update(json.loads(self.string(extra)))
+        return trans
+
+    def close(self):
+        if self.map is not None: self.map.close(); self.map = None
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
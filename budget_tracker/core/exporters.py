@@ -0,0 +1,142 @@
+"""Streaming exports of transactions and budget reports.
+
+Transactions are read from storage in chunks of EXPORT_CHUNK_SIZE, oldest first, and each chunk is written out before
+the next is read: beyond what the storage already holds, only the matching ids and one chunk are in memory at a time.
+Files are written next to their destination and moved into place when complete, so a job reading them never sees half an export."""
+import csv
+import json
+import os
+import struct
+import sys
+import zlib
+from array import array
+from datetime import date
+
+from .indexes import date_ordinal
+from .storage import TRANSACTION_FIELDS
+
+EXPORT_CHUNK_SIZE = 10000
+COLUMNAR_MAGIC = b"BTCOL1"
+COLUMNAR_SCHEMA = {'id': 'int64', 'date': 'date', 'description': 'string', 'amount': 'float64',
+                   'category': 'dictionary', 'account_name': 'dictionary'}
+
+def transaction_chunks(storage, category=None, date_from=None, date_to=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Yields the matching transactions, oldest first, as lists of at most chunk_size."""
+    found = storage.find_transactions(category, None, date_from, date_to, sort_by='date', reverse=False)
+    for start in range(0, len(found), chunk_size):
+        yield found[start:start + chunk_size]
+
+def write_atomically(path, write, mode='w'):
+    """Calls write(f) on a temporary file that replaces path once write returns."""
+    temp_file = path + ".tmp"
+    with open(temp_file, mode, **({'newline': '', 'encoding': 'utf-8'} if 'b' not in mode else {})) as f:
+        result = write(f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_file, path)
+    return result
+
+def export_csv(storage, path, category=None, date_from=None, date_to=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Writes the matching transactions to a CSV file with a header row. Returns the number of transactions written."""
+    def write(f):
+        writer, count = csv.writer(f), 0
+        writer.writerow(TRANSACTION_FIELDS)
+        for chunk in transaction_chunks(storage, category, date_from, date_to, chunk_size):
+            writer.writerows([trans.get(field) for field in TRANSACTION_FIELDS] for trans in chunk)
+            count += len(chunk)
+        return count
+    return write_atomically(path, write)
+
+# --- Columnar format ---
+# A file is COLUMNAR_MAGIC, then one row group per chunk, then a JSON footer, the footer's length (uint32) and the magic again.
+# A row group stores each column as one zlib-compressed block; the footer lists the schema and every block's offset and length.
+# Numbers are little-endian. Dates are day numbers (date.toordinal(), 0 for an invalid date). Strings are a uint32 offset
+# per value plus one UTF-8 blob; dictionary columns are uint32 codes into a string column of the chunk's distinct values.
+
+def little_endian(values):
+    if sys.byteorder == 'big': values.byteswap()
+    return values.tobytes()
+
+def from_little_endian(typecode, data):
+    values = array(typecode, data)
+    if sys.byteorder == 'big': values.byteswap()
+    return values
+
+def encode_strings(values):
+    blobs = [value.encode('utf-8') for value in values]
+    offsets, end = array('I', [0]), 0
+    for blob in blobs: end += len(blob); offsets.append(end)
+    return struct.pack('<I', len(blobs)) + little_endian(offsets) + b''.join(blobs)
+
+def decode_strings(data):
+    count = struct.unpack_from('<I', data)[0]
+    offsets = from_little_endian('I', data[4:8 + 4 * count])
+    blob = data[8 + 4 * count:]
+    return [blob[offsets[i]:offsets[i + 1]].decode('utf-8') for i in range(count)]
+
+def encode_column(kind, values):
+    if kind == 'int64': return little_endian(array('q', values))
+    if kind == 'float64': return little_endian(array('d', values))
+    if kind == 'date': return little_endian(array('I', map(date_ordinal, values)))
+    if kind == 'string': return encode_strings(values)
+    codes = {}
+    indexes = array('I', [codes.setdefault(value, len(codes)) for value in values])
+    table = encode_strings(codes)
+    return struct.pack('<I', len(table)) + table + little_endian(indexes)
+
+def decode_column(kind, data):
+    if kind == 'int64': return from_little_endian('q', data).tolist()
+    if kind == 'float64': return from_little_endian('d', data).tolist()
+    if kind == 'date': return [date.fromordinal(day).isoformat() if day else "" for day in from_little_endian('I', data)]
+    if kind == 'string': return decode_strings(data)
+    table_size = struct.unpack_from('<I', data)[0]
+    table = decode_strings(data[4:4 + table_size])
+    return [table[code] for code in from_little_endian('I', data[4 + table_size:])]
+
+def export_columnar(storage, path, category=None, date_from=None, date_to=None, chunk_size=EXPORT_CHUNK_SIZE):
+    """Writes the matching transactions in the columnar format, one row group per chunk. Returns the number written."""
+    def write(f):
+        f.write(COLUMNAR_MAGIC)
+        row_groups, count = [], 0
+        for chunk in transaction_chunks(storage, category, date_from, date_to, chunk_size):
+            columns = {}
+            for field, kind in COLUMNAR_SCHEMA.items():
+                block = zlib.compress(encode_column(kind, [trans.get(field) for trans in chunk]))
+                columns[field] = [f.tell(), len(block)]
+                f.write(block)
+            row_groups.append({'rows': len(chunk), 'columns': columns})
+            count += len(chunk)
+        footer = json.dumps({'schema': COLUMNAR_SCHEMA, 'rows': count, 'row_groups': row_groups}).encode('utf-8')
+        f.write(footer + struct.pack('<I', len(footer)) + COLUMNAR_MAGIC)
+        return count
+    return write_atomically(path, write, 'wb')
+
+def read_columnar(path, columns=None):
+    """Yields each row group of a columnar export as {column: list of values}, reading only the columns asked for."""
+    with open(path, 'rb') as f:
+        if f.read(len(COLUMNAR_MAGIC)) != COLUMNAR_MAGIC: raise ValueError(f"{path} is not a columnar export")
+        f.seek(-4 - len(COLUMNAR_MAGIC), os.SEEK_END)
+        footer_size = struct.unpack('<I', f.read(4))[0]
+        f.seek(-4 - len(COLUMNAR_MAGIC) - footer_size, os.SEEK_END)
+        footer = json.loads(f.read(footer_size))
+        wanted = columns or list(footer['schema'])
+        for group in footer['row_groups']:
+            values = {}
+            for field in wanted:
+                offset, size = group['columns'][field]
+                f.seek(offset)
+                values[field] = decode_column(footer['schema'][field], zlib.decompress(f.read(size)))
+            yield values
+
+# --- Reports ---
+def export_budget_report(ledger, path, months):
+    """Writes the Dashboard's budget report for each (year, month) given to a CSV file. Returns the number of rows."""
+    def write(f):
+        writer, count = csv.writer(f), 0
+        writer.writerow(("month", "category", "spent", "budget", "percent"))
+        for year, month in months:
+            for category, spent, budget, percentage in ledger.budget_report(year, month):
+                writer.writerow((f"{year:04d}-{month:02d}", category, round(spent, 2), budget, round(percentage, 1)))
+                count += 1
+        return count
+    return write_atomically(path, write)
@@ -0,0 +1,102 @@
+"""Bank statement readers for bulk import.
+
+Readers stream the file and yield one dict per statement line: 'date' (ISO), 'amount' as the bank shows it
+(negative for money going out), 'description', and 'category' / 'account_name' when the file has them."""
+import csv
+import os
+import re
+from datetime import datetime
+
+DATE_FORMATS = ("%Y-%m-%d", "%m/%d/%Y", "%d/%m/%Y", "%d.%m.%Y", "%Y/%m/%d", "%Y%m%d", "%d-%m-%Y", "%m-%d-%Y")
+COLUMN_GUESSES = { # Header names recognised for each field, lowercased
+    'date': ("date", "transaction date", "posted date", "posting date", "booking date", "value date"),
+    'amount': ("amount", "value", "transaction amount", "amount (eur)", "amount (usd)"),
+    'description': ("description", "payee", "name", "memo", "details", "narrative", "reference"),
+    'category': ("category", "type"),
+    'account_name': ("account", "account name"),
+}
+
+class StatementError(ValueError):
+    """A statement that can't be read. The message names the line at fault."""
+
+def guess_columns(header):
+    """Best guess at which header column holds each field, as {field: column name}."""
+    by_name = {name.strip().lower(): name for name in header}
+    columns = {}
+    for field, names in COLUMN_GUESSES.items():
+        column = next((by_name[name] for name in names if name in by_name), None)
+        if column is not None and column not in columns.values(): columns[field] = column
+    return columns
+
+def read_csv_header(path):
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        return next(csv.reader(f), [])
+
+def parse_amount(text):
+    """Parses amounts such as '-1,234.56', '(12.00)' or '12.00-'."""
+    text = text.strip().replace(',', '').replace(' ', '')
+    for symbol in "$€£": text = text.replace(symbol, '')
+    negative = text.startswith('(') and text.endswith(')') or text.endswith('-')
+    value = float(text.strip('()-') if negative else text)
+    return -value if negative else value
+
+def date_parser(date_format=None):
+    """Returns a function turning statement dates into ISO strings. Without a format, the first of DATE_FORMATS
+    that parses the first date is used for the whole file, so dates don't flip between day-first and month-first.
+    Results are cached: a statement has far fewer distinct dates than lines, and strptime dominates the import otherwise."""
+    formats = [date_format] if date_format else list(DATE_FORMATS)
+    parsed = {}
+    def parse(text):
+        if text in parsed: return parsed[text]
+        while True:
+            try: result = parsed[text] = datetime.strptime(text.strip(), formats[0]).date().isoformat(); return result
+            except ValueError:
+                if date_format or parsed or len(formats) == 1: raise
+                formats.pop(0)
+    return parse
+
+def read_csv(path, columns=None, date_format=None):
+    """Yields the lines of a CSV statement. columns maps 'date', 'amount', 'description' and optionally 'category'
+    and 'account_name' to header names; missing entries are guessed from the header."""
+    with open(path, newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f)
+        columns = dict(guess_columns(reader.fieldnames or []), **(columns or {}))
+        for field in ('date', 'amount'):
+            if field not in columns: raise StatementError(f"Can't tell which column holds the {field}; name it explicitly.")
+        parse_date = date_parser(date_format)
+        for row in reader:
+            if not any(row.values()): continue
+            try:
+                line = {'date': parse_date(row[columns['date']]), 'amount': parse_amount(row[columns['amount']]),
+                        'description': (row.get(columns.get('description')) or "").strip()}
+            except (ValueError, TypeError) as e:
+                raise StatementError(f"Line {reader.line_num}: {e}") from None
+            for field in ('category', 'account_name'):
+                value = (row.get(columns.get(field)) or "").strip()
+                if value: line[field] = value
+            yield line
+
+OFX_FIELD = re.compile(r'<(\w+)>([^<\r\n]*)')
+
+def read_ofx(path):
+    """Yields the transactions of an OFX statement, SGML (1.x) or XML (2.x)."""
+    with open(path, 'r', encoding='utf-8', errors='replace') as f:
+        fields, line_num = None, 0
+        for line_num, text in enumerate(f, 1):
+            for tag, value in OFX_FIELD.findall(text):
+                tag = tag.upper()
+                if tag == 'STMTTRN': fields = {}
+                elif fields is not None: fields[tag] = value.strip()
+            if fields is not None and '</STMTTRN>' in text.upper():
+                try:
+                    yield {'date': datetime.strptime(fields['DTPOSTED'][:8], "%Y%m%d").date().isoformat(),
+                           'amount': parse_amount(fields['TRNAMT']),
+                           'description': fields.get('NAME') or fields.get('MEMO') or ""}
+                except (KeyError, ValueError) as e:
+                    raise StatementError(f"Line {line_num}: transaction without a valid {e}") from None
+                fields = None
+
+def read_statement(path, columns=None, date_format=None):
+    """Reads a .ofx/.qfx statement, or any other file as CSV."""
+    if os.path.splitext(path)[1].lower() in ('.ofx', '.qfx'): return read_ofx(path)
+    return read_csv(path, columns, date_format)
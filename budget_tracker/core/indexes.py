@@ -0,0 +1,461 @@
+"""In-memory transaction stores and the indexes kept alongside them."""
+import copy
+import re
+from array import array
+from bisect import bisect_left, insort
+from datetime import date
+from itertools import chain, compress
+from operator import itemgetter
+
+class SpendingRollup:
+    """Spending totals by month, category and account: a cube keyed 'YYYY-MM' -> {(category, account): total},
+    adjusted by delta whenever a transaction changes. Reports over any range of months read one cell per
+    month, category and account, however many transactions there are."""
+    def __init__(self, months=None):
+        self.months = months if months is not None else {}
+
+    def add(self, trans, sign=1):
+        cells = self.months.setdefault(trans['date'][:7], {})
+        key = trans['category'], trans['account_name']
+        cells[key] = cells.get(key, 0) + sign * trans['amount']
+
+    def remove(self, trans):
+        self.add(trans, -1)
+
+    def rename_category(self, old, new):
+        for cells in self.months.values():
+            for category, account in [key for key in cells if key[0] == old]:
+                cells[new, account] = cells.get((new, account), 0) + cells.pop((old, account))
+
+    def month(self, year, month):
+        """{category: total} for the month."""
+        totals = {}
+        for (category, _), total in self.months.get(f"{year:04d}-{month:02d}", {}).items():
+            totals[category] = totals.get(category, 0) + total
+        return totals
+
+    def cells(self, first_month, last_month):
+        """(month, category, account, total) for the months from first_month to last_month, 'YYYY-MM', inclusive."""
+        return [(month, category, account, total) for month, cells in self.months.items() if first_month <= month <= last_month
+                for (category, account), total in cells.items()]
+
+TOKEN_PATTERN = re.compile(r'\w+')
+
+def description_words(text):
+    return set(TOKEN_PATTERN.findall(text.lower()))
+
+class TextIndex:
+    """Inverted index from the words of each description to transaction ids.
+    A search matches transactions that have, for every word of the query, a word starting with it;
+    prefixes are resolved by bisecting the sorted vocabulary."""
+    def __init__(self, transactions=()):
+        self.postings = {} # Word -> set of transaction ids
+        for t in transactions:
+            for word in description_words(t['description']): self.postings.setdefault(word, set()).add(t['id'])
+        self.words = sorted(self.postings)
+
+    def add(self, trans):
+        for word in description_words(trans['description']):
+            ids = self.postings.get(word)
+            if ids is None: ids = self.postings[word] = set(); insort(self.words, word)
+            ids.add(trans['id'])
+
+    def remove(self, trans):
+        for word in description_words(trans['description']):
+            ids = self.postings[word]
+            ids.discard(trans['id'])
+            if not ids: del self.postings[word]; del self.words[bisect_left(self.words, word)]
+
+    def prefix_ids(self, prefix):
+        start = bisect_left(self.words, prefix)
+        end = bisect_left(self.words, prefix + '\U0010ffff', start)
+        return set().union(*(self.postings[word] for word in self.words[start:end]))
+
+    def search(self, text):
+        """Ids of the transactions matching every word of text, or None when text has no words to search for."""
+        words = description_words(text)
+        if not words: return None
+        matches = sorted((self.prefix_ids(word) for word in words), key=len)
+        return matches[0].intersection(*matches[1:])
+
+def date_ordinal(text):
+    """Day number of an ISO date string; 0 (before every real date) if it isn't one."""
+    try: return date.fromisoformat(text).toordinal()
+    except (TypeError, ValueError): return 0
+
+class DateIndex:
+    """Transaction ids ordered by date, then id, so a date range resolves by bisection and results
+    in date order need no sort. Each entry is one packed integer, day << ID_BITS | id, in a typed array.
+
+    New entries collect in a small unsorted list that is merged in on the next read, so bulk loads sort once."""
+    ID_BITS = 40
+    MERGE_LIMIT = 64 # Up to this many new entries are inserted one by one; more are merged with a sort
+
+    def __init__(self, entries=()):
+        self.keys = array('q', sorted(day << self.ID_BITS | trans_id for day, trans_id in entries))
+        self.recent = []
+
+    def add(self, day, trans_id):
+        self.recent.append(day << self.ID_BITS | trans_id)
+
+    def remove(self, day, trans_id):
+        key = day << self.ID_BITS | trans_id
+        if key in self.recent: self.recent.remove(key); return
+        i = bisect_left(self.keys, key)
+        if i < len(self.keys) and self.keys[i] == key: del self.keys[i]
+
+    def merge_recent(self):
+        if len(self.recent) <= self.MERGE_LIMIT:
+            for key in self.recent: insort(self.keys, key)
+        else:
+            self.keys = array('q', sorted(chain(self.keys, self.recent)))
+        self.recent = []
+
+    def ids_between(self, first_day=None, last_day=None, reverse=False):
+        """Ids of the transactions dated from first_day to last_day inclusive (None for open-ended), in date order."""
+        if self.recent: self.merge_recent()
+        low = bisect_left(self.keys, first_day << self.ID_BITS) if first_day is not None else 0
+        high = bisect_left(self.keys, (last_day + 1) << self.ID_BITS) if last_day is not None else len(self.keys)
+        keys = self.keys[low:high]
+        if reverse: keys.reverse()
+        mask = (1 << self.ID_BITS) - 1
+        return [key & mask for key in keys]
+
+    def newest_first(self, first_day=None, last_day=None, before=None):
+        """Ids from last_day (or from just before the (day, id) key before) back to first_day, newest first, lazily."""
+        if self.recent: self.merge_recent()
+        low = bisect_left(self.keys, first_day << self.ID_BITS) if first_day is not None else 0
+        if before is not None: high = bisect_left(self.keys, before[0] << self.ID_BITS | before[1])
+        elif last_day is not None: high = bisect_left(self.keys, (last_day + 1) << self.ID_BITS)
+        else: high = len(self.keys)
+        mask = (1 << self.ID_BITS) - 1
+        for i in range(high - 1, low - 1, -1): yield self.keys[i] & mask
+
+def newest_page(store, limit, after=None, category=None, ids=None, date_from=None, date_to=None, amount_min=None, amount_max=None):
+    """Up to limit transactions of store matching the filters, newest first by date then id, starting after the
+    (date, id) that ended the previous page. Walks the date index from that point, so a page costs about its own size
+    rather than the number of matches."""
+    before = (date_ordinal(after[0]), after[1]) if after else None
+    if before and date_to and date_ordinal(date_to) < before[0]: before = None
+    found = []
+    for trans_id in store.by_date.newest_first(date_ordinal(date_from) if date_from else None,
+                                               date_ordinal(date_to) if date_to else None, before):
+        if ids is not None and trans_id not in ids: continue
+        t = store.get(trans_id)
+        if t is None or (category and t['category'] != category): continue
+        if (amount_min is not None and t['amount'] < amount_min) or (amount_max is not None and t['amount'] > amount_max): continue
+        found.append(t)
+        if len(found) == limit: break
+    return found
+
+class TransactionStore:
+    """Transactions indexed by their integer id, for O(1) lookup, update and delete.
+    Stored dicts are never modified in place; changes replace them, so snapshot() can be read from another thread."""
+    def __init__(self, transactions=()):
+        self.by_id = {t['id']: t for t in transactions}
+        self.by_date = DateIndex((date_ordinal(t['date']), trans_id) for trans_id, t in self.by_id.items())
+        self.next_id = max(self.by_id, default=0) + 1
+
+    def __len__(self):
+        return len(self.by_id)
+
+    def __iter__(self):
+        return iter(self.by_id.values())
+
+    def get(self, trans_id):
+        try: return self.by_id.get(int(trans_id))
+        except (TypeError, ValueError): return None
+
+    def add(self, trans):
+        """Stores the transaction, assigning the next id when it has none."""
+        if trans.get('id') is None: trans['id'] = self.next_id
+        self.next_id = max(self.next_id, trans['id'] + 1)
+        self.by_id[trans['id']] = trans
+        self.by_date.add(date_ordinal(trans['date']), trans['id'])
+        return trans
+
+    def update(self, trans_id, changes):
+        old = self.by_id[int(trans_id)]
+        trans = self.by_id[old['id']] = dict(old, **changes)
+        if trans['date'] != old['date']:
+            self.by_date.remove(date_ordinal(old['date']), old['id'])
+            self.by_date.add(date_ordinal(trans['date']), trans['id'])
+        return trans
+
+    def delete(self, trans_id):
+        trans = self.by_id.pop(int(trans_id))
+        self.by_date.remove(date_ordinal(trans['date']), trans['id'])
+        return trans
+
+    def rename_category(self, old, new):
+        for trans_id, t in self.by_id.items():
+            if t['category'] == old: self.by_id[trans_id] = dict(t, category=new)
+
+    def snapshot(self):
+        return list(self.by_id.values())
+
+    def find(self, category=None, ids=None, date_from=None, date_to=None, amount_min=None, amount_max=None, sort_by='date', reverse=True):
+        """Transactions matching every filter given, sorted by the sort_by field, then id. ids (all if None) limits the candidates;
+        the date bounds are inclusive ISO date strings. Without ids, the date index supplies the date range, already in order."""
+        presorted = ids is None and sort_by == 'date'
+        if ids is None and (date_from or date_to or presorted):
+            ids = self.by_date.ids_between(date_ordinal(date_from) if date_from else None,
+                                           date_ordinal(date_to) if date_to else None, reverse)
+            date_from = date_to = None
+        found = self.by_id.values() if ids is None else filter(None, map(self.by_id.get, ids))
+        if category: found = [t for t in found if t['category'] == category]
+        if date_from: found = [t for t in found if t['date'] >= date_from]
+        if date_to: found = [t for t in found if t['date'] <= date_to]
+        if amount_min is not None: found = [t for t in found if t['amount'] >= amount_min]
+        if amount_max is not None: found = [t for t in found if t['amount'] <= amount_max]
+        found = list(found)
+        if not presorted: # Ties by id, in the same direction, as SQLite orders them; both sorts are stable
+            found.sort(key=itemgetter('id'), reverse=reverse)
+            found.sort(key=itemgetter(sort_by), reverse=reverse)
+        return found
+
+    def spending_by_month(self):
+        """Spending totals as {'YYYY-MM': {(category, account): total}}, the starting point of a SpendingRollup."""
+        months = {}
+        for t in self.by_id.values():
+            cells = months.setdefault(t['date'][:7], {})
+            key = t['category'], t['account_name']
+            cells[key] = cells.get(key, 0) + t['amount']
+        return months
+
+    def spending_by_day(self):
+        """Spending totals as {(account, day number): total}."""
+        totals = {}
+        for t in self.by_id.values():
+            key = t['account_name'], date_ordinal(t['date'])
+            totals[key] = totals.get(key, 0) + t['amount']
+        return totals
+
+class InternTable:
+    """Maps repeated strings to small integer codes and back."""
+    def __init__(self):
+        self.names = []
+        self.codes = {}
+
+    def intern(self, name):
+        code = self.codes.get(name)
+        if code is None:
+            code = self.codes[name] = len(self.names)
+            self.names.append(name)
+        return code
+
+class ColumnarTransactionStore:
+    """Transactions kept as parallel typed arrays, with categories and accounts stored as interned integer codes.
+
+    A row costs a few dozen bytes instead of a six-key dict; dicts are only built for the rows being read.
+    Provides the same interface as TransactionStore plus mask, sum and group-by helpers over the columns."""
+    def __init__(self, transactions=()):
+        self.ids = array('q')
+        self.days = array('l') # date.toordinal()
+        self.amounts = array('d')
+        self.category_codes = array('l')
+        self.account_codes = array('l')
+        self.descriptions = []
+        self.alive = bytearray() # 0 for deleted rows until the next compaction
+        self.categories = InternTable()
+        self.accounts = InternTable()
+        self.row_of = {}
+        self.by_date = DateIndex()
+        self.dead_rows = 0
+        self.next_id = 1
+        for t in transactions: self.add(t)
+
+    def __len__(self):
+        return len(self.row_of)
+
+    def __iter__(self):
+        return (self.row(r) for r in compress(range(len(self.ids)), self.alive))
+
+    def row(self, r):
+        return {"id": self.ids[r], "date": date.fromordinal(self.days[r]).isoformat(), "description": self.descriptions[r],
+                "amount": self.amounts[r], "category": self.categories.names[self.category_codes[r]],
+                "account_name": self.accounts.names[self.account_codes[r]]}
+
+    def get(self, trans_id):
+        try: r = self.row_of.get(int(trans_id))
+        except (TypeError, ValueError): return None
+        return None if r is None else self.row(r)
+
+    def add(self, trans):
+        """Stores the transaction, assigning the next id when it has none."""
+        day = date.fromisoformat(trans['date']).toordinal()
+        if trans.get('id') is None: trans['id'] = self.next_id
+        self.next_id = max(self.next_id, trans['id'] + 1)
+        self.row_of[trans['id']] = len(self.ids)
+        self.ids.append(trans['id'])
+        self.days.append(day)
+        self.amounts.append(trans['amount'])
+        self.category_codes.append(self.categories.intern(trans['category']))
+        self.account_codes.append(self.accounts.intern(trans['account_name']))
+        self.descriptions.append(trans['description'])
+        self.alive.append(1)
+        self.by_date.add(day, trans['id'])
+        return trans
+
+    def update(self, trans_id, changes):
+        r = self.row_of[int(trans_id)]
+        if 'date' in changes:
+            day = date.fromisoformat(changes['date']).toordinal()
+            self.by_date.remove(self.days[r], self.ids[r])
+            self.by_date.add(day, self.ids[r])
+            self.days[r] = day
+        if 'amount' in changes: self.amounts[r] = changes['amount']
+        if 'category' in changes: self.category_codes[r] = self.categories.intern(changes['category'])
+        if 'account_name' in changes: self.account_codes[r] = self.accounts.intern(changes['account_name'])
+        if 'description' in changes: self.descriptions[r] = changes['description']
+        return self.row(r)
+
+    def delete(self, trans_id):
+        r = self.row_of.pop(int(trans_id))
+        trans = self.row(r)
+        self.by_date.remove(self.days[r], self.ids[r])
+        self.alive[r] = 0
+        self.descriptions[r] = ""
+        self.dead_rows += 1
+        if self.dead_rows > len(self.ids) // 2: self.compact()
+        return trans
+
+    def snapshot(self):
+        """Copy of the columns that can be iterated from another thread while this store keeps changing."""
+        clone = copy.copy(self)
+        for name, value in vars(self).items():
+            if isinstance(value, (array, bytearray, list, dict)): setattr(clone, name, copy.copy(value))
+        clone.categories, clone.accounts = copy.deepcopy(self.categories), copy.deepcopy(self.accounts)
+        return clone
+
+    def compact(self):
+        """Drops deleted rows from every column."""
+        keep = list(compress(range(len(self.ids)), self.alive))
+        for name in ('ids', 'days', 'amounts', 'category_codes', 'account_codes'):
+            column = getattr(self, name)
+            setattr(self, name, array(column.typecode, (column[r] for r in keep)))
+        self.descriptions = [self.descriptions[r] for r in keep]
+        self.alive = bytearray(b'\x01') * len(keep)
+        self.row_of = {trans_id: r for r, trans_id in enumerate(self.ids)}
+        self.dead_rows = 0
+
+    def rename_category(self, old, new):
+        old_code = self.categories.codes.pop(old, None)
+        if old_code is None: return
+        if new not in self.categories.codes:
+            self.categories.names[old_code] = new
+            self.categories.codes[new] = old_code
+            return
+        new_code = self.categories.codes[new]
+        for r, code in enumerate(self.category_codes):
+            if code == old_code: self.category_codes[r] = new_code
+
+    # Column helpers. Masks are bytearrays with one byte per row, 1 where the row is live and matches.
+    def mask_date_range(self, start=None, end=None):
+        """Rows dated from start to end, both included as in find(); the bounds are ISO date strings, None for open-ended."""
+        low = date.fromisoformat(start).toordinal() if start else 0
+        high = date.fromisoformat(end).toordinal() if end else date.max.toordinal()
+        return bytearray(alive and low <= day <= high for alive, day in zip(self.alive, self.days))
+
+    def mask_equals(self, column, name):
+        """Rows whose 'category' or 'account_name' is name."""
+        table, codes = (self.categories, self.category_codes) if column == 'category' else (self.accounts, self.account_codes)
+        code = table.codes.get(name)
+        if code is None: return bytearray(len(self.ids))
+        return bytearray(alive and c == code for alive, c in zip(self.alive, codes))
+
+    def mask_text(self, text):
+        """Rows whose description contains text, ignoring case."""
+        text = text.lower()
+        return bytearray(alive and text in d.lower() for alive, d in zip(self.alive, self.descriptions))
+
+    @staticmethod
+    def combine(*masks):
+        return bytearray(all(flags) for flags in zip(*masks))
+
+    def sum_amounts(self, mask=None):
+        return sum(compress(self.amounts, self.alive if mask is None else mask))
+
+    def group_by(self, column, mask=None):
+        """Sums amounts per 'category', 'account_name' or 'month' ('YYYY-MM') over the rows in mask."""
+        mask = self.alive if mask is None else mask
+        if column == 'month':
+            totals = {}
+            for day, amount in compress(zip(self.days, self.amounts), mask):
+                totals[day] = totals.get(day, 0) + amount
+            months = {}
+            for day, total in totals.items():
+                key = date.fromordinal(day).isoformat()[:7]
+                months[key] = months.get(key, 0) + total
+            return months
+        table, codes = (self.categories, self.category_codes) if column == 'category' else (self.accounts, self.account_codes)
+        totals = {}
+        for code, amount in compress(zip(codes, self.amounts), mask):
+            totals[code] = totals.get(code, 0) + amount
+        return {table.names[code]: total for code, total in totals.items()}
+
+    def sort_key(self, field):
+        if field == 'date': return self.days.__getitem__
+        if field == 'amount': return self.amounts.__getitem__
+        if field == 'id': return self.ids.__getitem__
+        if field == 'description': return self.descriptions.__getitem__
+        table, codes = (self.categories, self.category_codes) if field == 'category' else (self.accounts, self.account_codes)
+        return lambda r: table.names[codes[r]]
+
+    def find(self, category=None, ids=None, date_from=None, date_to=None, amount_min=None, amount_max=None, sort_by='date', reverse=True):
+        """Same filters as TransactionStore.find(), applied to the columns."""
+        presorted = ids is None and sort_by == 'date'
+        first_day = date.fromisoformat(date_from).toordinal() if date_from else None
+        last_day = date.fromisoformat(date_to).toordinal() if date_to else None
+        if ids is None and (first_day or last_day or presorted):
+            ids = self.by_date.ids_between(first_day, last_day, reverse)
+            first_day = last_day = None
+        if ids is None: rows = list(compress(range(len(self.ids)), self.alive))
+        else: rows = [r for r in map(self.row_of.get, ids) if r is not None]
+        if category:
+            code = self.categories.codes.get(category)
+            rows = [r for r in rows if self.category_codes[r] == code]
+        if first_day: rows = [r for r in rows if self.days[r] >= first_day]
+        if last_day: rows = [r for r in rows if self.days[r] <= last_day]
+        if amount_min is not None: rows = [r for r in rows if self.amounts[r] >= amount_min]
+        if amount_max is not None: rows = [r for r in rows if self.amounts[r] <= amount_max]
+        if not presorted: # Ties by id, as in TransactionStore.find()
+            rows.sort(key=self.ids.__getitem__, reverse=reverse)
+            rows.sort(key=self.sort_key(sort_by), reverse=reverse)
+        return ColumnarRows(self, array('q', (self.ids[r] for r in rows)))
+
+    def spending_by_month(self):
+        """Spending totals as {'YYYY-MM': {(category, account): total}}, the starting point of a SpendingRollup."""
+        totals = {}
+        columns = zip(self.days, self.category_codes, self.account_codes, self.amounts)
+        for day, category_code, account_code, amount in compress(columns, self.alive):
+            totals[day, category_code, account_code] = totals.get((day, category_code, account_code), 0) + amount
+        months = {}
+        for (day, category_code, account_code), total in totals.items():
+            cells = months.setdefault(date.fromordinal(day).isoformat()[:7], {})
+            key = self.categories.names[category_code], self.accounts.names[account_code]
+            cells[key] = cells.get(key, 0) + total
+        return months
+
+    def spending_by_day(self):
+        """Spending totals as {(account, day number): total}."""
+        totals = {}
+        for account_code, day, amount in compress(zip(self.account_codes, self.days, self.amounts), self.alive):
+            totals[account_code, day] = totals.get((account_code, day), 0) + amount
+        return {(self.accounts.names[code], day): total for (code, day), total in totals.items()}
+
+class ColumnarRows:
+    """Sequence of transaction ids from a ColumnarTransactionStore query; rows become dicts only when read."""
+    def __init__(self, store, ids):
+        self.store = store
+        self.ids = ids
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice): return self.store.get(self.ids[index])
+        return [trans for trans in map(self.store.get, self.ids[index]) if trans is not None]
+
+    def __iter__(self):
+        return (trans for trans in map(self.store.get, self.ids) if trans is not None)
@@ -0,0 +1,88 @@
+"""Opt-in timing and counting of hot paths, for finding out what makes the app slow on someone's machine.
+
+Off unless BUDGET_TRACKER_INSTRUMENT=1 or a --instrument flag calls enable(). When on, each timed call and a summary
+at exit go to a rotating log, and BUDGET_TRACKER_PROFILE (or --profile) names a file for a cProfile dump of the session,
+which pstats, snakeviz or flameprof can read. When off, a timed function costs one flag check per call."""
+import atexit
+import cProfile
+import functools
+import logging
+import logging.handlers
+import os
+import threading
+import time
+from collections import Counter
+
+LOG_FILE = "budget_tracker_perf.log"
+LOG_MAX_BYTES = 1 << 20
+LOG_BACKUPS = 3
+
+enabled = False
+timings = {} # name -> [calls, total seconds, slowest]
+counters = Counter()
+logger = logging.getLogger("budget_tracker.perf")
+profiler = None
+profile_file = None
+lock = threading.Lock() # Saves are timed on the writer thread
+
+def enable(log_file=LOG_FILE, profile_to=None):
+    """Starts recording. profile_to, if given, is where the cProfile stats are written when the program exits."""
+    global enabled, profiler, profile_file
+    if enabled: return
+    enabled = True
+    handler = logging.handlers.RotatingFileHandler(log_file, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUPS)
+    handler.setFormatter(logging.Formatter("%(asctime)s %(message)s"))
+    logger.addHandler(handler)
+    logger.setLevel(logging.INFO)
+    logger.propagate = False
+    if profile_to:
+        profile_file = profile_to
+        profiler = cProfile.Profile()
+        profiler.enable()
+    atexit.register(finish)
+
+def enable_from_environment():
+    if os.environ.get("BUDGET_TRACKER_INSTRUMENT") == "1" or os.environ.get("BUDGET_TRACKER_PROFILE"):
+        enable(profile_to=os.environ.get("BUDGET_TRACKER_PROFILE"))
+
+def record(name, seconds):
+    with lock:
+        entry = timings.setdefault(name, [0, 0.0, 0.0])
+        entry[0] += 1; entry[1] += seconds; entry[2] = max(entry[2], seconds)
+    logger.info("%s %.2f ms", name, seconds * 1000)
+
+def count(name, amount=1):
+    if enabled:
+        with lock: counters[name] += amount
+
+def timed(name):
+    """Decorator recording each call's duration under name while instrumentation is enabled."""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if not enabled: return function(*args, **kwargs)
+            started = time.perf_counter()
+            try: return function(*args, **kwargs)
+            finally: record(name, time.perf_counter() - started)
+        return wrapper
+    return decorate
+
+def instrument_methods(cls, *names, label=None):
+    """Times the named methods of cls, each under '<method>[<label or class name>]'."""
+    for method in names:
+        setattr(cls, method, timed(f"{method}[{label or cls.__name__}]")(getattr(cls, method)))
+
+def summary():
+    """Lines of per-name totals, slowest total first, then the counters."""
+    lines = [f"{name}: {calls} calls, {total * 1000:.1f} ms total, {total / calls * 1000:.2f} ms mean, {slowest * 1000:.2f} ms max"
+             for name, (calls, total, slowest) in sorted(timings.items(), key=lambda item: -item[1][1])]
+    return lines + [f"{name}: {value:,}" for name, value in sorted(counters.items())]
+
+def finish():
+    """Logs the summary and writes the profile; runs at exit."""
+    global profiler
+    if profiler is not None:
+        profiler.disable()
+        profiler.dump_stats(profile_file)
+        profiler = None
+    logger.info("Session summary:\n  %s", "\n  ".join(summary()))
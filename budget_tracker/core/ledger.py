@@ -0,0 +1,465 @@
+"""Business rules for accounts, payments, loans and budgets, independent of any user interface."""
+from collections import Counter, namedtuple
+from datetime import date as calendar_date, datetime
+
+from .amortization import payment_for, project, schedule
+from .balances import BalanceHistory, event
+from .indexes import date_ordinal
+from .recurring import FREQUENCIES, due, upcoming
+from .storage import open_storage
+
+LOAN_PREFIX = "Loan: " # Payments filed under "Loan: <name>" pay that loan down
+
+class LedgerError(ValueError):
+    """A change the ledger refuses. The message is meant for the user."""
+
+class InsufficientFunds(LedgerError):
+    pass
+
+ImportResult = namedtuple('ImportResult', 'imported duplicates skipped changed')
+PostingResult = namedtuple('PostingResult', 'posted held changed') # held: rules whose account or loan is gone
+SyncResult = namedtuple('SyncResult', 'changed overridden') # overridden: this copy's changes another copy's replaced
+
+class Ledger:
+    """Accounts, payments, loans and budgets on top of a storage backend.
+
+    Changing methods validate before they touch anything, so a refused change leaves the data as it was.
+    They return the names of the data collections they changed; nothing is saved until commit()."""
+    def __init__(self, storage):
+        self.storage = storage
+        self.data = storage.data
+        self.history = None # BalanceHistory, built on first use
+        self.projections = {} # (loan name, extra) -> (what the projection was worked out from, Projection)
+
+    @classmethod
+    def open(cls, backend=None):
+        """Opens the storage and waits for it to load completely, for scripts and other callers without an event loop."""
+        storage = open_storage(backend) if backend else open_storage()
+        storage.load_pending(wait=True)
+        return cls(storage)
+
+    def commit(self, *collections):
+        self.storage.commit(collections)
+
+    def close(self):
+        self.storage.close(self.sync)
+
+    def sync(self):
+        """Takes in what other copies of the app (another window, the command line, the API) have saved since the last
+        call, merged with this copy's own changes the way the storage's sync() describes. Where the merged history
+        changes a payment both copies touched, the balances are put right and saved."""
+        changed, overridden, adjustments = self.storage.sync()
+        changed = set(changed)
+        for trans, sign in adjustments:
+            self.apply_payment(sign * trans['amount'], trans['account_name'], trans['category'])
+            changed.update(self.payment_collections(trans['category']))
+        if adjustments: self.storage.commit(changed)
+        if changed: self.history = None
+        return SyncResult(tuple(sorted(changed)), overridden)
+
+    # --- Accounts ---
+    def account(self, name):
+        account = next((acc for acc in self.data['accounts'] if acc['name'] == name), None)
+        if account is None: raise LedgerError(f"There is no account named '{name}'.")
+        return account
+
+    def add_account(self, name, balance=0.0):
+        name = name.strip()
+        if not name: raise LedgerError("Name cannot be empty.")
+        if name in [acc['name'] for acc in self.data['accounts']]: raise LedgerError("Account name already exists.")
+        self.data['accounts'].append({"name": name, "balance": balance})
+        self.record_event(name, balance, 'open')
+        return ('accounts', 'balance_events')
+
+    def delete_account(self, name):
+        for acc in self.data['accounts']:
+            if acc['name'] == name: self.record_event(name, -acc['balance'], 'close')
+        self.data['accounts'] = [acc for acc in self.data['accounts'] if acc['name'] != name]
+        return ('accounts', 'balance_events')
+
+    def add_funds(self, name, amount, date=None):
+        """Adds amount to the account, as of date (YYYY-MM-DD, default today)."""
+        if amount <= 0: raise LedgerError("Enter a valid positive amount.")
+        self.validate_date(date)
+        self.account(name)['balance'] += amount
+        self.record_event(name, amount, 'funds', date)
+        return ('accounts', 'balance_events')
+
+    def transfer(self, from_name, to_name, amount, date=None):
+        if from_name == to_name: raise LedgerError("Cannot transfer to same account.")
+        if amount <= 0: raise LedgerError("Enter a valid positive amount.")
+        self.validate_date(date)
+        from_account, to_account = self.account(from_name), self.account(to_name)
+        if from_account['balance'] < amount: raise InsufficientFunds("Not enough funds for transfer.")
+        from_account['balance'] -= amount; to_account['balance'] += amount
+        self.record_event(from_name, -amount, 'transfer', date)
+        self.record_event(to_name, amount, 'transfer', date)
+        return ('accounts', 'balance_events')
+
+    def total_balance(self):
+        return sum(acc.get('balance', 0) for acc in self.data['accounts'])
+
+    # --- Balance history ---
+    @staticmethod
+    def validate_date(date):
+        if date is None: return
+        try: datetime.strptime(date, "%Y-%m-%d")
+        except (TypeError, ValueError): raise LedgerError("Enter the date as YYYY-MM-DD.") from None
+
+    def record_event(self, account_name, amount, kind, date=None):
+        trans_date = date or datetime.now().strftime("%Y-%m-%d")
+        self.data['balance_events'].append(event(trans_date, account_name, amount, kind))
+        if self.history is not None: self.history.add(account_name, trans_date, amount)
+
+    def record_payment(self, trans, sign=1):
+        """Keeps a built balance history up to date with a payment added (sign 1) or taken away (sign -1)."""
+        if self.history is not None: self.history.add(trans['account_name'], trans['date'], -sign * trans['amount'])
+
+    def balance_history(self):
+        """The BalanceHistory of every account, built on first use and kept up to date by the changing methods after."""
+        if self.history is None:
+            self.storage.load_pending(wait=True)
+            daily_spending = self.storage.daily_spending()
+            if self.record_opening_balances(daily_spending): self.storage.commit(('balance_events',))
+            self.history = BalanceHistory(self.data['balance_events'], daily_spending)
+        return self.history
+
+    def record_opening_balances(self, daily_spending):
+        """Gives each account from before balance events were kept an 'open' event for whatever part of its balance
+        its events and payments don't explain, dated its first recorded change (or today). Returns whether it added any.
+        Saved straight away, since later checks measure against it."""
+        opened = {e['account'] for e in self.data['balance_events'] if e['kind'] == 'open'}
+        missing = {acc['name'] for acc in self.data['accounts']} - opened
+        if not missing: return False
+        explained, first_day = Counter(), {}
+        for e in self.data['balance_events']:
+            if e['account'] in missing:
+                explained[e['account']] += e['amount']
+                first_day[e['account']] = min(first_day.get(e['account'], date_ordinal(e['date'])), date_ordinal(e['date']))
+        for (account_name, day), total in daily_spending.items():
+            if account_name in missing:
+                explained[account_name] -= total
+                first_day[account_name] = min(first_day.get(account_name, day), day)
+        for acc in self.data['accounts']:
+            if acc['name'] in missing:
+                day = first_day.get(acc['name'])
+                opened_on = calendar_date.fromordinal(max(day, 1)).isoformat() if day is not None else None
+                self.record_event(acc['name'], acc['balance'] - explained[acc['name']], 'open', opened_on)
+        return True
+
+    def balance_as_of(self, name, date):
+        """The account's balance at the end of date (YYYY-MM-DD)."""
+        if date is None: raise LedgerError("Enter the date as YYYY-MM-DD.")
+        self.validate_date(date)
+        history = self.balance_history()
+        if name not in history.accounts: self.account(name)
+        return history.balance(name, date)
+
+    def check_integrity(self):
+        """Recomputes account balances from their events and payments, and loan balances from their payments.
+        Returns a line for each stored balance that disagrees; none when everything adds up."""
+        self.balance_history() # Accounts from before balance events were kept get their opening events
+        expected = Counter()
+        for e in self.data['balance_events']: expected[e['account']] += e['amount']
+        paid_into_loans = Counter()
+        for _, category, account_name, total in self.storage.spending_cells("0000-01", "9999-12"):
+            expected[account_name] -= total
+            if category.startswith(LOAN_PREFIX): paid_into_loans[category[len(LOAN_PREFIX):]] += total
+        problems = [f"Account '{acc['name']}' has a balance of {acc['balance']:,.2f}; its events and payments come to "
+                    f"{expected[acc['name']]:,.2f}." for acc in self.data['accounts']
+                    if abs(acc['balance'] - expected[acc['name']]) >= 0.005]
+        for loan in self.data['loans']:
+            remaining = loan['total_amount'] - paid_into_loans[loan['name']]
+            if abs(loan['remaining_balance'] - remaining) >= 0.005:
+                problems.append(f"Loan '{loan['name']}' has {loan['remaining_balance']:,.2f} left to pay; its total less "
+                                f"payments comes to {remaining:,.2f}.")
+        return problems
+
+    # --- Categories and budgets ---
+    def add_category(self, name):
+        name = name.strip()
+        if not name: raise LedgerError("Category name cannot be empty.")
+        if name in self.data['categories']: raise LedgerError("This category already exists.")
+        self.data['categories'].append(name)
+        return ('categories',)
+
+    def delete_category(self, name):
+        if name not in self.data['categories']: raise LedgerError(f"There is no category named '{name}'.")
+        self.data['categories'].remove(name)
+        self.data['budgets'].pop(name, None)
+        return ('categories', 'budgets')
+
+    def set_budgets(self, budgets):
+        """Sets the monthly budget of each category given; None removes that category's budget."""
+        for category, amount in budgets.items():
+            if amount is None: self.data['budgets'].pop(category, None)
+            else: self.data['budgets'][category] = amount
+        return ('budgets',)
+
+    def budget_report(self, year, month):
+        """(category, spent, budget, percent of budget spent) for each budgeted category in the month."""
+        totals = self.storage.monthly_spending(year, month)
+        report = []
+        for category, budget in self.data['budgets'].items():
+            spent = totals.get(category, 0) if category in self.data['categories'] else 0
+            report.append((category, spent, budget, spent / budget * 100 if budget > 0 else 0))
+        return report
+
+    # --- Loans ---
+    def loan(self, name):
+        loan = next((l for l in self.data['loans'] if l['name'] == name), None)
+        if loan is None: raise LedgerError(f"There is no loan named '{name}'.")
+        return loan
+
+    def add_loan(self, name, total, rate=None, term=None, payment=None):
+        return self.save_loan(None, name, total, rate, term, payment)
+
+    def edit_loan(self, old_name, name, total, rate=None, term=None, payment=None):
+        """Renames and resizes a loan, keeping what has been paid off. Payments follow the loan to its new name.
+        Giving any of rate, term or payment replaces the loan's repayment plan (see save_loan); giving none keeps it."""
+        return self.save_loan(self.loan(old_name), name, total, rate, term, payment)
+
+    def save_loan(self, loan, name, total, rate=None, term=None, payment=None):
+        """rate is the yearly interest in percent; payment the monthly payment or, if only term is given, the payment
+        that clears the remaining balance in term months. A loan without a payment has no payoff projection."""
+        name = name.strip()
+        if not name: raise LedgerError("Loan name cannot be empty.")
+        if total <= 0: raise LedgerError("Enter a valid positive amount.")
+        if rate is not None and rate < 0: raise LedgerError("The interest rate cannot be negative.")
+        if term is not None and (not isinstance(term, int) or term < 1): raise LedgerError("Enter the term as a whole number of months.")
+        if payment is not None and payment <= 0: raise LedgerError("The monthly payment must be positive.")
+        is_new_name = loan is None or loan['name'] != name
+        if is_new_name and name in [l['name'] for l in self.data['loans']]: raise LedgerError("Loan name already exists.")
+
+        changed = ['loans']
+        if loan: # Edit
+            old_name = loan['name']
+            paid_off = loan['total_amount'] - loan['remaining_balance']
+            loan.update({'name': name, 'total_amount': total, 'remaining_balance': total - paid_off})
+            if old_name != name:
+                self.storage.rename_category(f"{LOAN_PREFIX}{old_name}", f"{LOAN_PREFIX}{name}")
+                changed.append('transactions')
+                for rule in self.data['recurring']:
+                    if rule['category'] == f"{LOAN_PREFIX}{old_name}": rule['category'] = f"{LOAN_PREFIX}{name}"
+                changed.append('recurring')
+        else: # Add
+            loan = {'name': name, 'total_amount': total, 'remaining_balance': total}
+            self.data['loans'].append(loan)
+        if 'rate' not in loan or any(value is not None for value in (rate, term, payment)):
+            rate = rate or 0.0
+            if payment is None and term is not None: payment = round(payment_for(loan['remaining_balance'], rate, term), 2)
+            loan.update({'rate': rate, 'term_months': term, 'payment': payment})
+        return tuple(changed)
+
+    def delete_loan(self, name):
+        self.data['loans'] = [l for l in self.data['loans'] if l['name'] != name]
+        return ('loans',)
+
+    def loan_projection(self, name, extra=0.0, month=None):
+        """Projection (amortization.Projection) of the loan's payoff from its remaining balance, paying its monthly payment
+        plus extra from the month after month ('YYYY-MM', default this month); None if it has no payment set.
+        Kept until the loan's balance or plan changes, which is what a payment on it or an edit does."""
+        return self.project_loan(self.loan(name), extra, month or datetime.now().strftime("%Y-%m"))
+
+    def loan_projections(self, extra=0.0, month=None):
+        """{loan name: loan_projection()} for every loan, each paying extra more a month."""
+        month = month or datetime.now().strftime("%Y-%m")
+        return {loan['name']: self.project_loan(loan, extra, month) for loan in self.data['loans']}
+
+    def project_loan(self, loan, extra, month):
+        if not loan.get('payment'): return None
+        basis = (loan['remaining_balance'], loan.get('rate', 0.0), loan['payment'], month)
+        cached = self.projections.get((loan['name'], extra))
+        if cached and cached[0] == basis: return cached[1]
+        projection = project(loan['remaining_balance'], loan.get('rate', 0.0), loan['payment'] + extra, month)
+        self.projections[loan['name'], extra] = basis, projection
+        return projection
+
+    def loan_schedule(self, name, extra=0.0, month=None):
+        """The loan's month-by-month schedule (see amortization.schedule), or [] if it has no payment set."""
+        loan = self.loan(name)
+        if not loan.get('payment'): return []
+        return schedule(loan['remaining_balance'], loan.get('rate', 0.0), loan['payment'] + extra, month or datetime.now().strftime("%Y-%m"))
+
+    def debt_free_month(self, extra=0.0, month=None):
+        """The month the last loan is paid off ('YYYY-MM'), paying extra more on each a month; None if some loan with
+        a balance has no plan that pays it off."""
+        month = month or datetime.now().strftime("%Y-%m")
+        payoffs = []
+        for loan in self.data['loans']:
+            if loan.get('remaining_balance', 0) <= 0: continue
+            projection = self.project_loan(loan, extra, month)
+            if projection is None or projection.payoff is None: return None
+            payoffs.append(projection.payoff)
+        return max(payoffs, default=month)
+
+    def total_debt(self):
+        return sum(l.get('remaining_balance', 0) for l in self.data['loans'])
+
+    # --- Payments ---
+    def payment_categories(self):
+        """What a payment can be filed under: the expense categories, then the loans that still have a balance."""
+        loan_names = [f"{LOAN_PREFIX}{l['name']}" for l in self.data['loans'] if l.get('remaining_balance', 0) > 0]
+        return sorted(self.data['categories']) + sorted(loan_names)
+
+    def validate_payment(self, date, amount, category, account_name, original=None):
+        """Raises LedgerError unless the payment has a valid date and amount and its account, category or loan exist.
+        An edit may keep the original's account and category, even if they have since been deleted."""
+        try: datetime.strptime(date, "%Y-%m-%d")
+        except (TypeError, ValueError): raise LedgerError("Check date (YYYY-MM-DD) and amount (positive number).") from None
+        if amount <= 0: raise LedgerError("Check date (YYYY-MM-DD) and amount (positive number).")
+        if not category or not account_name: raise LedgerError("Category and Account must be selected.")
+        if not original or account_name != original['account_name']: self.account(account_name)
+        if original and category == original['category']: return
+        if category.startswith(LOAN_PREFIX): self.loan(category[len(LOAN_PREFIX):])
+        elif category not in self.data['categories']: raise LedgerError(f"There is no category named '{category}'.")
+
+    def apply_payment(self, amount, account_name, category):
+        """Takes amount out of the account and, for a loan payment, off the loan's balance. A negative amount reverses a payment."""
+        for acc in self.data['accounts']:
+            if acc['name'] == account_name: acc['balance'] -= amount; break
+        if category.startswith(LOAN_PREFIX):
+            loan_name = category[len(LOAN_PREFIX):]
+            for loan in self.data['loans']:
+                if loan['name'] == loan_name: loan['remaining_balance'] -= amount; break
+
+    def add_payment(self, date, amount, category, account_name, description="N/A"):
+        self.validate_payment(date, amount, category, account_name)
+        self.apply_payment(amount, account_name, category)
+        self.storage.add_transaction({
+            "date": date, "description": description,
+            "amount": amount, "category": category, "account_name": account_name
+        })
+        self.record_payment({"date": date, "amount": amount, "account_name": account_name})
+        return self.payment_collections(category)
+
+    def edit_payment(self, trans_id, date, amount, category, account_name, description="N/A"):
+        self.validate_payment(date, amount, category, account_name, self.storage.get_transaction(trans_id))
+        original = self.storage.get_transaction(trans_id, for_update=True)
+        if not original: raise LedgerError("Transaction not found.")
+        self.apply_payment(-original['amount'], original['account_name'], original['category'])
+        self.apply_payment(amount, account_name, category)
+        self.record_payment(original, -1)
+        self.record_payment({"date": date, "amount": amount, "account_name": account_name})
+        changes = {"date": date, "amount": amount, "category": category, "account_name": account_name, "description": description}
+        self.storage.update_transaction(original['id'], changes)
+        return self.payment_collections(original['category'], category)
+
+    def delete_payment(self, trans_id):
+        trans = self.storage.get_transaction(trans_id, for_update=True)
+        if not trans: raise LedgerError("Could not find transaction.")
+        self.apply_payment(-trans['amount'], trans['account_name'], trans['category'])
+        self.record_payment(trans, -1)
+        self.storage.delete_transaction(trans['id'])
+        return self.payment_collections(trans['category'])
+
+    @staticmethod
+    def payment_collections(*categories):
+        """Collections changed by a payment in the given categories; loan payments also move loan balances."""
+        if any(c.startswith(LOAN_PREFIX) for c in categories): return 'transactions', 'accounts', 'loans'
+        return 'transactions', 'accounts'
+
+    # --- Statement import ---
+    def import_statement(self, lines, account_name=None, category="Misc", payments_positive=False):
+        """Files the money going out in statement lines (see importers.read_statement) as payments, in one batch.
+
+        Lines without an account of their own go to account_name, lines without a category under category; categories
+        not seen before are created. Lines already recorded with the same date, amount, description and account are
+        skipped, once per recorded copy, so genuine repeats within a statement survive a re-import. Money coming in
+        is skipped too, as are zero amounts. Balances move once per account and loan, not once per line.
+        Returns an ImportResult; nothing is saved until commit(result.changed)."""
+        sign = 1 if payments_positive else -1
+        accounts = {acc['name'] for acc in self.data['accounts']}
+        loans = {f"{LOAN_PREFIX}{l['name']}" for l in self.data['loans']}
+        payments, skipped = [], 0
+        for line in lines:
+            amount = round(line['amount'] * sign, 2)
+            if amount <= 0: skipped += 1; continue
+            trans = {"date": line['date'], "description": line.get('description') or "N/A", "amount": amount,
+                     "category": line.get('category') or category, "account_name": line.get('account_name') or account_name}
+            if trans['account_name'] not in accounts:
+                raise LedgerError(f"There is no account named '{trans['account_name']}'." if trans['account_name'] else "Choose the account to import into.")
+            if trans['category'].startswith(LOAN_PREFIX) and trans['category'] not in loans:
+                raise LedgerError(f"There is no loan named '{trans['category'][len(LOAN_PREFIX):]}'.")
+            payments.append(trans)
+
+        fresh = payments
+        if payments:
+            existing = self.storage.find_transactions(date_from=min(t['date'] for t in payments), date_to=max(t['date'] for t in payments))
+            recorded = Counter(map(self.transaction_key, existing))
+            fresh = []
+            for trans in payments:
+                key = self.transaction_key(trans)
+                if recorded[key]: recorded[key] -= 1
+                else: fresh.append(trans)
+
+        changed = self.post_payments(fresh)
+        return ImportResult(len(fresh), len(payments) - len(fresh), skipped, tuple(changed))
+
+    def post_payments(self, payments):
+        """Stores validated payments in one batch, moving balances once per account and loan rather than once per
+        payment, and creates the categories not seen before. Returns the list of collections changed."""
+        totals = Counter()
+        for trans in payments: totals[trans['account_name'], trans['category']] += trans['amount']
+        for (account_name, payment_category), amount in totals.items(): self.apply_payment(amount, account_name, payment_category)
+        self.storage.add_transactions(payments)
+        for trans in payments: self.record_payment(trans)
+
+        changed = list(self.payment_collections(*{c for _, c in totals})) if payments else []
+        new_categories = sorted({c for _, c in totals if not c.startswith(LOAN_PREFIX)} - set(self.data['categories']))
+        if new_categories: self.data['categories'].extend(new_categories); changed.append('categories')
+        return changed
+
+    @staticmethod
+    def transaction_key(trans):
+        return trans['date'], round(trans['amount'], 2), trans['description'], trans['account_name']
+
+    # --- Recurring payments ---
+    def recurring_rule(self, rule_id):
+        rule = next((r for r in self.data['recurring'] if r['id'] == rule_id), None)
+        if rule is None: raise LedgerError("Recurring payment not found.")
+        return rule
+
+    def add_recurring(self, start, amount, category, account_name, frequency="monthly", interval=1, end=None, description="N/A"):
+        """Schedules a payment every interval days, weeks, months or years from start (YYYY-MM-DD) until end, if given.
+        Occurrences up to today are posted by the next post_due_payments()."""
+        self.validate_payment(start, amount, category, account_name)
+        if frequency not in FREQUENCIES: raise LedgerError(f"Choose how often: {', '.join(FREQUENCIES)}.")
+        if not isinstance(interval, int) or interval < 1: raise LedgerError("Repeat every 1 or more days, weeks, months or years.")
+        self.validate_date(end)
+        if end is not None and end < start: raise LedgerError("The end date is before the start date.")
+        self.data['recurring'].append({
+            "id": max((r['id'] for r in self.data['recurring']), default=0) + 1, "description": description,
+            "amount": amount, "category": category, "account_name": account_name,
+            "frequency": frequency, "interval": interval, "start": start, "end": end, "posted_through": None
+        })
+        return ('recurring',)
+
+    def delete_recurring(self, rule_id):
+        """Stops a recurring payment. What it has posted already stays."""
+        self.data['recurring'].remove(self.recurring_rule(rule_id))
+        return ('recurring',)
+
+    def upcoming_payments(self, first, last):
+        """(date, rule) for each recurring payment falling from first to last (YYYY-MM-DD), in date order;
+        only that window is worked out, however long the rules run."""
+        return upcoming(self.data['recurring'], calendar_date.fromisoformat(first), calendar_date.fromisoformat(last))
+
+    def post_due_payments(self, today=None):
+        """Files every recurring payment that has come due by today (YYYY-MM-DD, default: today) and has not been
+        posted, as ordinary payments in one batch. Rules whose account or loan no longer exists are held back until
+        it does or the rule is deleted. Returns a PostingResult; nothing is saved until commit(result.changed)."""
+        today = calendar_date.fromisoformat(today) if today else calendar_date.today()
+        accounts = {acc['name'] for acc in self.data['accounts']}
+        loans = {f"{LOAN_PREFIX}{l['name']}" for l in self.data['loans']}
+        payments, held, posted_rules = [], 0, []
+        for rule in self.data['recurring']:
+            if rule['account_name'] not in accounts or (rule['category'].startswith(LOAN_PREFIX) and rule['category'] not in loans):
+                held += 1; continue
+            for day in due(rule, today):
+                payments.append({"date": day.isoformat(), "description": rule['description'], "amount": rule['amount'],
+                                 "category": rule['category'], "account_name": rule['account_name']})
+            if (rule.get('posted_through') or "") < today.isoformat(): posted_rules.append(rule)
+        for rule in posted_rules: rule['posted_through'] = today.isoformat()
+        changed = self.post_payments(payments) + (['recurring'] if posted_rules else [])
+        return PostingResult(len(payments), held, tuple(changed))
@@ -0,0 +1,59 @@
+"""Three-way merges of the settings collections, for when two copies of the app changed the same one at once.
+
+merge(key, base, theirs, ours) combines the changes each side made since base, the version both started from, and
+gives the same result whichever copy works it out. Accounts and loans are matched by name, recurring rules by id and
+budgets by category; categories merge as a set. Balance events, which are only ever appended, are saved one at a time
+rather than as a whole (see APPEND_ONLY), so they never need merging.
+Where both sides changed the same field, their value is kept, since it was saved first, and ours is reported as lost;
+running balances are the exception: both changes are applied, as they would have been one after the other."""
+import copy
+
+IDENTITY = {'accounts': 'name', 'loans': 'name', 'recurring': 'id'} # Field that identifies each item of a list collection
+RUNNING_TOTALS = ('balance', 'remaining_balance') # Fields where concurrent changes add up
+APPEND_ONLY = ('balance_events',) # Collections only ever appended to: saved and shared item by item, never as a whole
+MISSING = object() # Not there: never added, or deleted
+
+def base_copy(key, value):
+    """A copy of value that later changes to it don't reach. Appended-only lists just need their items shared."""
+    return list(value) if key in APPEND_ONLY else copy.deepcopy(value)
+
+def merge(key, base, theirs, ours):
+    """Returns (merged value, descriptions of the changes in ours that lost to theirs)."""
+    lost = []
+    if key == 'categories': merged = merge_set(base or [], theirs, ours)
+    elif key in IDENTITY: merged = merge_items(key, base or [], theirs, ours, lost)
+    else: merged = merge_value(key, base, theirs, ours, lost)
+    return merged, lost
+
+def merge_set(base, theirs, ours):
+    return [item for item in theirs if item in ours or item not in base] + [item for item in ours if item not in theirs and item not in base]
+
+def merge_items(key, base, theirs, ours, lost):
+    field = IDENTITY[key]
+    base_items, their_items = {i[field]: i for i in base}, {i[field]: i for i in theirs}
+    our_items = {i[field]: i for i in ours}
+    if key == 'recurring': # Rules both sides added got the same new id; ours moves to the next free one
+        next_id = max([*base_items, *their_items, *our_items], default=0) + 1
+        for rule_id in [i for i in our_items if i in their_items and i not in base_items and our_items[i] != their_items[i]]:
+            our_items[next_id] = dict(our_items.pop(rule_id), id=next_id); next_id += 1
+    merged = []
+    for item_key in list(their_items) + [k for k in our_items if k not in their_items]:
+        item = merge_value(f"{key}: {item_key}", base_items.get(item_key, MISSING), their_items.get(item_key, MISSING),
+                           our_items.get(item_key, MISSING), lost)
+        if item is not MISSING: merged.append(item)
+    return merged
+
+def merge_value(path, base, theirs, ours, lost, field=None):
+    if ours == base: return theirs
+    if theirs == base: return ours
+    if all(isinstance(value, dict) for value in (base, theirs, ours)):
+        merged = {}
+        for name in list(theirs) + [name for name in ours if name not in theirs]:
+            value = merge_value(f"{path}: {name}", base.get(name, MISSING), theirs.get(name, MISSING), ours.get(name, MISSING), lost, name)
+            if value is not MISSING: merged[name] = value
+        return merged
+    if field in RUNNING_TOTALS and all(isinstance(value, (int, float)) for value in (base, theirs, ours)):
+        return theirs + ours - base # Even when equal: both sides moved it the same way, e.g. both deleted one payment
+    if ours == theirs: return theirs
+    lost.append(path)
+    return theirs
@@ -0,0 +1,579 @@
+"""The snapshot and its journal: loading, saving, streaming and background writes.
+
+The snapshot is finances_data.json, or finances_data.bin in the binary format (see binary.py) once converted;
+BUDGET_TRACKER_SNAPSHOT=binary or =json picks the format the next save writes."""
+import heapq
+import json
+import os
+import re
+import threading
+import uuid
+from operator import itemgetter
+
+from .binary import BinarySnapshot, is_binary_snapshot, write_binary
+from .instrumentation import timed
+from .merging import APPEND_ONLY, base_copy
+
+try: import fcntl
+except ImportError: fcntl = None; import msvcrt # Windows
+
+DATA_FILE = "finances_data.json"
+BINARY_FILE = "finances_data.bin"
+SNAPSHOT_FORMAT = os.environ.get("BUDGET_TRACKER_SNAPSHOT") # "json" or "binary"; unset keeps the format already saved
+JOURNAL_FILE = "finances_data.journal"
+LOCK_FILE = "finances_data.lock"
+JOURNAL_COMPACT_THRESHOLD = 2000 # Journal records before they are folded back into the snapshot
+STREAM_BATCH_SIZE = 2000 # Transactions per batch when the snapshot is read incrementally
+SETTINGS_KEYS = ("accounts", "categories", "budgets", "loans", "theme", "balance_events", "recurring")
+
+def snapshot_file(writing=False):
+    """The snapshot file to read, or with writing, to save: the one in SNAPSHOT_FORMAT if set, else the binary one if
+    there is one. Until a save converts it, a snapshot in the other format is read instead."""
+    if SNAPSHOT_FORMAT: preferred = BINARY_FILE if SNAPSHOT_FORMAT == 'binary' else DATA_FILE
+    else: preferred = BINARY_FILE if os.path.exists(BINARY_FILE) else DATA_FILE
+    if writing or os.path.exists(preferred): return preferred
+    other = DATA_FILE if preferred == BINARY_FILE else BINARY_FILE
+    return other if os.path.exists(other) else preferred
+
+def read_snapshot(path):
+    """Everything in the snapshot file at path, binary or JSON, as it was saved; the journal is not applied."""
+    if is_binary_snapshot(path):
+        with BinarySnapshot(path) as snapshot: return dict(snapshot.settings, transactions=snapshot.read())
+    with open(path, 'r') as f: return json.load(f)
+
+def write_snapshot(path, snapshot, binary=False):
+    """Writes snapshot, a dict whose transactions come last, to path in the binary format or as JSON, atomically: it is
+    written to a temporary file that then replaces the old one. Raises ValueError if the binary format can't hold it."""
+    temp_file = path + ".tmp"
+    try:
+        with open(temp_file, 'wb' if binary else 'w') as f:
+            if binary: write_binary(f, {key: value for key, value in snapshot.items() if key != 'transactions'}, snapshot['transactions'])
+            else: json.dump(snapshot, f, indent=4)
+            f.flush()
+            os.fsync(f.fileno())
+    except ValueError:
+        os.remove(temp_file)
+        raise
+    os.replace(temp_file, path)
+
+@timed('load_data')
+def load_data():
+    """Loads the snapshot and replays the journal on top of it. If no file exists, creates a default structure."""
+    path = snapshot_file()
+    if not os.path.exists(path):
+        data = {
+            "accounts": [{"name": "My Wallet", "balance": 0}],
+            "categories": ["Food", "Transport", "Shopping", "Bills", "Misc"],
+            "budgets": {"Food": 500},
+            "transactions": [],
+            "loans": [],
+            "theme": "light", # Default theme
+            "balance_events": [],
+            "recurring": []
+        }
+        replay_journal(data)
+        return data
+    try:
+        data = read_snapshot(path)
+        if 'loans' not in data: data['loans'] = []
+        if 'theme' not in data: data['theme'] = 'light'
+        if 'balance_events' not in data: data['balance_events'] = []
+        if 'recurring' not in data: data['recurring'] = []
+    except (ValueError, FileNotFoundError): # Includes JSON and binary files cut short
+        data = {
+            "accounts": [], "categories": [], "budgets": {}, "transactions": [], "loans": [], "theme": "light", "balance_events": [],
+            "recurring": []
+        }
+    replay_journal(data)
+    data.pop('next_transaction_id', None)
+    if assign_transaction_ids(data['transactions']):
+        # Ids were renumbered, so fold the journal into the snapshot now; its records refer to the old ids.
+        with FileLock():
+            save_data(data)
+            open(JOURNAL_FILE, 'w').close()
+    return data
+
+def assign_transaction_ids(transactions):
+    """Gives every transaction a unique integer id, keeping the integer ids already present. Returns True if any id changed."""
+    seen, missing = set(), []
+    for t in transactions:
+        trans_id = t.get('id')
+        if type(trans_id) is int and trans_id not in seen: seen.add(trans_id)
+        else: missing.append(t)
+    for new_id, t in enumerate(missing, max(seen, default=0) + 1):
+        t['id'] = new_id
+    return bool(missing)
+
+def snapshot_layout(data):
+    """data as a snapshot holds it: transactions last and newest first, after the id counter, so stream_snapshot() can
+    hand over recent ones early."""
+    transactions = sorted(data['transactions'], key=itemgetter('date'), reverse=True)
+    snapshot = {key: value for key, value in data.items() if key not in ('transactions', 'folded_seq')}
+    snapshot['next_transaction_id'] = max((t['id'] for t in transactions), default=0) + 1
+    snapshot['transactions'] = transactions
+    return snapshot
+
+@timed('save_data')
+def save_data(data):
+    """Saves the given data as the snapshot (see snapshot_file()), atomically, and removes one in the other format,
+    which the journal no longer follows."""
+    snapshot = snapshot_layout(data)
+    path = snapshot_file(writing=True)
+    try: write_snapshot(path, snapshot, path == BINARY_FILE)
+    except ValueError as e:
+        if path != BINARY_FILE: raise
+        print(f"Warning: The data can't be saved in the binary format ({e}); saving it as JSON instead.")
+        path = DATA_FILE
+        write_snapshot(path, snapshot)
+    other = DATA_FILE if path == BINARY_FILE else BINARY_FILE
+    if os.path.exists(other): os.remove(other)
+
+def convert_snapshot(binary, path=None):
+    """Saves the snapshot again in the binary format, or as JSON, and removes the old file; the journal carries on from
+    the new one. With path, writes a copy there instead, with the journal's changes applied. Returns the path written."""
+    if path:
+        write_snapshot(path, snapshot_layout(load_data()), binary)
+        return path
+    with FileLock():
+        source, target = snapshot_file(), BINARY_FILE if binary else DATA_FILE
+        if not os.path.exists(source): raise FileNotFoundError(f"There is no {DATA_FILE} or {BINARY_FILE} here to convert.")
+        write_snapshot(target, read_snapshot(source), binary)
+        if source != target: os.remove(source)
+    return target
+
+class JsonStreamReader:
+    """Reads JSON values one at a time from a file, holding only a small window of its text in memory."""
+    READ_SIZE = 1 << 16
+    WHITESPACE = re.compile(r'\s*')
+
+    def __init__(self, f):
+        self.f = f
+        self.buffer = ''
+        self.pos = 0
+        self.eof = False
+        self.decoder = json.JSONDecoder()
+
+    def fill(self):
+        text = self.f.read(self.READ_SIZE)
+        if not text: self.eof = True; return False
+        self.buffer = self.buffer[self.pos:] + text
+        self.pos = 0
+        return True
+
+    def peek(self):
+        """Skips whitespace and returns the next character, or '' at the end of the file."""
+        while True:
+            self.pos = self.WHITESPACE.match(self.buffer, self.pos).end()
+            if self.pos < len(self.buffer): return self.buffer[self.pos]
+            if not self.fill(): return ''
+
+    def expect(self, char):
+        if self.peek() != char: raise json.JSONDecodeError(f"Expecting {char!r}", self.buffer, self.pos)
+        self.pos += 1
+
+    def value(self):
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.pos)
+                if end < len(self.buffer) or self.eof: # A number ending at the window's edge may continue past it
+                    self.pos = end
+                    return value
+            except json.JSONDecodeError:
+                if self.eof: raise
+            self.fill()
+
+def snapshot_seq(path=None):
+    """The number of the last journal record folded into the snapshot, read without parsing its transactions."""
+    try:
+        for key, value in stream_snapshot(path):
+            if key == 'journal_seq': return value
+            if key == 'transactions': break
+    except (OSError, ValueError): pass
+    return 0
+
+def stream_snapshot(path=None, batch_size=STREAM_BATCH_SIZE):
+    """Reads the snapshot (by default the current one) incrementally. Yields (key, value) for each top-level entry,
+    except that 'transactions' is yielded as a series of ('transactions', batch) lists of up to batch_size transactions.
+    A binary snapshot's batches are decoded from its memory map one at a time, as they are asked for."""
+    path = path or snapshot_file()
+    if is_binary_snapshot(path):
+        with BinarySnapshot(path) as snapshot:
+            yield from snapshot.settings.items()
+            for start in range(0, max(len(snapshot), 1), batch_size): yield 'transactions', snapshot.read(start, start + batch_size)
+        return
+    with open(path, 'r') as f:
+        reader = JsonStreamReader(f)
+        reader.expect('{')
+        if reader.peek() == '}': return
+        while True:
+            key = reader.value()
+            reader.expect(':')
+            if key == 'transactions' and reader.peek() == '[':
+                reader.expect('[')
+                batch = []
+                while reader.peek() != ']':
+                    batch.append(reader.value())
+                    if len(batch) >= batch_size: yield key, batch; batch = []
+                    if reader.peek() == ',': reader.pos += 1
+                reader.expect(']')
+                yield key, batch
+            else:
+                yield key, reader.value()
+            if reader.peek() != ',': break
+            reader.pos += 1
+        reader.expect('}')
+
+def replay_journal(data, path=JOURNAL_FILE):
+    """Applies the journal records newer than the snapshot to data, in the order they were written."""
+    overlay = JournalOverlay(path, data.get('journal_seq', 0))
+    overlay.apply_settings(data)
+    if overlay.changes or overlay.renames:
+        transactions = [t for t in map(overlay.apply, data['transactions']) if t is not None]
+        data['transactions'] = transactions + list(overlay.additions())
+    data['journal_seq'], data['folded_seq'] = overlay.last_seq, overlay.folded_seq
+
+class JournalOverlay:
+    """The journal records newer than a snapshot, grouped by transaction so that each snapshot transaction
+    can be brought up to date on its own, as it is read."""
+    def __init__(self, path=JOURNAL_FILE, last_seq=0):
+        self.settings = {}
+        self.changes = {} # Transaction id -> [(position, record)]
+        self.renames = [] # [(position, record)] for category renames, which touch every transaction
+        self.added = {} # Ids of the transactions added by the journal, in order
+        self.appended = {} # Settings key -> the items appended to it since its last full value
+        self.seen = set()
+        self.folded_seq = last_seq # The snapshot's journal_seq
+        self.last_seq = last_seq
+        if not os.path.exists(path): return
+        with open(path, 'r') as f:
+            for position, line in enumerate(f):
+                try: record = json.loads(line)
+                except json.JSONDecodeError: continue # Torn by a crash mid-write; the next writer ends the line
+                if record.get('seq', self.last_seq + 1) <= self.last_seq: continue # Already folded into the snapshot
+                self.last_seq = record.get('seq', self.last_seq)
+                op = record['op']
+                if op == 'set': self.settings[record['key']] = record['value']; self.appended.pop(record['key'], None)
+                elif op == 'append': self.appended.setdefault(record['key'], []).append(record['item'])
+                elif op == 'recategorize': self.renames.append((position, record))
+                else:
+                    trans_id = record['t']['id'] if op == 'add' else record['id']
+                    self.changes.setdefault(trans_id, []).append((position, record))
+                    if op == 'add': self.added[trans_id] = True
+
+    def apply_settings(self, data):
+        """Brings the settings collections in data up to date with the journal."""
+        data.update(self.settings)
+        for key, items in self.appended.items(): data[key] = data.get(key, []) + items
+
+    def apply(self, trans):
+        """Returns trans with the journal's changes applied, or None if the journal deleted it."""
+        changes = self.changes.get(trans.get('id'), ())
+        if changes: self.seen.add(trans['id'])
+        if not changes and not self.renames: return trans
+        return self.replay(trans, heapq.merge(changes, self.renames, key=itemgetter(0)))
+
+    def additions(self):
+        """The transactions the journal added that were not in the snapshot, with their later changes applied."""
+        for trans_id in self.added:
+            if trans_id in self.seen: continue
+            trans = self.replay(None, heapq.merge(self.changes[trans_id], self.renames, key=itemgetter(0)))
+            if trans is not None: yield trans
+
+    @staticmethod
+    def replay(trans, records):
+        for position, record in records:
+            op = record['op']
+            if op == 'add': trans = dict(trans or {}, **record['t'])
+            elif trans is None: continue # Not added yet, or deleted
+            elif op == 'edit': trans = dict(trans, **record['t'])
+            elif op == 'delete': trans = None
+            elif trans['category'] == record['old']: trans = dict(trans, category=record['new'])
+        return trans
+
+class FileLock:
+    """Advisory lock on LOCK_FILE, taken by every copy of the app working in the same folder while it reads the
+    journal for the others' changes or writes the journal or the snapshot. It also keeps this copy's threads apart."""
+    def __init__(self, path=LOCK_FILE):
+        self.path = path
+        self.thread_lock = threading.Lock()
+        self.file = None
+
+    def acquire(self, blocking=True):
+        """Returns False, without waiting, if blocking is false and the lock is held."""
+        if not self.thread_lock.acquire(blocking): return False
+        try:
+            if self.file is None: self.file = open(self.path, 'a+b')
+            if fcntl: fcntl.flock(self.file, fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+            else: self.file.seek(0); msvcrt.locking(self.file.fileno(), msvcrt.LK_LOCK if blocking else msvcrt.LK_NBLCK, 1)
+            return True
+        except OSError:
+            self.thread_lock.release()
+            if blocking: raise
+            return False
+
+    def release(self):
+        if fcntl: fcntl.flock(self.file, fcntl.LOCK_UN)
+        else: self.file.seek(0); msvcrt.locking(self.file.fileno(), msvcrt.LK_UNLCK, 1)
+        self.thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+    def close(self):
+        if self.file is not None: self.file.close(); self.file = None
+
+class Journal:
+    """Append-only log of mutations written next to the snapshot, so an edit costs one small record instead of a full save.
+
+    Several copies of the app can share it. Records are numbered as they are written, under the FileLock, following the
+    last record in the file, and carry the id of the copy that wrote them ('by'); the snapshot stores the number of the
+    last record folded into it ('journal_seq'). A copy only appends once it has taken in every record the others wrote
+    (read_new() collects them in incoming for the owner to apply), so each record is based on everything before it.
+    record() is called from the Tk thread, commit() and compact() from the BackgroundWriter thread."""
+    def __init__(self, path=JOURNAL_FILE, seq=0, folded_seq=None, snapshot_id=None):
+        self.path = path
+        self.lock = threading.Lock()
+        self.file_lock = FileLock(os.path.join(os.path.dirname(path), LOCK_FILE))
+        self.copy_id = uuid.uuid4().hex[:12]
+        self.pending = [] # [record, text, n, was] for each record not written yet: n counts this copy's records, and was
+                          # is the transaction an edit or delete changed, for settling conflicts (see JsonStorage.sync)
+        self.recorded = 0 # Records made by this copy
+        self.written = [] # (n, number in the file) of this copy's records written since the last snapshot
+        self.snapshot_mark = 0 # Record number the last snapshot queued will hold, counting the pending ones
+        self.seq = seq # Last record number in the file, as far as this copy has read
+        self.folded_seq = seq if folded_seq is None else folded_seq # Last record number the snapshot holds
+        self.applied_seq = seq # Last record of another copy taken into the data
+        self.incoming = [] # Records of other copies read but not applied yet
+        self.missed = False # Another copy folded records this copy never read into a new snapshot
+        self.synced = {} # Settings key -> the saved value this copy's data was last brought up to (see merging.base_copy)
+        self.appended = dict.fromkeys(APPEND_ONLY, 0) # Settings key -> items of an append-only collection recorded so far
+        self.offset = 0 # Bytes of the journal read
+        self.file_id = None
+        self.snapshot_id = snapshot_id
+        with self.file_lock: self.read_new()
+
+    def record(self, op, was=None, **fields):
+        fields['op'], fields['by'] = op, self.copy_id
+        with self.lock:
+            if op == 'set': # Only the last value of a collection counts
+                self.pending = [entry for entry in self.pending if entry[0]['op'] != 'set' or entry[0]['key'] != fields['key']]
+            self.recorded += 1
+            self.pending.append([fields, json.dumps(fields, separators=(',', ':')), self.recorded, was])
+
+    def record_settings(self, data, keys=SETTINGS_KEYS):
+        """Records the full value of each collection in keys, except that an append-only one (see merging.APPEND_ONLY)
+        gets one record per item added since the last call, so saving it doesn't cost its whole history."""
+        for key in keys:
+            if key not in APPEND_ONLY: self.record('set', key=key, value=base_copy(key, data[key])); continue
+            for item in data[key][self.appended[key]:]: self.record('append', key=key, item=item)
+            self.appended[key] = len(data[key])
+
+    def pending_records(self):
+        """(record, was) for each record not written yet."""
+        with self.lock: return [(entry[0], entry[3]) for entry in self.pending]
+
+    def unwritten(self, key):
+        """The items this copy's unwritten records append to the append-only collection key, in order."""
+        with self.lock: return [entry[0]['item'] for entry in self.pending if entry[0]['op'] == 'append' and entry[0]['key'] == key]
+
+    def withdraw(self, key, item):
+        """Drops this copy's unwritten record appending item to key, for when another copy appended the same item first.
+        Returns whether there was one."""
+        with self.lock:
+            for entry in self.pending:
+                if entry[0]['op'] == 'append' and entry[0]['key'] == key and entry[0]['item'] == item:
+                    self.pending.remove(entry); return True
+        return False
+
+    def rebase(self, trans_id, was):
+        """Sets the version this copy's unwritten records about trans_id started from, once another copy's change to
+        it has been merged in."""
+        with self.lock:
+            for entry in self.pending:
+                record = entry[0]
+                if (record['t']['id'] if record['op'] == 'add' else record.get('id')) == trans_id: entry[3] = was; return
+
+    def renumber(self, old_id, new_id):
+        """Moves this copy's unwritten records about transaction old_id to new_id."""
+        with self.lock:
+            for entry in self.pending:
+                record = entry[0]
+                if record['op'] == 'add' and record['t']['id'] == old_id: record['t'] = dict(record['t'], id=new_id)
+                elif record['op'] in ('edit', 'delete') and record['id'] == old_id: record['id'] = new_id
+                else: continue
+                entry[1] = json.dumps(record, separators=(',', ':'))
+
+    def changed_on_disk(self):
+        """Cheap check, without the lock, for whether another copy may have written since the last read."""
+        try: stat = os.stat(self.path)
+        except FileNotFoundError: return False
+        return (stat.st_dev, stat.st_ino) != self.file_id or stat.st_size != self.offset
+
+    def read_new(self):
+        """Reads the records appended since the last call; other copies' go to incoming. Call with file_lock held."""
+        try: stat = os.stat(self.path)
+        except FileNotFoundError: return
+        file_id = stat.st_dev, stat.st_ino
+        if file_id != self.file_id: # First read, or the journal was replaced by a compaction
+            if self.file_id is not None: self.check_snapshot()
+            self.file_id, self.offset = file_id, 0
+        if stat.st_size < self.offset: self.offset = 0
+        if stat.st_size == self.offset: return
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            for line in f:
+                if not line.endswith(b'\n'): break # Torn by a crash mid-write
+                self.offset += len(line)
+                try: record = json.loads(line)
+                except ValueError: continue
+                seq = record.get('seq', 0)
+                if seq <= self.seq: continue
+                self.seq = seq
+                if record.get('by') != self.copy_id:
+                    with self.lock: self.incoming.append(record)
+
+    def check_snapshot(self):
+        try: stat = os.stat(snapshot_file())
+        except FileNotFoundError: return
+        snapshot_id = stat.st_ino, stat.st_mtime_ns
+        if snapshot_id == self.snapshot_id: return
+        self.snapshot_id = snapshot_id
+        folded_seq = snapshot_seq()
+        if folded_seq > self.seq: self.missed = True
+        self.folded_seq = max(self.folded_seq, folded_seq)
+
+    def poll(self):
+        """Reads what other copies have written, if the file changed and the lock is free. Returns True when there
+        are records to apply (or missed records to reload)."""
+        if self.changed_on_disk() and self.file_lock.acquire(blocking=False):
+            try: self.read_new()
+            finally: self.file_lock.release()
+        return bool(self.incoming) or self.missed
+
+    def applied(self, count):
+        """Drops the first count incoming records, now taken into the data."""
+        with self.lock:
+            if count: self.applied_seq = self.incoming[count - 1]['seq']
+            del self.incoming[:count]
+
+    @timed('journal_commit')
+    def commit(self):
+        """Numbers and writes the pending records and syncs them to disk with a single fsync. Leaves them pending while
+        records of other copies wait to be applied; the owner commits again once it has taken them in."""
+        with self.file_lock:
+            self.read_new()
+            with self.lock:
+                if self.incoming or self.missed or not self.pending: return
+                entries, self.pending = self.pending, []
+            lines = [f'{{"seq":{seq},{entry[1][1:]}' for seq, entry in enumerate(entries, self.seq + 1)]
+            with open(self.path, 'ab') as f:
+                stat = os.fstat(f.fileno())
+                if stat.st_size > self.offset: f.write(b'\n') # Ends a line torn by a crash
+                f.write(('\n'.join(lines) + '\n').encode())
+                f.flush()
+                os.fsync(f.fileno())
+                self.file_id, self.offset = (stat.st_dev, stat.st_ino), f.tell()
+            with self.lock:
+                for seq, (record, _, n, _) in enumerate(entries, self.seq + 1):
+                    self.written.append((n, seq))
+                    if record['op'] == 'set': self.synced[record['key']] = record['value']
+            self.seq += len(entries)
+
+    def needs_compaction(self):
+        """Whether JOURNAL_COMPACT_THRESHOLD records, whichever session or copy made them, have been made since the snapshot
+        and since the last snapshot this copy queued."""
+        with self.lock: last_seq = self.seq + len(self.pending)
+        return last_seq - max(self.folded_seq, self.snapshot_mark) >= JOURNAL_COMPACT_THRESHOLD
+
+    def mark_snapshot(self):
+        """Notes what a snapshot of the data taken now holds, for compact(): (this copy's records, other copies' records)."""
+        with self.lock:
+            self.snapshot_mark = self.seq + len(self.pending)
+            return self.recorded, self.applied_seq
+
+    def compact(self, data, mark):
+        """Writes data, which holds this copy's records up to mark[0] and the other copies' up to number mark[1], as the
+        new snapshot and drops the records it holds from the journal. Skipped if other copies wrote records the data
+        doesn't hold; a later commit tries again."""
+        recorded, applied_seq = mark
+        with self.file_lock:
+            self.read_new()
+            with self.lock:
+                if self.incoming or self.missed or self.applied_seq != applied_seq: return
+                if any(n <= recorded for _, _, n, _ in self.pending): return # The write failed or hasn't happened
+                folded = max([applied_seq] + [seq for n, seq in self.written if n <= recorded])
+                self.written = [(n, seq) for n, seq in self.written if n > recorded]
+            save_data(dict(data, journal_seq=folded))
+            kept = []
+            with open(self.path, 'rb') as f:
+                for line in f:
+                    try:
+                        if json.loads(line).get('seq', 0) > folded: kept.append(line)
+                    except ValueError: pass
+            temp_file = self.path + ".tmp"
+            with open(temp_file, 'wb') as f:
+                f.writelines(kept)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_file, self.path)
+            stat, snapshot = os.stat(self.path), os.stat(snapshot_file())
+            self.file_id, self.offset = (stat.st_dev, stat.st_ino), stat.st_size
+            self.snapshot_id = snapshot.st_ino, snapshot.st_mtime_ns
+            self.folded_seq = folded
+
+    def close(self):
+        self.file_lock.close()
+
+class BackgroundWriter:
+    """Runs disk writes on a worker thread so the Tk mainloop never waits on them.
+    Jobs submitted under a key that is still queued replace the queued job, so a burst of edits costs one write."""
+    def __init__(self):
+        self.jobs = {}
+        self.busy = False
+        self.closed = False
+        self.error = None
+        self.condition = threading.Condition()
+        self.thread = threading.Thread(target=self.run, name="BackgroundWriter", daemon=True)
+        self.thread.start()
+
+    def submit(self, key, job):
+        with self.condition:
+            self.jobs[key] = job
+            self.condition.notify_all()
+
+    def run(self):
+        while True:
+            with self.condition:
+                while not self.jobs and not self.closed: self.condition.wait()
+                if not self.jobs: return
+                key = next(iter(self.jobs))
+                job = self.jobs.pop(key)
+                self.busy = True
+            try: job()
+            except Exception as e:
+                self.error = e
+                print(f"Warning: Could not save data ({key}): {e}")
+            finally:
+                with self.condition:
+                    self.busy = False
+                    self.condition.notify_all()
+
+    def flush(self):
+        """Blocks until every queued job has run."""
+        with self.condition:
+            while self.jobs or self.busy: self.condition.wait()
+
+    def close(self):
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+        self.thread.join()
+
+    def take_error(self):
+        error, self.error = self.error, None
+        return error
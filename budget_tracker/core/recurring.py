@@ -0,0 +1,56 @@
+"""Recurring payments: rent, subscriptions, loan installments.
+
+A rule is one small record in data['recurring'] however long it runs: {'id', 'description', 'amount', 'category',
+'account_name', 'frequency', 'interval', 'start', 'end', 'posted_through'}. Its dates are worked out arithmetically
+for whatever window is asked for, so nothing is stored per occurrence until an occurrence comes due and
+Ledger.post_due_payments() files it as an ordinary payment."""
+import calendar
+from datetime import date, timedelta
+
+FREQUENCIES = ('daily', 'weekly', 'monthly', 'yearly') # Each every 'interval' days, weeks, months or years
+STEP_DAYS = {'daily': 1, 'weekly': 7}
+STEP_MONTHS = {'monthly': 1, 'yearly': 12}
+
+def occurrences(rule, first, last):
+    """The rule's dates from first to last (dates, both included), oldest first.
+    Monthly and yearly rules keep the start's day of the month, or the month's last day when it is shorter."""
+    start = date.fromisoformat(rule['start'])
+    if rule.get('end'): last = min(last, date.fromisoformat(rule['end']))
+    first = max(first, start)
+    if first > last: return
+    if rule['frequency'] in STEP_DAYS:
+        step = STEP_DAYS[rule['frequency']] * rule['interval']
+        day = start + timedelta(days=-(-(first - start).days // step) * step)
+        while day <= last:
+            yield day
+            day += timedelta(days=step)
+    else:
+        step = STEP_MONTHS[rule['frequency']] * rule['interval']
+        start_index = start.year * 12 + start.month - 1
+        n = max(0, (first.year * 12 + first.month - 1 - start_index) // step)
+        while True:
+            index = start_index + n * step
+            year, month = divmod(index, 12)
+            day = date(year, month + 1, min(start.day, calendar.monthrange(year, month + 1)[1]))
+            if day > last: return
+            if day >= first: yield day
+            n += 1
+
+def upcoming(rules, first, last):
+    """(date, rule) for every occurrence of rules from first to last, in date order."""
+    return sorted(((day, rule) for rule in rules for day in occurrences(rule, first, last)), key=lambda item: (item[0], item[1]['id']))
+
+def due(rule, today):
+    """The rule's dates that have come due by today and not been posted yet."""
+    posted_through = rule.get('posted_through')
+    first = date.fromisoformat(posted_through) + timedelta(days=1) if posted_through else date.min
+    return occurrences(rule, first, today)
+
+def frequency_text(rule):
+    """'every month', 'every 2 weeks', ..."""
+    unit = {'daily': 'day', 'weekly': 'week', 'monthly': 'month', 'yearly': 'year'}[rule['frequency']]
+    return f"every {unit}" if rule['interval'] == 1 else f"every {rule['interval']} {unit}s"
+
+def next_due(rule):
+    """The date the rule next comes due, or None when it has ended."""
+    return next(due(rule, date.max), None)
@@ -0,0 +1,36 @@
+"""Multi-month reports read from the storage's spending cube (month x category x account totals, kept up to date
+as transactions change), so their cost depends on the months, categories and accounts shown, not on the history."""
+import calendar
+
+REPORT_PERIODS = (12, 24, 60) # Months
+
+def months_back(year, month, count):
+    """The count months ending with year-month, oldest first, as 'YYYY-MM' strings."""
+    index = year * 12 + month - 1
+    return [f"{i // 12:04d}-{i % 12 + 1:02d}" for i in range(index - count + 1, index + 1)]
+
+def spending_trend(storage, months, by='category'):
+    """{category, or account with by='account': [spending in each of months]}, for the months from months_back()."""
+    position = {month: i for i, month in enumerate(months)}
+    trend = {}
+    for month, category, account, total in storage.spending_cells(months[0], months[-1]):
+        key = category if by == 'category' else account
+        trend.setdefault(key, [0.0] * len(months))[position[month]] += total
+    return trend
+
+def cash_flow(ledger, months):
+    """(month, money added, spending, net, total balance at the end of the month) for each of months.
+    Money added is the funds put into accounts; transfers between them move nothing in or out. Month-end balances
+    come from the ledger's balance history, so they are exact even when changes were recorded out of date order."""
+    added = dict.fromkeys(months, 0.0)
+    for e in ledger.data['balance_events']:
+        if e['kind'] == 'funds' and e['date'][:7] in added: added[e['date'][:7]] += e['amount']
+    spent = dict.fromkeys(months, 0.0)
+    for month, _, _, total in ledger.storage.spending_cells(months[0], months[-1]): spent[month] += total
+    history = ledger.balance_history()
+    return [(month, added[month], spent[month], added[month] - spent[month], history.total(month_end(month))) for month in months]
+
+def month_end(month):
+    """The last day of a 'YYYY-MM' month, as 'YYYY-MM-DD'."""
+    year, number = int(month[:4]), int(month[5:7])
+    return f"{month}-{calendar.monthrange(year, number)[1]:02d}"
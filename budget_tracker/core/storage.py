@@ -0,0 +1,725 @@
+"""Storage backends. open_storage() opens the configured one; both answer the same queries."""
+import copy
+import json
+import os
+import queue
+import sqlite3
+import threading
+import time
+from array import array
+
+from .indexes import ColumnarTransactionStore, SpendingRollup, TextIndex, TransactionStore, date_ordinal, description_words, newest_page
+from .instrumentation import timed
+from .merging import APPEND_ONLY, base_copy, merge
+from .persistence import (SETTINGS_KEYS, BackgroundWriter, FileLock, Journal, JournalOverlay, load_data, snapshot_file,
+                          stream_snapshot)
+
+STORAGE_BACKEND = os.environ.get("BUDGET_TRACKER_STORAGE", "json") # "json" or "sqlite"
+SQLITE_FILE = "finances_data.db"
+TRANSACTION_FIELDS = ("id", "date", "description", "amount", "category", "account_name")
+EVENT_FIELDS = ("date", "account", "amount", "kind")
+COMPACT_TRANSACTIONS = os.environ.get("BUDGET_TRACKER_COMPACT") == "1" # Column arrays instead of one dict per transaction
+
+@timed('open_storage')
+def open_storage(backend=STORAGE_BACKEND):
+    """Opens the configured storage backend."""
+    if backend == 'sqlite': return SqliteStorage()
+    return JsonStorage()
+
+def snapshot_identity():
+    try: stat = os.stat(snapshot_file())
+    except FileNotFoundError: return None
+    return stat.st_ino, stat.st_mtime_ns
+
+class JsonStorage:
+    """Keeps every transaction in memory, persisted as the JSON snapshot plus the journal.
+
+    Snapshots written newest first are loaded incrementally: the settings and the first batch of transactions
+    are read up front, and a reader thread parses the rest into a queue that load_pending() drains on the Tk thread.
+    Other copies of the app may share the files; sync() takes in what they write."""
+    def __init__(self):
+        self.loading = False # Batches are still arriving from the reader thread
+        self.read_failed = False # The snapshot could not be read to the end, so it must not be rewritten
+        self.late_renames = [] # Category renames made while loading, applied to the batches still to come
+        with FileLock(): # So another copy can't compact the files between reading the snapshot and the journal
+            snapshot_id = snapshot_identity()
+            self.data = self.open_stream()
+            if self.data is None:
+                self.data = load_data()
+                self.transactions = self.create_store(self.data.pop('transactions'))
+        self.rollup = SpendingRollup(self.transactions.spending_by_month())
+        self.text_index = TextIndex(self.transactions)
+        self.journal = Journal(seq=self.data.pop('journal_seq'), folded_seq=self.data.pop('folded_seq'), snapshot_id=snapshot_id)
+        self.journal.synced = {key: base_copy(key, self.data[key]) for key in SETTINGS_KEYS if key in self.data and key not in APPEND_ONLY}
+        self.journal.appended = {key: len(self.data[key]) for key in APPEND_ONLY}
+        self.writer = BackgroundWriter()
+
+    def open_stream(self):
+        """Reads the settings and the newest transactions and starts the reader thread.
+        Returns the settings, or None when the snapshot has to be loaded whole."""
+        path = snapshot_file()
+        if not os.path.exists(path): return None
+        entries = stream_snapshot(path)
+        data, key = {}, None
+        try:
+            for key, value in entries:
+                if key == 'transactions': break
+                data[key] = value
+        except ValueError: return None # Not valid JSON or not a complete binary snapshot
+        if key != 'transactions' or 'journal_seq' not in data or 'next_transaction_id' not in data:
+            entries.close() # Written before snapshots were ordered for streaming
+            return None
+        overlay = JournalOverlay(last_seq=data['journal_seq'])
+        overlay.apply_settings(data)
+        data['journal_seq'], data['folded_seq'] = overlay.last_seq, overlay.folded_seq
+        if 'loans' not in data: data['loans'] = []
+        if 'theme' not in data: data['theme'] = 'light'
+        if 'balance_events' not in data: data['balance_events'] = []
+        if 'recurring' not in data: data['recurring'] = []
+        self.transactions = self.create_store(list(overlay.additions()) + [t for t in map(overlay.apply, value) if t is not None])
+        self.transactions.next_id = max(self.transactions.next_id, data.pop('next_transaction_id')) # Ids of the rows still to come are taken
+        self.loading = True
+        self.batches = queue.Queue(maxsize=8) # Bounds how far parsing runs ahead of the store
+        threading.Thread(target=self.read_remaining, args=(entries, overlay, path), name="SnapshotReader", daemon=True).start()
+        return data
+
+    def read_remaining(self, entries, overlay, path):
+        """Runs on the reader thread."""
+        try:
+            for key, batch in entries:
+                if key == 'transactions': self.batches.put([t for t in map(overlay.apply, batch) if t is not None])
+        except (ValueError, OSError) as e:
+            self.read_failed = True
+            print(f"Warning: Could not read every transaction from {path}: {e}")
+        self.batches.put(None)
+
+    def load_pending(self, budget=0.02, wait=False):
+        """Adds the batches read so far to the store, for up to budget seconds; with wait, adds every batch,
+        blocking until the reader thread is done. Returns the number of transactions added."""
+        added = 0
+        deadline = time.perf_counter() + budget
+        while self.loading and (wait or time.perf_counter() < deadline):
+            try: batch = self.batches.get(block=wait)
+            except queue.Empty: break
+            if batch is None: self.loading = False; break
+            for trans in batch:
+                for old, new in self.late_renames:
+                    if trans['category'] == old: trans = dict(trans, category=new)
+                self.transactions.add(trans)
+                self.rollup.add(trans)
+                self.text_index.add(trans)
+            added += len(batch)
+        return added
+
+    @staticmethod
+    def create_store(transactions):
+        if not COMPACT_TRANSACTIONS: return TransactionStore(transactions)
+        try: return ColumnarTransactionStore(transactions)
+        except (ValueError, TypeError, KeyError):
+            print("Warning: Transactions with invalid dates can't be stored compactly; using the standard store.")
+            return TransactionStore(transactions)
+
+    def get_transaction(self, trans_id, for_update=False):
+        return self.transactions.get(trans_id)
+
+    def find_transactions(self, category=None, text=None, date_from=None, date_to=None, amount_min=None, amount_max=None,
+                          sort_by='date', reverse=True):
+        """Returns the matching transactions, newest first unless another sort field is given.
+        text matches descriptions containing words that start with each of its words; date and amount bounds are inclusive."""
+        return self.transactions.find(category, self.text_index.search(text) if text else None,
+                                      date_from, date_to, amount_min, amount_max, sort_by, reverse)
+
+    def transactions_page(self, limit, after=None, category=None, text=None, date_from=None, date_to=None, amount_min=None, amount_max=None):
+        """Up to limit matching transactions, newest first by date then id, continuing after the (date, id) that ended
+        the previous page. Same filters as find_transactions(), but only a page's worth of rows is visited."""
+        ids = self.text_index.search(text) if text else None
+        return newest_page(self.transactions, limit, after, category, ids, date_from, date_to, amount_min, amount_max)
+
+    def monthly_spending(self, year, month):
+        return self.rollup.month(year, month)
+
+    def spending_cells(self, first_month, last_month):
+        """(month, category, account, total) for each month from first_month to last_month, 'YYYY-MM', inclusive."""
+        return self.rollup.cells(first_month, last_month)
+
+    def daily_spending(self):
+        """Spending totals as {(account, day number): total}, for building balance histories."""
+        return self.transactions.spending_by_day()
+
+    def add_transaction(self, trans):
+        """Stores a new transaction, assigning its id. Returns the transaction."""
+        self.insert(trans)
+        self.journal.record('add', t=trans)
+        return trans
+
+    def add_transactions(self, transactions):
+        """Stores a batch of new transactions, assigning their ids. They reach disk with the next commit, in one journal write."""
+        for trans in transactions: self.add_transaction(trans)
+        return transactions
+
+    def update_transaction(self, trans_id, changes):
+        old = self.transactions.get(trans_id)
+        self.replace(old, changes)
+        self.journal.record('edit', was=old, id=old['id'], t=changes)
+
+    def delete_transaction(self, trans_id):
+        trans = self.remove(trans_id)
+        self.journal.record('delete', was=trans, id=trans['id'])
+
+    def rename_category(self, old, new):
+        self.transactions.rename_category(old, new)
+        self.rollup.rename_category(old, new)
+        self.journal.record('recategorize', old=old, new=new)
+        if self.loading: self.late_renames.append((old, new))
+
+    def insert(self, trans):
+        self.transactions.add(trans)
+        self.rollup.add(trans)
+        self.text_index.add(trans)
+
+    def replace(self, old, changes):
+        self.rollup.remove(old)
+        self.text_index.remove(old)
+        trans = self.transactions.update(old['id'], changes)
+        self.rollup.add(trans)
+        self.text_index.add(trans)
+        return trans
+
+    def remove(self, trans_id):
+        trans = self.transactions.delete(trans_id)
+        self.rollup.remove(trans)
+        self.text_index.remove(trans)
+        return trans
+
+    def commit(self, changed=SETTINGS_KEYS):
+        """Queues pending transaction changes plus the named settings collections for the writer thread. Items appended
+        to an append-only collection are recorded whether it is named or not, so a snapshot never holds unrecorded ones."""
+        self.journal.record_settings(self.data, [key for key in SETTINGS_KEYS if key in changed or key in APPEND_ONLY])
+        self.writer.submit('journal', self.journal.commit)
+        if self.journal.needs_compaction() and not self.loading and not self.read_failed:
+            mark = self.journal.mark_snapshot()
+            snapshot = dict(copy.deepcopy(self.data), transactions=self.transactions.snapshot())
+            self.writer.submit('snapshot', lambda: self.journal.compact(snapshot, mark))
+
+    # --- Other copies ---
+    def sync(self):
+        """Takes in the records other copies of the app have written since the last call. Returns (collections changed,
+        descriptions of this copy's changes that lost to theirs, adjustments), where adjustments are (transaction, sign)
+        pairs: payments the merged balances count once too few (sign 1) or too many (-1), for Ledger.sync to settle.
+
+        Their records come before this copy's unwritten ones in the journal, the order every copy replays: a field both
+        sides changed keeps this copy's value, a deleted transaction stays deleted, and a settings collection both sides
+        changed is merged (see merging.py). Only once they are taken in are this copy's records written."""
+        if self.loading or not self.journal.poll(): return (), [], []
+        if self.journal.missed: return self.reload()
+        records = list(self.journal.incoming)
+        result = self.apply_records(records)
+        self.journal.applied(len(records))
+        self.writer.submit('journal', self.journal.commit)
+        return result
+
+    def apply_records(self, records):
+        ours, renames, settings = {}, [], set() # ours: transaction id -> fields this copy's unwritten records set
+        base, mine = {}, {} # Transaction id -> the version before this copy's unwritten changes, and after them
+        for record, was in self.journal.pending_records():
+            op = record['op']
+            if op == 'set': settings.add(record['key']); continue
+            if op == 'append': continue
+            if op == 'recategorize': renames.append((record['old'], record['new'])); continue
+            trans_id = record['t']['id'] if op == 'add' else record['id']
+            if trans_id not in base: base[trans_id] = was
+            ours[trans_id] = ours.get(trans_id, set()) | set(record['t'] if op != 'delete' else ())
+        for trans_id in base: mine[trans_id] = self.transactions.get(trans_id)
+        theirs = {} # Transaction id -> their version, for the transactions both sides changed
+
+        def our_category(category):
+            for old, new in renames:
+                if category == old: category = new
+            return category
+
+        changed, lost = set(), []
+        for record in records:
+            op = record['op']
+            if op == 'set':
+                key, value = record['key'], record['value']
+                if key in settings:
+                    self.data[key], conflicts = merge(key, self.journal.synced.get(key), value, self.data[key])
+                    lost += conflicts
+                else: self.data[key] = value
+                self.journal.synced[key] = base_copy(key, value)
+                changed.add(key)
+                continue
+            if op == 'append':
+                self.take_appended(record['key'], record['item'])
+                changed.add(record['key'])
+                continue
+            changed.add('transactions')
+            if op == 'add':
+                trans = dict(record['t'])
+                if trans['id'] in base: # Both sides took the same new id; theirs was written first, so ours moves
+                    old_id = trans['id']
+                    new_id = max(self.transactions.next_id, max(base) + 1) # Past ids ours added and deleted too
+                    self.journal.renumber(old_id, new_id)
+                    if self.transactions.get(old_id) is not None: self.insert(dict(self.remove(old_id), id=new_id))
+                    for index in (ours, base, mine): index[new_id] = index.pop(old_id)
+                trans['category'] = our_category(trans['category'])
+                self.insert(trans)
+            elif op == 'edit':
+                trans_id = record['id']
+                if trans_id in base:
+                    version = theirs.get(trans_id, base[trans_id])
+                    theirs[trans_id] = dict(version, **record['t']) if version else None
+                current = self.transactions.get(trans_id)
+                fields = {name: value for name, value in record['t'].items() if name not in ours.get(trans_id, ())}
+                if 'category' in fields: fields['category'] = our_category(fields['category'])
+                if current is not None and fields: self.replace(current, fields)
+            elif op == 'delete':
+                if record['id'] in base: theirs[record['id']] = None
+                if self.transactions.get(record['id']) is not None: self.remove(record['id'])
+            elif op == 'recategorize':
+                old, new = record['old'], record['new']
+                for trans_id, version in theirs.items():
+                    if version and version['category'] == old: theirs[trans_id] = dict(version, category=new)
+                keep = [trans_id for trans_id, fields in ours.items() if 'category' in fields
+                        and (self.transactions.get(trans_id) or {}).get('category') == old]
+                self.transactions.rename_category(old, new)
+                self.rollup.rename_category(old, new)
+                for trans_id in keep: self.replace(self.transactions.get(trans_id), {'category': old})
+        for key in settings & changed: self.journal.record('set', key=key, value=base_copy(key, self.data[key]))
+        for trans_id, version in theirs.items(): self.journal.rebase(trans_id, version) # Merged settings now include theirs
+        adjustments = [] # What the final version counts, less what each side's change to it already moved
+        for trans_id, version in theirs.items():
+            for trans, sign in ((self.transactions.get(trans_id), 1), (base[trans_id], 1), (version, -1), (mine[trans_id], -1)):
+                if trans is not None: adjustments.append((trans, sign))
+        return changed, lost, adjustments
+
+    def take_appended(self, key, item):
+        """Puts an item another copy appended ahead of this copy's unwritten ones, which follow it in the journal. An account
+        both copies opened with the same event (as when both filled in the opening balances of accounts from before events
+        were kept) is opened once."""
+        items, journal = self.data[key], self.journal
+        start = journal.appended[key] - len(journal.unwritten(key))
+        if item.get('kind') == 'open' and journal.withdraw(key, item): del items[items.index(item, start)]
+        else: journal.appended[key] += 1
+        items.insert(start, item)
+
+    def reload(self):
+        """Loads everything again, for when another copy folded records this copy never read into a new snapshot,
+        then puts this copy's unwritten changes back on top. Returns what sync() returns."""
+        self.writer.flush()
+        pending = self.journal.pending_records()
+        base, mine = {}, {} # Transaction id -> the version before this copy's unwritten changes, and after them
+        for record, was in pending:
+            if record['op'] not in ('add', 'edit', 'delete'): continue
+            trans_id = record['t']['id'] if record['op'] == 'add' else record['id']
+            if trans_id not in base: base[trans_id], mine[trans_id] = was, self.transactions.get(trans_id)
+        with FileLock():
+            snapshot_id = snapshot_identity()
+            data = load_data()
+        transactions = data.pop('transactions')
+        journal_seq, folded_seq = data.pop('journal_seq'), data.pop('folded_seq')
+        ours = {key: self.data[key] for key in SETTINGS_KEYS if key in self.data and key not in APPEND_ONLY}
+        appended = {key: self.journal.unwritten(key) + self.data[key][self.journal.appended[key]:] for key in APPEND_ONLY}
+        synced = self.journal.synced
+        self.data.clear(); self.data.update(data)
+        self.transactions = self.create_store(transactions)
+        self.rollup = SpendingRollup(self.transactions.spending_by_month())
+        self.text_index = TextIndex(self.transactions)
+        self.journal.close()
+        self.journal = Journal(seq=journal_seq, folded_seq=folded_seq, snapshot_id=snapshot_id)
+        lost = []
+        for key, value in ours.items():
+            if key in data: self.journal.synced[key] = base_copy(key, data[key])
+            if any(record['op'] == 'set' and record['key'] == key for record, _ in pending):
+                self.data[key], conflicts = merge(key, synced.get(key), self.data.get(key, value), value)
+                lost += conflicts
+        for key, items in appended.items(): # As in take_appended, after theirs
+            self.journal.appended[key] = len(self.data[key])
+            self.data[key] += [item for item in items if item.get('kind') != 'open' or item not in self.data[key]]
+        self.journal.record_settings(self.data, APPEND_ONLY)
+        theirs = {trans_id: self.transactions.get(trans_id) for trans_id in base}
+        moved = {} # Ids ours added that theirs took meanwhile -> the new ids
+        for record, was in pending:
+            op = record['op']
+            trans_id = record['t']['id'] if op == 'add' else record.get('id')
+            trans_id = moved.get(trans_id, trans_id)
+            if op == 'add':
+                if self.transactions.get(trans_id) is None: self.add_transaction(dict(record['t']))
+                else: moved[trans_id] = self.add_transaction(dict(record['t'], id=None))['id']
+            elif op == 'edit' and self.transactions.get(trans_id): self.update_transaction(trans_id, record['t'])
+            elif op == 'delete' and self.transactions.get(trans_id): self.delete_transaction(trans_id)
+            elif op == 'recategorize': self.rename_category(record['old'], record['new'])
+            elif op == 'set': self.journal.record('set', key=record['key'], value=base_copy(record['key'], self.data[record['key']]))
+        self.writer.submit('journal', self.journal.commit)
+        adjustments = [] # As in apply_records; an added transaction that moved is counted by neither side's version
+        for trans_id in base:
+            if trans_id in moved: continue
+            for trans, sign in ((self.transactions.get(trans_id), 1), (base[trans_id], 1), (theirs[trans_id], -1), (mine[trans_id], -1)):
+                if trans is not None: adjustments.append((trans, sign))
+        return set(SETTINGS_KEYS) | {'transactions'}, lost, adjustments
+
+    def unsaved_settings(self):
+        """The settings collections changed since they were last saved or read, such as the theme, which is saved on exit."""
+        self.writer.flush() # Brings synced up to the collections queued for writing
+        journal = self.journal
+        return [key for key in SETTINGS_KEYS if key in self.data and (len(self.data[key]) > journal.appended[key]
+                if key in APPEND_ONLY else self.data[key] != journal.synced.get(key))]
+
+    def close(self, sync=None):
+        """Saves what hasn't been and stops the writer. sync (default: self.sync) takes in the other copies' records when
+        they hold this copy's back; Ledger.close() passes its own, which also settles balances."""
+        self.commit(self.unsaved_settings())
+        self.writer.flush()
+        while self.journal.pending: # Held back until the other copies' records are taken in
+            self.load_pending(wait=True)
+            (sync or self.sync)()
+            self.writer.submit('journal', self.journal.commit)
+            self.writer.flush()
+        self.writer.close()
+        self.journal.close()
+
+class SqliteStorage:
+    """Stores transactions in an indexed SQLite database so lookups and monthly rollups don't walk the full history."""
+    SCHEMA = """
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY, date TEXT NOT NULL, description TEXT NOT NULL,
+            amount REAL NOT NULL, category TEXT NOT NULL, account_name TEXT NOT NULL);
+        CREATE INDEX IF NOT EXISTS idx_transactions_date ON transactions(date);
+        CREATE INDEX IF NOT EXISTS idx_transactions_category ON transactions(category, date);
+        CREATE INDEX IF NOT EXISTS idx_transactions_account ON transactions(account_name, date);
+        CREATE TABLE IF NOT EXISTS settings (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS balance_events (
+            id INTEGER PRIMARY KEY, date TEXT NOT NULL, account TEXT NOT NULL, amount REAL NOT NULL, kind TEXT NOT NULL);
+        CREATE TABLE IF NOT EXISTS spending_cube (
+            month TEXT NOT NULL, category TEXT NOT NULL, account_name TEXT NOT NULL, total REAL NOT NULL,
+            PRIMARY KEY (month, category, account_name)) WITHOUT ROWID;
+        CREATE TRIGGER IF NOT EXISTS cube_on_insert AFTER INSERT ON transactions BEGIN
+            INSERT INTO spending_cube VALUES (substr(NEW.date, 1, 7), NEW.category, NEW.account_name, NEW.amount)
+                ON CONFLICT (month, category, account_name) DO UPDATE SET total = total + excluded.total;
+        END;
+        CREATE TRIGGER IF NOT EXISTS cube_on_delete AFTER DELETE ON transactions BEGIN
+            UPDATE spending_cube SET total = total - OLD.amount
+                WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND account_name = OLD.account_name;
+        END;
+        CREATE TRIGGER IF NOT EXISTS cube_on_update AFTER UPDATE OF date, amount, category, account_name ON transactions BEGIN
+            UPDATE spending_cube SET total = total - OLD.amount
+                WHERE month = substr(OLD.date, 1, 7) AND category = OLD.category AND account_name = OLD.account_name;
+            INSERT INTO spending_cube VALUES (substr(NEW.date, 1, 7), NEW.category, NEW.account_name, NEW.amount)
+                ON CONFLICT (month, category, account_name) DO UPDATE SET total = total + excluded.total;
+        END;
+    """
+    OLD_ROLLUPS = """
+        DROP TRIGGER IF EXISTS rollup_on_insert; DROP TRIGGER IF EXISTS rollup_on_delete; DROP TRIGGER IF EXISTS rollup_on_update;
+        DROP TABLE IF EXISTS monthly_rollups;
+    """ # The month x category rollups the cube replaced
+    TEXT_SCHEMA = """
+        CREATE VIRTUAL TABLE transactions_text USING fts5(description, content='transactions', content_rowid='id');
+        CREATE TRIGGER text_on_insert AFTER INSERT ON transactions BEGIN
+            INSERT INTO transactions_text (rowid, description) VALUES (NEW.id, NEW.description);
+        END;
+        CREATE TRIGGER text_on_delete AFTER DELETE ON transactions BEGIN
+            INSERT INTO transactions_text (transactions_text, rowid, description) VALUES ('delete', OLD.id, OLD.description);
+        END;
+        CREATE TRIGGER text_on_update AFTER UPDATE OF description ON transactions BEGIN
+            INSERT INTO transactions_text (transactions_text, rowid, description) VALUES ('delete', OLD.id, OLD.description);
+            INSERT INTO transactions_text (rowid, description) VALUES (NEW.id, NEW.description);
+        END;
+        INSERT INTO transactions_text (transactions_text) VALUES ('rebuild');
+    """
+
+    loading = False # Everything is on disk already; there is nothing to stream in
+
+    def __init__(self, path=SQLITE_FILE):
+        is_new = not os.path.exists(path)
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode = WAL") # Commits append to the WAL; fsyncs happen at checkpoints
+        self.lock = threading.RLock() # The connection is shared with the writer thread, which commits
+        has_legacy_table = self.detach_legacy_table()
+        self.conn.executescript(self.OLD_ROLLUPS + self.SCHEMA)
+        self.has_text_index = self.create_text_index()
+        if is_new: self.migrate_from_json()
+        elif has_legacy_table: self.migrate_legacy_table()
+        elif self.conn.execute("SELECT NOT EXISTS (SELECT 1 FROM spending_cube) AND EXISTS (SELECT 1 FROM transactions)").fetchone()[0]:
+            self.rebuild_rollups()
+        self.migrate_events_setting()
+        self.data = {key: json.loads(value) for key, value in self.conn.execute("SELECT key, value FROM settings")}
+        self.data.setdefault('recurring', [])
+        self.synced = {key: base_copy(key, value) for key, value in self.data.items()} # The saved values the data is based on
+        self.data['balance_events'], self.events_saved, self.last_event_id = [], 0, 0 # Events in the table, and the last one's id
+        self.read_events()
+        self.data_version = self.conn.execute("PRAGMA data_version").fetchone()[0] # Changes when another connection commits
+        self.lost = [] # Changes of this copy that lost to another copy's while committing, reported by the next sync()
+        self.writer = BackgroundWriter()
+
+    def create_text_index(self):
+        """Sets up the full-text index of descriptions, if this SQLite has FTS5. Returns True if the index is available."""
+        if self.conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'transactions_text'").fetchone(): return True
+        try:
+            self.conn.executescript("BEGIN;" + self.TEXT_SCHEMA + "COMMIT;")
+            return True
+        except sqlite3.OperationalError:
+            self.conn.rollback()
+            print("Warning: SQLite was built without FTS5; description search will scan every transaction.")
+            return False
+
+    def migrate_from_json(self):
+        """One-shot import of the snapshot, JSON or binary, and its journal into a freshly created database."""
+        data = load_data()
+        self.conn.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)",
+                              ([t[field] for field in TRANSACTION_FIELDS] for t in data['transactions']))
+        self.save_settings(data)
+        self.insert_events(data['balance_events'])
+        self.conn.commit()
+
+    def migrate_events_setting(self):
+        """Moves the balance events of a database from before they had their own table out of the settings."""
+        query = "SELECT value FROM settings WHERE key = 'balance_events'"
+        if self.conn.execute(query).fetchone() is None: return
+        self.conn.execute("BEGIN IMMEDIATE") # So two copies opening it at once don't both move them
+        row = self.conn.execute(query).fetchone()
+        if row is not None:
+            self.insert_events(json.loads(row[0]))
+            self.conn.execute("DELETE FROM settings WHERE key = 'balance_events'")
+        self.conn.commit()
+
+    def detach_legacy_table(self):
+        """Renames a transactions table from before ids were integer primary keys out of the way. Returns True if there was one."""
+        columns = {row[1]: row[2] for row in self.conn.execute("PRAGMA table_info(transactions)")}
+        if columns.get('id', 'INTEGER') == 'INTEGER': return False
+        self.conn.executescript("""
+            DROP TRIGGER IF EXISTS rollup_on_insert; DROP TRIGGER IF EXISTS rollup_on_delete; DROP TRIGGER IF EXISTS rollup_on_update;
+            DROP TRIGGER IF EXISTS cube_on_insert; DROP TRIGGER IF EXISTS cube_on_delete; DROP TRIGGER IF EXISTS cube_on_update;
+            DROP INDEX IF EXISTS idx_transactions_id; DROP INDEX IF EXISTS idx_transactions_date;
+            DROP INDEX IF EXISTS idx_transactions_category; DROP INDEX IF EXISTS idx_transactions_account;
+            DROP TABLE IF EXISTS monthly_rollups; DROP TABLE IF EXISTS spending_cube;
+            ALTER TABLE transactions RENAME TO legacy_transactions;
+        """)
+        return True
+
+    def migrate_legacy_table(self):
+        """Copies the rows of a detached legacy table into the current schema, numbering them in their original order."""
+        self.conn.execute("INSERT INTO transactions (date, description, amount, category, account_name) "
+                          "SELECT date, description, amount, category, account_name FROM legacy_transactions ORDER BY rowid")
+        self.conn.execute("DROP TABLE legacy_transactions")
+        self.conn.commit()
+
+    def rebuild_rollups(self):
+        """Recomputes the spending cube from scratch, for databases created before it existed."""
+        self.conn.execute("DELETE FROM spending_cube")
+        self.conn.execute("INSERT INTO spending_cube SELECT substr(date, 1, 7), category, account_name, SUM(amount) FROM transactions GROUP BY 1, 2, 3")
+        self.conn.commit()
+
+    def load_pending(self, budget=0.02, wait=False):
+        return 0
+
+    def save_settings(self, data, keys=SETTINGS_KEYS):
+        with self.lock:
+            self.conn.executemany("INSERT OR REPLACE INTO settings VALUES (?, ?)",
+                                  [(key, json.dumps(data[key])) for key in SETTINGS_KEYS if key in keys and key not in APPEND_ONLY])
+
+    def insert_events(self, events):
+        with self.lock:
+            self.conn.executemany(f"INSERT INTO balance_events ({', '.join(EVENT_FIELDS)}) VALUES (?, ?, ?, ?)",
+                                  ([e[field] for field in EVENT_FIELDS] for e in events))
+
+    def read_events(self):
+        """Puts the balance events other copies of the app saved since the last call ahead of this copy's unsaved ones.
+        An account both copies opened with the same event is opened once. Returns whether there were any."""
+        with self.lock:
+            rows = self.conn.execute(f"SELECT id, {', '.join(EVENT_FIELDS)} FROM balance_events WHERE id > ? ORDER BY id",
+                                     (self.last_event_id,)).fetchall()
+        if not rows: return False
+        events, theirs = self.data['balance_events'], [{field: row[field] for field in EVENT_FIELDS} for row in rows]
+        events[self.events_saved:] = theirs + [e for e in events[self.events_saved:] if e['kind'] != 'open' or e not in theirs]
+        self.events_saved += len(theirs)
+        self.last_event_id = rows[-1]['id']
+        return True
+
+    def execute(self, sql, params=()):
+        with self.lock: return self.conn.execute(sql, params)
+
+    def query(self, sql, params=()):
+        with self.lock: return self.conn.execute(sql, params).fetchall()
+
+    def get_transaction(self, trans_id, for_update=False):
+        """for_update takes the write lock first, so no other copy of the app changes the transaction between this
+        read and the write that follows it; balances are worked out from the version that is really replaced."""
+        try: trans_id = int(trans_id)
+        except (TypeError, ValueError): return None
+        with self.lock:
+            if for_update and not self.conn.in_transaction: self.conn.execute("BEGIN IMMEDIATE")
+            rows = self.conn.execute("SELECT * FROM transactions WHERE id = ?", (trans_id,)).fetchall()
+            if not rows and for_update: self.conn.commit() # Nothing to write; don't keep other copies waiting
+        return dict(rows[0]) if rows else None
+
+    def find_transactions(self, category=None, text=None, date_from=None, date_to=None, amount_min=None, amount_max=None,
+                          sort_by='date', reverse=True):
+        """Returns the matching transactions, newest first unless another sort field is given.
+        text matches descriptions containing words that start with each of its words; date and amount bounds are inclusive.
+        Only row ids are read here; the transactions themselves are fetched as slices of the result are used."""
+        if sort_by not in TRANSACTION_FIELDS: raise ValueError(f"Cannot sort by {sort_by!r}")
+        query, params = "SELECT rowid FROM transactions WHERE 1", []
+        if category: query += " AND category = ?"; params.append(category)
+        if date_from: query += " AND date >= ?"; params.append(date_from)
+        if date_to: query += " AND date <= ?"; params.append(date_to)
+        if amount_min is not None: query += " AND amount >= ?"; params.append(amount_min)
+        if amount_max is not None: query += " AND amount <= ?"; params.append(amount_max)
+        words = description_words(text) if text else ()
+        if words and self.has_text_index:
+            query += " AND rowid IN (SELECT rowid FROM transactions_text WHERE transactions_text MATCH ?)"
+            params.append(' '.join(f'"{word}"*' for word in words))
+        elif words:
+            for word in words: query += " AND instr(lower(description), ?) > 0"; params.append(word)
+        direction = 'DESC' if reverse else 'ASC'
+        query += f" ORDER BY {sort_by} {direction}, id {direction}"
+        return SqliteRows(self, array('q', (row[0] for row in self.query(query, params))))
+
+    def transactions_page(self, limit, after=None, category=None, text=None, date_from=None, date_to=None, amount_min=None, amount_max=None):
+        """Up to limit matching transactions, newest first by date then id, continuing after the (date, id) that ended
+        the previous page. Same filters as find_transactions(); the date index serves the order and the LIMIT."""
+        query, params = f"SELECT {', '.join(TRANSACTION_FIELDS)} FROM transactions WHERE 1", []
+        if category: query += " AND category = ?"; params.append(category)
+        if date_from: query += " AND date >= ?"; params.append(date_from)
+        if date_to: query += " AND date <= ?"; params.append(date_to)
+        if after: query += " AND (date < ? OR (date = ? AND id < ?))"; params += [after[0], after[0], after[1]]
+        if amount_min is not None: query += " AND amount >= ?"; params.append(amount_min)
+        if amount_max is not None: query += " AND amount <= ?"; params.append(amount_max)
+        words = description_words(text) if text else ()
+        if words and self.has_text_index:
+            query += " AND rowid IN (SELECT rowid FROM transactions_text WHERE transactions_text MATCH ?)"
+            params.append(' '.join(f'"{word}"*' for word in words))
+        elif words:
+            for word in words: query += " AND instr(lower(description), ?) > 0"; params.append(word)
+        query += " ORDER BY date DESC, id DESC LIMIT ?"; params.append(limit)
+        return [dict(zip(TRANSACTION_FIELDS, row)) for row in self.query(query, params)]
+
+    def monthly_spending(self, year, month):
+        return dict(self.query("SELECT category, SUM(total) FROM spending_cube WHERE month = ? GROUP BY category", (f"{year:04d}-{month:02d}",)))
+
+    def spending_cells(self, first_month, last_month):
+        """(month, category, account, total) for each month from first_month to last_month, 'YYYY-MM', inclusive."""
+        return [tuple(row) for row in self.query("SELECT month, category, account_name, total FROM spending_cube WHERE month BETWEEN ? AND ?",
+                                                 (first_month, last_month))]
+
+    def daily_spending(self):
+        """Spending totals as {(account, day number): total}, for building balance histories."""
+        totals = {}
+        for account, date_text, total in self.query("SELECT account_name, date, SUM(amount) FROM transactions GROUP BY 1, 2"):
+            key = account, date_ordinal(date_text)
+            totals[key] = totals.get(key, 0) + total
+        return totals
+
+    def add_transaction(self, trans):
+        """Stores a new transaction, assigning its id. Returns the transaction."""
+        cursor = self.execute("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)", [trans.get(field) for field in TRANSACTION_FIELDS])
+        trans['id'] = cursor.lastrowid
+        return trans
+
+    def add_transactions(self, transactions):
+        """Stores a batch of new transactions with one statement, assigning their ids."""
+        with self.lock:
+            if not self.conn.in_transaction: self.conn.execute("BEGIN IMMEDIATE") # So no other copy takes the same ids
+            next_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) + 1 FROM transactions").fetchone()[0]
+            for trans_id, trans in enumerate(transactions, next_id): trans['id'] = trans_id
+            self.conn.executemany("INSERT INTO transactions VALUES (?, ?, ?, ?, ?, ?)",
+                                  ([trans.get(field) for field in TRANSACTION_FIELDS] for trans in transactions))
+        return transactions
+
+    def update_transaction(self, trans_id, changes):
+        columns = [field for field in TRANSACTION_FIELDS if field in changes and field != 'id']
+        self.execute(f"UPDATE transactions SET {', '.join(f'{c} = ?' for c in columns)} WHERE id = ?",
+                     [changes[c] for c in columns] + [int(trans_id)])
+
+    def delete_transaction(self, trans_id):
+        self.execute("DELETE FROM transactions WHERE id = ?", (int(trans_id),))
+
+    def rename_category(self, old, new):
+        with self.lock:
+            self.conn.execute("UPDATE transactions SET category = ? WHERE category = ?", (new, old))
+            self.conn.execute("DELETE FROM spending_cube WHERE category = ?", (old,)) # Cells the update trigger left at zero
+
+    def commit(self, changed=SETTINGS_KEYS):
+        """Writes the named settings collections and queues the commit for the writer thread. Collections another copy
+        of the app committed since they were read are merged with its version first (see merging.py). Balance events are
+        rows of their own, so only the ones added since the last commit are written, whether named or not."""
+        keys = [key for key in SETTINGS_KEYS if key in changed and key not in APPEND_ONLY]
+        events = self.data['balance_events']
+        with self.lock:
+            if keys or len(events) > self.events_saved:
+                if not self.conn.in_transaction: self.conn.execute("BEGIN IMMEDIATE") # Nobody else commits until this does
+                self.read_events()
+                self.insert_events(events[self.events_saved:])
+                self.events_saved = len(events)
+                self.last_event_id = self.conn.execute("SELECT COALESCE(MAX(id), 0) FROM balance_events").fetchone()[0]
+                query = f"SELECT key, value FROM settings WHERE key IN ({', '.join('?' * len(keys))})"
+                for key, text in self.conn.execute(query, keys).fetchall() if keys else ():
+                    theirs = json.loads(text)
+                    if theirs != self.synced.get(key):
+                        self.data[key], lost = merge(key, self.synced.get(key), theirs, self.data[key])
+                        self.lost += lost
+                for key in keys: self.synced[key] = base_copy(key, self.data[key])
+            self.save_settings(self.data, keys)
+        self.writer.submit('commit', self.commit_now)
+
+    def sync(self):
+        """Takes in the settings other copies of the app have committed since the last call; transactions are read from
+        the database as they are needed, so changes to them only have to be reported. Returns what JsonStorage.sync() does."""
+        lost, self.lost = self.lost, []
+        with self.lock:
+            version = self.conn.execute("PRAGMA data_version").fetchone()[0]
+            if version == self.data_version: return (), lost, []
+            self.data_version = version
+            rows = self.conn.execute("SELECT key, value FROM settings").fetchall()
+        changed = {'transactions'}
+        if self.read_events(): changed.add('balance_events')
+        for key, text in rows:
+            value = json.loads(text)
+            if value != self.synced.get(key):
+                self.data[key], self.synced[key] = value, base_copy(key, value)
+                changed.add(key)
+        return changed, lost, []
+
+    @timed('sqlite_commit')
+    def commit_now(self):
+        with self.lock: self.conn.commit()
+
+    def unsaved_settings(self):
+        """The settings collections changed since they were last saved or read."""
+        return [key for key in SETTINGS_KEYS if key in self.data and (len(self.data[key]) > self.events_saved
+                if key == 'balance_events' else self.data[key] != self.synced.get(key))]
+
+    def close(self, sync=None):
+        self.commit(self.unsaved_settings())
+        self.writer.flush()
+        self.writer.close()
+        self.conn.close()
+
+class SqliteRows:
+    """Sequence over a query result that holds only row ids and loads transactions for the slices being read."""
+    FETCH_SIZE = 500
+
+    def __init__(self, storage, rowids):
+        self.storage = storage
+        self.rowids = rowids
+
+    def __len__(self):
+        return len(self.rowids)
+
+    def __getitem__(self, index):
+        if not isinstance(index, slice):
+            if not -len(self.rowids) <= index < len(self.rowids): raise IndexError(index)
+            return self[index:index + 1 or None][0]
+        rowids = self.rowids[index]
+        if not rowids: return []
+        rows = {}
+        for i in range(0, len(rowids), self.FETCH_SIZE):
+            chunk = rowids[i:i + self.FETCH_SIZE]
+            query = f"SELECT rowid, {', '.join(TRANSACTION_FIELDS)} FROM transactions WHERE rowid IN ({', '.join('?' * len(chunk))})"
+            for row in self.storage.query(query, chunk):
+                rows[row[0]] = dict(zip(TRANSACTION_FIELDS, row[1:]))
+        return [rows[rowid] for rowid in rowids if rowid in rows] # Rows deleted since the query are skipped
+
+    def __iter__(self):
+        for i in range(0, len(self.rowids), self.FETCH_SIZE):
+            yield from self[i:i + self.FETCH_SIZE]
@@ -1,993 +1,1620 @@
-import tkinter as tk
-from tkinter import ttk, messagebox
-import json
-import os
-import sys
-from datetime import datetime, timedelta
-import calendar
-
-# --- Color Palettes ---
-LIGHT_THEME = {
-    "BACKGROUND": "#FFFFFF",
-    "FRAME": "#F0F0F0",
-    "TEXT": "#000000",
-    "INPUT_BG": "#EAEAEA",
-    "BUTTON": "#DDDDDD",
-    "ACCENT_GREEN": "#2E8B57",
-    "ACCENT_RED": "#DC143C",
-    "LISTBOX_SELECT_BG": "#0078D7" 
-}
-
-DARK_THEME = {
-    "BACKGROUND": "#000080",
-    "FRAME": "#0000CD",
-    "TEXT": "#FFFFFF",
-    "INPUT_BG": "#ADD8E6",
-    "BUTTON": "#4682B4",
-    "ACCENT_GREEN": "#00FF00",
-    "ACCENT_RED": "#FF4500",
-    "LISTBOX_SELECT_BG": "#4682B4"
-}
-
-# --- Font Definitions ---
-FONT_TITLE = ("Arial", 24, "bold")
-FONT_HEADER = ("Arial", 14, "bold")
-FONT_BODY = ("Arial", 12)
-FONT_BODY_BOLD = ("Arial", 12, "bold")
-
-# --- Data Management ---
-DATA_FILE = "finances_data.json"
-
-def resource_path(relative_path):
-    """ Get absolute path to resource, works for dev and for PyInstaller """
-    try:
-        base_path = sys._MEIPASS
-    except Exception:
-        base_path = os.path.abspath(".")
-    return os.path.join(base_path, relative_path)
-
-def load_data():
-    """Loads data from the JSON file. If no file exists, creates a default structure."""
-    if not os.path.exists(DATA_FILE):
-        return {
-            "accounts": [{"name": "My Wallet", "balance": 0}],
-            "categories": ["Food", "Transport", "Shopping", "Bills", "Misc"],
-            "budgets": {"Food": 500},
-            "transactions": [],
-            "loans": [],
-            "theme": "light" # Default theme
-        }
-    try:
-        with open(DATA_FILE, 'r') as f:
-            data = json.load(f)
-            if 'loans' not in data: data['loans'] = []
-            if 'theme' not in data: data['theme'] = 'light'
-            for t in data['transactions']:
-                if 'id' not in t:
-                    t['id'] = datetime.strptime(t['date'], '%Y-%m-%d').timestamp() + t['amount']
-            return data
-    except (json.JSONDecodeError, FileNotFoundError):
-        return {
-            "accounts": [], "categories": [], "budgets": {}, "transactions": [], "loans": [], "theme": "light"
-        }
-
-def save_data(data):
-    """Saves the given data to the JSON file."""
-    with open(DATA_FILE, 'w') as f:
-        json.dump(data, f, indent=4)
-
-# --- Main Application Class ---
-class BudgetApp(tk.Tk):
-    def __init__(self):
-        super().__init__()
-        
-        self.data = load_data()
-        self.theme_mode = tk.StringVar(value=self.data.get('theme', 'light'))
-
-        self.title("Finances")
-        self.geometry("1100x750")
-        try:
-            icon_path = resource_path("icon.ico")
-            self.iconbitmap(icon_path)
-        except tk.TclError:
-            print("Warning: Could not load application icon 'icon.ico'.")
-        
-        # Main layout
-        self.main_frame = tk.Frame(self)
-        self.main_frame.pack(fill=tk.BOTH, expand=True)
-
-        # Status bar at the bottom
-        self.status_frame = ttk.Frame(self.main_frame)
-        self.status_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=5)
-        
-        self.help_button = ttk.Button(self.status_frame, text="?", command=self.show_help_popup, width=2)
-        self.help_button.pack(side=tk.LEFT)
-        
-        self.dev_label = ttk.Label(self.status_frame, text="Developed By: s25udylan", font=("Arial", 8))
-        self.dev_label.pack(side=tk.RIGHT)
-
-        # Top content frame
-        top_content_frame = ttk.Frame(self.main_frame)
-        top_content_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
-
-        self.title_label = ttk.Label(top_content_frame, text="Finances")
-        self.title_label.pack(pady=10)
-
-        # Theme toggle button
-        self.theme_toggle_button = ttk.Button(top_content_frame, text="Toggle Theme", command=self.toggle_theme)
-        self.theme_toggle_button.place(relx=0.98, y=10, anchor="ne")
-
-        # Navigation Buttons
-        self.nav_frame = ttk.Frame(top_content_frame)
-        self.nav_frame.pack(pady=10, fill=tk.X)
-        
-        self.frames = {}
-        button_info = {
-            "Dashboard": DashboardFrame,
-            "Expenses": ExpensesFrame,
-            "Accounts": AccountsFrame,
-            "Categories": CategoriesFrame,
-            "Budgets": BudgetsFrame,
-            "Loans": LoansFrame
-        }
-
-        for text, FrameClass in button_info.items():
-            btn = ttk.Button(self.nav_frame, text=text, command=lambda f=FrameClass: self.show_frame(f))
-            btn.pack(side=tk.LEFT, padx=5, expand=True)
-        
-        self.container = ttk.Frame(top_content_frame)
-        self.container.pack(fill=tk.BOTH, expand=True, pady=10, padx=10)
-        self.container.grid_rowconfigure(0, weight=1)
-        self.container.grid_columnconfigure(0, weight=1)
-        
-        for F in (DashboardFrame, ExpensesFrame, AccountsFrame, CategoriesFrame, BudgetsFrame, LoansFrame):
-            frame = F(self.container, self)
-            self.frames[F] = frame
-            frame.grid(row=0, column=0, sticky="nsew")
-        
-        self.apply_theme() # Apply initial theme
-        self.show_frame(DashboardFrame)
-
-    def toggle_theme(self):
-        new_mode = 'dark' if self.theme_mode.get() == 'light' else 'light'
-        self.theme_mode.set(new_mode)
-        self.data['theme'] = new_mode
-        self.apply_theme()
-        
-    def show_help_popup(self):
-        popup = tk.Toplevel(self)
-        popup.title("Help")
-        popup.geometry("600x650")
-        theme = LIGHT_THEME if self.theme_mode.get() == 'light' else DARK_THEME
-        popup.configure(bg=theme["FRAME"])
-        popup.transient(self)
-        popup.grab_set()
-
-        help_text = """
-        **How to Use the 'Finances' App**
-
-        **IMPORTANT: Your Data**
-        - All your data is stored in a file named 'finances_data.json'
-          which is located in the same directory as the application.
-        - DO NOT delete this file unless you want to permanently erase
-          all your accounts, transactions, and settings.
-        - It's a good idea to back up this file periodically.
-
-        **Dashboard:**
-        - A quick overview of your finances.
-        - View total account balances and total loan amounts.
-        - See the progress of your monthly budgets.
-        - Use the '< Prev Month' and 'Next Month >' buttons to view historical data.
-
-        **Expenses:**
-        - Log all your payments, including regular expenses and loan payments.
-        - To add a payment: Fill in the date, amount, category, account, and description, then click 'Add Payment'.
-        - To edit a payment: Select a transaction, click 'Edit Selected', make changes, and click 'Save Changes'.
-        - To delete a payment: Select a transaction and click 'Delete Selected'.
-        - Use the filter options to search for specific transactions.
-
-        **Accounts:**
-        - Manage your different accounts (e.g., bank, wallet).
-        - 'Add Account': Creates a new account with an initial balance.
-        - 'Add Funds': Select an account and add money to it.
-        - 'Transfer Funds': Move money between two of your accounts.
-        - 'Delete Selected': Removes the selected account.
-
-        **Categories:**
-        - Manage your spending categories (e.g., Food, Shopping). These are used for expenses and budgets.
-
-        **Budgets:**
-        - Set a monthly spending limit for each of your categories.
-
-        **Loans:**
-        - Track money you owe. Edit a loan's name or total amount.
-        - Pay off loans by creating a payment in the 'Expenses' tab and selecting the loan from the category dropdown.
-
-        **Theme:**
-        - Click 'Toggle Theme' to switch between light and dark mode.
-        """
-        
-        text_widget = tk.Text(popup, wrap=tk.WORD, bg=theme["FRAME"], fg=theme["TEXT"], font=FONT_BODY, relief=tk.FLAT, bd=0, padx=10, pady=10)
-        text_widget.insert(tk.END, help_text)
-        text_widget.config(state=tk.DISABLED) # Make it read-only
-        text_widget.pack(expand=True, fill=tk.BOTH)
-
-        close_button = ttk.Button(popup, text="Close", command=popup.destroy)
-        close_button.pack(pady=10)
-
-    def apply_theme(self):
-        theme = LIGHT_THEME if self.theme_mode.get() == 'light' else DARK_THEME
-        
-        # Configure main window
-        self.configure(bg=theme["BACKGROUND"])
-        self.main_frame.configure(bg=theme["BACKGROUND"])
-        
-        # Configure styles
-        style = ttk.Style(self)
-        style.theme_use("clam")
-        
-        style.configure("TFrame", background=theme["FRAME"])
-        style.configure("TLabel", background=theme["FRAME"], foreground=theme["TEXT"], font=FONT_BODY)
-        style.configure("Header.TLabel", background=theme["FRAME"], font=FONT_HEADER, foreground=theme["TEXT"])
-        style.configure("Title.TLabel", background=theme["BACKGROUND"], font=FONT_TITLE, foreground=theme["TEXT"])
-        style.configure("Background.TFrame", background=theme["BACKGROUND"])
-
-        style.configure("TButton", background=theme["BUTTON"], foreground=theme["TEXT"], font=FONT_BODY_BOLD, borderwidth=1)
-        style.map("TButton", background=[("active", theme["INPUT_BG"])])
-        
-        style.configure("TEntry", fieldbackground=theme["INPUT_BG"], foreground=theme["TEXT"], font=FONT_BODY)
-        style.configure("Treeview", 
-                        background=theme["INPUT_BG"], 
-                        foreground=theme["TEXT"], 
-                        fieldbackground=theme["INPUT_BG"],
-                        font=FONT_BODY,
-                        rowheight=25)
-        style.configure("Treeview.Heading", font=FONT_BODY_BOLD, background=theme["BUTTON"], foreground=theme["TEXT"])
-        style.map("Treeview.Heading", background=[("active", theme["INPUT_BG"])])
-        
-        style.configure("Vertical.TScrollbar", background=theme["BUTTON"], troughcolor=theme["FRAME"])
-        style.configure("TProgressbar", troughcolor=theme["FRAME"], background=theme["ACCENT_GREEN"])
-        style.configure("TLabelframe", background=theme["FRAME"], relief="groove", borderwidth=2)
-        style.configure("TLabelframe.Label", background=theme["FRAME"], foreground=theme["TEXT"], font=FONT_BODY_BOLD)
-        
-        # Update progress bar styles
-        s = ttk.Style()
-        s.configure("Green.Horizontal.TProgressbar", background=theme["ACCENT_GREEN"])
-        s.configure("Red.Horizontal.TProgressbar", background=theme["ACCENT_RED"])
-
-        # Update all frames and their specific widgets
-        self.nav_frame.configure(style="Background.TFrame")
-        self.status_frame.configure(style="Background.TFrame")
-        self.dev_label.configure(style="TLabel", background=theme["BACKGROUND"])
-        self.help_button.configure(style="TButton")
-
-        for frame in self.frames.values():
-            frame.update_styles(theme)
-
-    def show_frame(self, cont):
-        frame = self.frames[cont]
-        frame.refresh_data()
-        frame.tkraise()
-
-    def refresh_all_frames(self):
-        save_data(self.data)
-        for frame in self.frames.values():
-            frame.refresh_data()
-    
-    def on_closing(self):
-        save_data(self.data)
-        self.destroy()
-
-# --- Base Frame Class ---
-class BaseFrame(ttk.Frame):
-    def __init__(self, parent, controller):
-        super().__init__(parent)
-        self.controller = controller
-        self.data = controller.data
-
-    def refresh_data(self):
-        pass
-
-    def update_styles(self, theme):
-        self.configure(style="TFrame")
-        for widget in self.winfo_children():
-            if isinstance(widget, (ttk.Frame, ttk.Label, ttk.Button, ttk.Entry, ttk.Combobox, ttk.Treeview)):
-                pass
-
-# --- Page Frames ---
-class DashboardFrame(BaseFrame):
-    def __init__(self, parent, controller):
-        super().__init__(parent, controller)
-        
-        self.view_date = datetime.now()
-
-        # Header with month navigation
-        self.header_frame = ttk.Frame(self)
-        self.header_frame.pack(pady=10)
-        
-        self.prev_month_btn = ttk.Button(self.header_frame, text="< Prev Month", command=self.go_to_previous_month)
-        self.prev_month_btn.pack(side=tk.LEFT, padx=20)
-        
-        self.month_label = ttk.Label(self.header_frame, text="", style="Header.TLabel")
-        self.month_label.pack(side=tk.LEFT, expand=True)
-        
-        self.next_month_btn = ttk.Button(self.header_frame, text="Next Month >", command=self.go_to_next_month)
-        self.next_month_btn.pack(side=tk.RIGHT, padx=20)
-        
-        top_frame = ttk.Frame(self)
-        top_frame.pack(fill=tk.X, expand=True, padx=20, pady=10)
-
-        # Account Balances Section
-        self.accounts_container = ttk.Frame(top_frame, padding=10)
-        self.accounts_container.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5)
-        self.accounts_header_label = ttk.Label(self.accounts_container, text="Account Balances", font=FONT_HEADER)
-        self.accounts_header_label.pack(pady=(0,5))
-        
-        accounts_scroll_frame = ttk.Frame(self.accounts_container, height=100)
-        accounts_scroll_frame.pack(fill=tk.X, expand=True)
-        accounts_scroll_frame.propagate(False)
-        self.accounts_display = tk.Text(accounts_scroll_frame, wrap=tk.NONE, relief=tk.FLAT, bd=0)
-        accounts_scrollbar = ttk.Scrollbar(accounts_scroll_frame, orient="vertical", command=self.accounts_display.yview)
-        self.accounts_display.configure(yscrollcommand=accounts_scrollbar.set)
-        accounts_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.accounts_display.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        self.accounts_total_label = ttk.Label(self.accounts_container, text="", font=FONT_BODY_BOLD)
-        self.accounts_total_label.pack(pady=(5,0))
-
-        # Loan Status Section
-        self.loans_container = ttk.Frame(top_frame, padding=10)
-        self.loans_container.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=5)
-        self.loans_header_label = ttk.Label(self.loans_container, text="Loan Balances", font=FONT_HEADER)
-        self.loans_header_label.pack(pady=(0,5))
-
-        loans_scroll_frame = ttk.Frame(self.loans_container, height=100)
-        loans_scroll_frame.pack(fill=tk.X, expand=True)
-        loans_scroll_frame.propagate(False)
-        self.loans_display = tk.Text(loans_scroll_frame, wrap=tk.NONE, relief=tk.FLAT, bd=0)
-        loans_scrollbar = ttk.Scrollbar(loans_scroll_frame, orient="vertical", command=self.loans_display.yview)
-        self.loans_display.configure(yscrollcommand=loans_scrollbar.set)
-        loans_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.loans_display.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        self.loans_total_label = ttk.Label(self.loans_container, text="", font=FONT_BODY_BOLD)
-        self.loans_total_label.pack(pady=(5,0))
-        
-        # Budget Status Section
-        self.budgets_frame_container = ttk.Frame(self, padding=10)
-        self.budgets_frame_container.pack(pady=10, padx=20, fill=tk.BOTH, expand=True)
-
-    def go_to_previous_month(self):
-        self.view_date = self.view_date.replace(day=1) - timedelta(days=1)
-        self.refresh_data()
-
-    def go_to_next_month(self):
-        _, last_day = calendar.monthrange(self.view_date.year, self.view_date.month)
-        self.view_date = self.view_date.replace(day=1) + timedelta(days=last_day)
-        self.refresh_data()
-
-    def refresh_data(self):
-        self.month_label.config(text=self.view_date.strftime("%B %Y"))
-        now = datetime.now()
-        self.next_month_btn.config(state=tk.DISABLED if self.view_date.year == now.year and self.view_date.month == now.month else tk.NORMAL)
-        
-        # Accounts
-        self.accounts_display.config(state=tk.NORMAL)
-        self.accounts_display.delete('1.0', tk.END)
-        total_balance = sum(acc.get('balance', 0) for acc in self.data['accounts'])
-        for acc in self.data['accounts']:
-            self.accounts_display.insert(tk.END, f"{acc['name']}: {acc.get('balance', 0):,.2f}\n")
-        self.accounts_display.config(state=tk.DISABLED)
-        self.accounts_total_label.config(text=f"Total Balance: {total_balance:,.2f}")
-
-        # Loans
-        self.loans_display.config(state=tk.NORMAL)
-        self.loans_display.delete('1.0', tk.END)
-        total_debt = sum(l.get('remaining_balance', 0) for l in self.data['loans'])
-        for loan in self.data['loans']:
-            self.loans_display.insert(tk.END, f"{loan['name']}: {loan.get('remaining_balance', 0):,.2f}\n")
-        self.loans_display.config(state=tk.DISABLED)
-        self.loans_total_label.config(text=f"Total Owed: {total_debt:,.2f}")
-
-        # Budgets
-        for widget in self.budgets_frame_container.winfo_children():
-            widget.destroy()
-        
-        self.budget_header_label = ttk.Label(self.budgets_frame_container, text="Monthly Budget Status", font=FONT_HEADER)
-        self.budget_header_label.pack()
-
-        monthly_spending = {cat: 0 for cat in self.data['categories']}
-        for trans in self.data['transactions']:
-            try:
-                trans_date = datetime.strptime(trans['date'], "%Y-%m-%d")
-                if trans_date.year == self.view_date.year and trans_date.month == self.view_date.month and trans['category'] in monthly_spending:
-                    monthly_spending[trans['category']] += trans['amount']
-            except (ValueError, TypeError): continue
-
-        for category, budget_amount in self.data['budgets'].items():
-            spent = monthly_spending.get(category, 0)
-            percentage = (spent / budget_amount) * 100 if budget_amount > 0 else 0
-            p_frame = ttk.Frame(self.budgets_frame_container, padding=5)
-            p_frame.pack(fill=tk.X, pady=2)
-            ttk.Label(p_frame, text=f"{category}: Spent {spent:,.2f} of {budget_amount:,.2f}").pack(side=tk.LEFT, fill=tk.X, expand=True)
-            pb = ttk.Progressbar(p_frame, orient=tk.HORIZONTAL, length=200, mode='determinate', value=percentage)
-            pb.pack(side=tk.RIGHT)
-            pb.config(style="Red.Horizontal.TProgressbar" if percentage > 100 else "Green.Horizontal.TProgressbar")
-    
-    def update_styles(self, theme):
-        super().update_styles(theme)
-        self.header_frame.configure(style="TFrame")
-        self.month_label.configure(style="Header.TLabel")
-        self.accounts_container.configure(style="TFrame")
-        self.loans_container.configure(style="TFrame")
-        self.budgets_frame_container.configure(style="TFrame")
-
-        self.accounts_header_label.configure(style="Header.TLabel")
-        self.loans_header_label.configure(style="Header.TLabel")
-        if hasattr(self, 'budget_header_label'):
-            self.budget_header_label.configure(style="Header.TLabel")
-
-        self.accounts_display.configure(bg=theme["FRAME"], fg=theme["TEXT"])
-        self.loans_display.configure(bg=theme["FRAME"], fg=theme["TEXT"])
-        self.accounts_total_label.configure(style="TLabel")
-        self.loans_total_label.configure(style="TLabel")
-        # Refresh to redraw progress bars with new style
-        self.refresh_data()
-
-
-class ExpensesFrame(BaseFrame):
-    def __init__(self, parent, controller):
-        super().__init__(parent, controller)
-
-        # Top section for controls
-        controls_frame = ttk.Frame(self, padding=10)
-        controls_frame.pack(fill=tk.X, padx=20, pady=5)
-        
-        # Add payment form
-        self.add_frame = ttk.LabelFrame(controls_frame, text="Add/Edit Payment", padding=10)
-        self.add_frame.grid(row=0, column=0, sticky="ns", padx=(0, 20))
-        
-        ttk.Label(self.add_frame, text="Date (YYYY-MM-DD):").grid(row=0, column=0, sticky="w", padx=5)
-        self.date_entry = ttk.Entry(self.add_frame, width=15)
-        self.date_entry.grid(row=0, column=1, sticky="ew", padx=5)
-        self.date_entry.insert(0, datetime.now().strftime("%Y-%m-%d"))
-
-        ttk.Label(self.add_frame, text="Amount:").grid(row=1, column=0, sticky="w", padx=5)
-        self.amount_entry = ttk.Entry(self.add_frame, width=15)
-        self.amount_entry.grid(row=1, column=1, sticky="ew", padx=5)
-        
-        ttk.Label(self.add_frame, text="Type/Category:").grid(row=2, column=0, sticky="w", padx=5)
-        self.category_var = tk.StringVar()
-        self.category_menu = ttk.Combobox(self.add_frame, textvariable=self.category_var, state='readonly', width=20)
-        self.category_menu.grid(row=2, column=1, sticky="ew", padx=5, pady=2)
-
-        ttk.Label(self.add_frame, text="Account:").grid(row=3, column=0, sticky="w", padx=5)
-        self.account_var = tk.StringVar()
-        self.account_menu = ttk.Combobox(self.add_frame, textvariable=self.account_var, state='readonly', width=20)
-        self.account_menu.grid(row=3, column=1, sticky="ew", padx=5, pady=2)
-        
-        ttk.Label(self.add_frame, text="Description:").grid(row=4, column=0, sticky="w", padx=5)
-        self.desc_entry = ttk.Entry(self.add_frame, width=30)
-        self.desc_entry.grid(row=4, column=1, sticky="ew", padx=5, pady=2)
-
-        self.add_button = ttk.Button(self.add_frame, text="Add Payment", command=self.add_payment)
-        self.add_button.grid(row=5, column=1, pady=10)
-        self.selected_transaction_id = None
-
-        # Filter section
-        self.filter_frame = ttk.LabelFrame(controls_frame, text="Filter Transactions", padding=10)
-        self.filter_frame.grid(row=0, column=1, sticky="ns")
-
-        ttk.Label(self.filter_frame, text="Filter by Category:").grid(row=0, column=0, sticky="w")
-        self.filter_cat_var = tk.StringVar()
-        self.filter_cat_menu = ttk.Combobox(self.filter_frame, textvariable=self.filter_cat_var, state='readonly')
-        self.filter_cat_menu.grid(row=1, column=0, padx=5, pady=2, sticky="ew")
-
-        ttk.Label(self.filter_frame, text="Filter by Description:").grid(row=2, column=0, sticky="w")
-        self.filter_desc_entry = ttk.Entry(self.filter_frame)
-        self.filter_desc_entry.grid(row=3, column=0, padx=5, pady=2, sticky="ew")
-
-        filter_button_frame = ttk.Frame(self.filter_frame)
-        filter_button_frame.grid(row=4, column=0, pady=10)
-        ttk.Button(filter_button_frame, text="Apply Filter", command=self.filter_transactions).pack(side=tk.LEFT, padx=5)
-        ttk.Button(filter_button_frame, text="Clear", command=self.clear_filters).pack(side=tk.LEFT)
-
-        # Frame for transactions tree
-        trans_frame = ttk.Frame(self, padding=10)
-        trans_frame.pack(fill=tk.BOTH, expand=True, pady=5, padx=20)
-        
-        cols = ('Date', 'Description', 'Category', 'Amount', 'Account')
-        self.tree = ttk.Treeview(trans_frame, columns=cols, show='headings', selectmode="browse")
-        self.tree.column("#0", width=0, stretch=tk.NO)
-        for col in cols:
-            self.tree.heading(col, text=col, command=lambda c=col: self.sort_treeview(c, False))
-            self.tree.column(col, width=150, anchor=tk.CENTER)
-        self.tree.column('Description', width=250)
-        
-        self.tree.bind('<<TreeviewSelect>>', self.on_item_select)
-        
-        vsb = ttk.Scrollbar(trans_frame, orient="vertical", command=self.tree.yview)
-        vsb.pack(side='right', fill='y')
-        self.tree.configure(yscrollcommand=vsb.set)
-        
-        self.tree.pack(fill=tk.BOTH, expand=True)
-
-        # Buttons for tree actions
-        self.tree_button_frame = ttk.Frame(self)
-        self.tree_button_frame.pack(pady=5)
-        ttk.Button(self.tree_button_frame, text="Edit Selected", command=self.edit_payment).pack(side=tk.LEFT, padx=10)
-        ttk.Button(self.tree_button_frame, text="Delete Selected", command=self.delete_payment).pack(side=tk.LEFT, padx=10)
-
-    def on_item_select(self, event):
-        if not self.tree.selection(): return
-        self.selected_transaction_id = self.tree.item(self.tree.selection()[0], "text")
-
-    def sort_treeview(self, col, reverse):
-        data = [(self.tree.set(child, col), child) for child in self.tree.get_children('')]
-        key = float if col == 'Amount' else str
-        data.sort(key=lambda x: key(x[0]), reverse=reverse)
-        for index, (val, child) in enumerate(data):
-            self.tree.move(child, '', index)
-        self.tree.heading(col, command=lambda: self.sort_treeview(col, not reverse))
-
-    def populate_tree(self, transactions):
-        self.tree.delete(*self.tree.get_children())
-        for trans in sorted(transactions, key=lambda x: x['date'], reverse=True):
-            values = (trans['date'], trans['description'], trans['category'], f"{trans['amount']:.2f}", trans['account_name'])
-            self.tree.insert("", "end", text=trans['id'], values=values)
-
-    def refresh_data(self):
-        categories = self.data['categories']
-        loan_names = [f"Loan: {l['name']}" for l in self.data['loans'] if l.get('remaining_balance', 0) > 0]
-        all_options = sorted(categories) + sorted(loan_names)
-        self.category_menu['values'] = all_options
-        self.filter_cat_menu['values'] = [""] + all_options
-        if all_options: self.category_var.set(all_options[0])
-
-        account_names = [acc['name'] for acc in self.data['accounts']]
-        self.account_menu['values'] = account_names
-        if account_names: self.account_var.set(account_names[0])
-        
-        self.populate_tree(self.data['transactions'])
-        self.clear_form()
-
-    def filter_transactions(self):
-        cat_filter = self.filter_cat_var.get()
-        desc_filter = self.filter_desc_entry.get().lower()
-
-        filtered_trans = [t for t in self.data['transactions'] 
-                          if (not cat_filter or t['category'] == cat_filter)
-                          and (not desc_filter or desc_filter in t['description'].lower())]
-        self.populate_tree(filtered_trans)
-
-    def clear_filters(self):
-        self.filter_cat_var.set("")
-        self.filter_desc_entry.delete(0, tk.END)
-        self.populate_tree(self.data['transactions'])
-
-    def clear_form(self):
-        self.selected_transaction_id = None
-        self.date_entry.delete(0, tk.END); self.date_entry.insert(0, datetime.now().strftime("%Y-%m-%d"))
-        self.amount_entry.delete(0, tk.END)
-        self.desc_entry.delete(0, tk.END)
-        self.add_button.config(text="Add Payment", command=self.add_payment)
-        if self.tree.selection(): self.tree.selection_remove(self.tree.selection())
-
-    def add_payment(self):
-        try:
-            date = self.date_entry.get(); datetime.strptime(date, "%Y-%m-%d")
-            amount = float(self.amount_entry.get())
-            if amount <= 0: raise ValueError
-        except ValueError:
-            messagebox.showerror("Invalid Input", "Check date (YYYY-MM-DD) and amount (positive number).")
-            return
-
-        category, account_name = self.category_var.get(), self.account_var.get()
-        description = self.desc_entry.get() or "N/A"
-        if not category or not account_name:
-            messagebox.showerror("Invalid Input", "Category and Account must be selected.")
-            return
-
-        self.update_balances(amount, account_name, category)
-        self.data['transactions'].append({
-            "id": datetime.now().timestamp(), "date": date, "description": description,
-            "amount": amount, "category": category, "account_name": account_name
-        })
-        messagebox.showinfo("Success", "Payment added.")
-        self.controller.refresh_all_frames()
-
-    def edit_payment(self):
-        if not self.selected_transaction_id:
-            messagebox.showwarning("No Selection", "Please select a transaction to edit.")
-            return
-        
-        trans_to_edit = next((t for t in self.data['transactions'] if str(t['id']) == str(self.selected_transaction_id)), None)
-        if not trans_to_edit:
-            messagebox.showerror("Error", "Could not find selected transaction."); self.clear_form(); return
-        
-        self.date_entry.delete(0, tk.END); self.date_entry.insert(0, trans_to_edit['date'])
-        self.amount_entry.delete(0, tk.END); self.amount_entry.insert(0, trans_to_edit['amount'])
-        self.category_var.set(trans_to_edit['category'])
-        self.account_var.set(trans_to_edit['account_name'])
-        self.desc_entry.delete(0, tk.END); self.desc_entry.insert(0, trans_to_edit['description'])
-        self.add_button.config(text="Save Changes", command=self.save_edited_payment)
-    
-    def save_edited_payment(self):
-        original_trans = next((t for t in self.data['transactions'] if str(t['id']) == str(self.selected_transaction_id)), None)
-        if not original_trans:
-            messagebox.showerror("Error", "Transaction not found."); self.clear_form(); return
-
-        self.update_balances(-original_trans['amount'], original_trans['account_name'], original_trans['category'])
-        
-        try:
-            new_date, new_amount = self.date_entry.get(), float(self.amount_entry.get())
-            datetime.strptime(new_date, "%Y-%m-%d")
-            if new_amount <= 0: raise ValueError
-        except ValueError:
-            messagebox.showerror("Invalid Input", "Check date and amount.")
-            self.update_balances(original_trans['amount'], original_trans['account_name'], original_trans['category'])
-            return
-        
-        new_category, new_account = self.category_var.get(), self.account_var.get()
-        new_description = self.desc_entry.get() or "N/A"
-        
-        self.update_balances(new_amount, new_account, new_category)
-        
-        original_trans.update({"date": new_date, "amount": new_amount, "category": new_category, "account_name": new_account, "description": new_description})
-        messagebox.showinfo("Success", "Transaction updated.")
-        self.controller.refresh_all_frames()
-
-    def delete_payment(self):
-        if not self.selected_transaction_id:
-            messagebox.showwarning("No Selection", "Please select a transaction to delete.")
-            return
-
-        trans_to_delete = next((t for t in self.data['transactions'] if str(t['id']) == str(self.selected_transaction_id)), None)
-        if not trans_to_delete:
-            messagebox.showerror("Error", "Could not find transaction."); return
-
-        if messagebox.askyesno("Confirm Deletion", f"Delete transaction: {trans_to_delete['description']} ({trans_to_delete['amount']:.2f})?"):
-            self.update_balances(-trans_to_delete['amount'], trans_to_delete['account_name'], trans_to_delete['category'])
-            self.data['transactions'].remove(trans_to_delete)
-            messagebox.showinfo("Success", "Transaction deleted.")
-            self.controller.refresh_all_frames()
-
-    def update_balances(self, amount, account_name, category_selection):
-        for acc in self.data['accounts']:
-            if acc['name'] == account_name: acc['balance'] -= amount; break
-        if category_selection.startswith("Loan: "):
-            loan_name = category_selection.replace("Loan: ", "")
-            for loan in self.data['loans']:
-                if loan['name'] == loan_name: loan['remaining_balance'] -= amount; break
-    
-    def update_styles(self, theme):
-        super().update_styles(theme)
-        self.add_frame.configure(style="TLabelframe")
-        self.filter_frame.configure(style="TLabelframe")
-        self.tree_button_frame.configure(style="TFrame")
-        for child in self.add_frame.winfo_children():
-            if isinstance(child, ttk.Label): child.configure(style="TLabel")
-        for child in self.filter_frame.winfo_children():
-            if isinstance(child, ttk.Label): child.configure(style="TLabel")
-        
-class AccountsFrame(BaseFrame):
-    def __init__(self, parent, controller):
-        super().__init__(parent, controller)
-        self.header_label = ttk.Label(self, text="Manage Accounts", style="Header.TLabel")
-        self.header_label.pack(pady=10)
-
-        tree_frame = ttk.Frame(self, padding=10)
-        tree_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-        
-        cols = ('Account Name', 'Current Balance')
-        self.tree = ttk.Treeview(tree_frame, columns=cols, show='headings')
-        self.tree.heading('Account Name', text='Account Name')
-        self.tree.heading('Current Balance', text='Current Balance')
-        self.tree.pack(fill=tk.BOTH, expand=True)
-
-        self.button_frame = ttk.Frame(self)
-        self.button_frame.pack(pady=10)
-        
-        ttk.Button(self.button_frame, text="Add Account", command=self.add_account).pack(side=tk.LEFT, padx=10)
-        ttk.Button(self.button_frame, text="Add Funds", command=self.add_funds).pack(side=tk.LEFT, padx=10)
-        ttk.Button(self.button_frame, text="Transfer Funds", command=self.transfer_funds).pack(side=tk.LEFT, padx=10)
-        ttk.Button(self.button_frame, text="Delete Selected", command=self.delete_account).pack(side=tk.LEFT, padx=10)
-
-    def refresh_data(self):
-        self.tree.delete(*self.tree.get_children())
-        for acc in self.data['accounts']:
-            self.tree.insert("", "end", values=(acc['name'], f"{acc['balance']:,.2f}"))
-
-    def add_account(self):
-        self.show_account_popup("Add New Account")
-    
-    def delete_account(self):
-        if not self.tree.focus(): messagebox.showwarning("No Selection", "Please select an account."); return
-        account_name = self.tree.item(self.tree.focus())['values'][0]
-        if messagebox.askyesno("Confirm", f"Delete account '{account_name}'?"):
-            self.data['accounts'] = [acc for acc in self.data['accounts'] if acc['name'] != account_name]
-            self.controller.refresh_all_frames()
-
-    def add_funds(self):
-        if not self.tree.focus(): messagebox.showwarning("No Selection", "Please select an account."); return
-        self.show_funds_popup(self.tree.item(self.tree.focus())['values'][0])
-
-    def transfer_funds(self):
-        if len(self.data['accounts']) < 2:
-            messagebox.showwarning("Not Enough Accounts", "You need at least two accounts."); return
-        self.show_transfer_popup()
-    
-    def show_transfer_popup(self):
-        popup = tk.Toplevel(self); popup.title("Transfer Funds"); popup.geometry("400x250")
-        popup.transient(self.controller); popup.grab_set()
-        
-        theme = LIGHT_THEME if self.controller.theme_mode.get() == 'light' else DARK_THEME
-        popup.configure(bg=theme["FRAME"])
-        
-        frame = ttk.Frame(popup, padding=20)
-        frame.pack(expand=True, fill=tk.BOTH)
-        
-        account_names = [acc['name'] for acc in self.data['accounts']]
-        ttk.Label(frame, text="From Account:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
-        from_var = tk.StringVar(); from_menu = ttk.Combobox(frame, textvariable=from_var, values=account_names, state='readonly')
-        from_menu.grid(row=0, column=1, padx=5, pady=5)
-        
-        ttk.Label(frame, text="To Account:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
-        to_var = tk.StringVar(); to_menu = ttk.Combobox(frame, textvariable=to_var, values=account_names, state='readonly')
-        to_menu.grid(row=1, column=1, padx=5, pady=5)
-
-        ttk.Label(frame, text="Amount:").grid(row=2, column=0, padx=5, pady=5, sticky="w")
-        amount_entry = ttk.Entry(frame, width=20); amount_entry.grid(row=2, column=1, padx=5, pady=5); amount_entry.focus()
-
-        def save():
-            from_name, to_name = from_var.get(), to_var.get()
-            if not from_name or not to_name: messagebox.showerror("Invalid Input", "Select both accounts.", parent=popup); return
-            if from_name == to_name: messagebox.showerror("Invalid Input", "Cannot transfer to same account.", parent=popup); return
-            try: amount = float(amount_entry.get()); assert amount > 0
-            except: messagebox.showerror("Invalid Input", "Enter a valid positive amount.", parent=popup); return
-            
-            from_account = next(acc for acc in self.data['accounts'] if acc['name'] == from_name)
-            if from_account['balance'] < amount: messagebox.showerror("Insufficient Funds", "Not enough funds for transfer.", parent=popup); return
-            
-            to_account = next(acc for acc in self.data['accounts'] if acc['name'] == to_name)
-            from_account['balance'] -= amount; to_account['balance'] += amount
-            self.controller.refresh_all_frames(); messagebox.showinfo("Success", "Transfer complete.", parent=self.controller); popup.destroy()
-
-        ttk.Button(frame, text="Transfer", command=save).grid(row=3, column=0, columnspan=2, pady=20)
-    
-    def show_funds_popup(self, account_name):
-        popup = tk.Toplevel(self); popup.title("Add Funds"); popup.geometry("350x150")
-        popup.transient(self.controller); popup.grab_set()
-        theme = LIGHT_THEME if self.controller.theme_mode.get() == 'light' else DARK_THEME
-        popup.configure(bg=theme["FRAME"])
-        
-        frame = ttk.Frame(popup, padding=20); frame.pack(expand=True, fill=tk.BOTH)
-        ttk.Label(frame, text=f"Account: {account_name}").grid(row=0, column=0, columnspan=2, padx=5, pady=5)
-        ttk.Label(frame, text="Amount to Add:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
-        amount_entry = ttk.Entry(frame, width=25); amount_entry.grid(row=1, column=1, padx=5, pady=5); amount_entry.focus()
-
-        def save():
-            try: amount = float(amount_entry.get()); assert amount > 0
-            except: messagebox.showerror("Invalid Input", "Enter valid positive amount.", parent=popup); return
-            for acc in self.data['accounts']:
-                if acc['name'] == account_name: acc['balance'] += amount; break
-            self.controller.refresh_all_frames(); messagebox.showinfo("Success", "Funds added.", parent=self.controller); popup.destroy()
-
-        ttk.Button(frame, text="Add Funds", command=save).grid(row=2, column=0, columnspan=2, pady=10)
-
-    def show_account_popup(self, title):
-        popup = tk.Toplevel(self); popup.title(title); popup.geometry("350x200")
-        popup.transient(self.controller); popup.grab_set()
-        theme = LIGHT_THEME if self.controller.theme_mode.get() == 'light' else DARK_THEME
-        popup.configure(bg=theme["FRAME"])
-        
-        frame = ttk.Frame(popup, padding=20); frame.pack(expand=True, fill=tk.BOTH)
-        ttk.Label(frame, text="Account Name:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
-        name_entry = ttk.Entry(frame, width=25); name_entry.grid(row=0, column=1, padx=5, pady=5)
-        ttk.Label(frame, text="Initial Balance:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
-        balance_entry = ttk.Entry(frame, width=25); balance_entry.grid(row=1, column=1, padx=5, pady=5)
-        
-        def save():
-            name = name_entry.get().strip()
-            if not name: messagebox.showerror("Invalid Input", "Name cannot be empty.", parent=popup); return
-            try: balance = float(balance_entry.get())
-            except ValueError: messagebox.showerror("Invalid Input", "Enter a valid balance.", parent=popup); return
-            if name in [acc['name'] for acc in self.data['accounts']]:
-                messagebox.showerror("Duplicate", "Account name already exists.", parent=popup); return
-            self.data['accounts'].append({"name": name, "balance": balance})
-            self.controller.refresh_all_frames(); popup.destroy()
-
-        ttk.Button(frame, text="Save", command=save).grid(row=2, column=0, columnspan=2, pady=10)
-
-    def update_styles(self, theme):
-        super().update_styles(theme)
-        self.header_label.configure(style="Header.TLabel")
-        self.button_frame.configure(style="TFrame")
-
-class CategoriesFrame(BaseFrame):
-    def __init__(self, parent, controller):
-        super().__init__(parent, controller)
-        self.header_label = ttk.Label(self, text="Manage Expense Categories", style="Header.TLabel")
-        self.header_label.pack(pady=10)
-        
-        main_frame = ttk.Frame(self)
-        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-        
-        self.listbox = tk.Listbox(main_frame, relief="flat", highlightthickness=0)
-        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
-        
-        scrollbar = ttk.Scrollbar(main_frame, orient="vertical", command=self.listbox.yview)
-        scrollbar.pack(side=tk.RIGHT, fill="y")
-        self.listbox.config(yscrollcommand=scrollbar.set)
-        
-        self.add_frame = ttk.Frame(self, padding=10)
-        self.add_frame.pack(pady=5)
-        
-        ttk.Label(self.add_frame, text="New Category:").pack(side=tk.LEFT, padx=5)
-        self.new_cat_entry = ttk.Entry(self.add_frame, width=20)
-        self.new_cat_entry.pack(side=tk.LEFT, padx=5)
-        ttk.Button(self.add_frame, text="Add", command=self.add_category).pack(side=tk.LEFT)
-        
-        ttk.Button(self, text="Delete Selected Category", command=self.delete_category).pack(pady=10)
-
-    def refresh_data(self):
-        self.listbox.delete(0, tk.END)
-        for cat in sorted(self.data['categories']):
-            self.listbox.insert(tk.END, cat)
-
-    def add_category(self):
-        new_cat = self.new_cat_entry.get().strip()
-        if new_cat and new_cat not in self.data['categories']:
-            self.data['categories'].append(new_cat)
-            self.new_cat_entry.delete(0, tk.END)
-            self.controller.refresh_all_frames()
-        elif not new_cat: messagebox.showwarning("Input Error", "Category name cannot be empty.")
-        else: messagebox.showwarning("Duplicate", "This category already exists.")
-
-    def delete_category(self):
-        if not self.listbox.curselection(): messagebox.showwarning("No Selection", "Please select a category."); return
-        category = self.listbox.get(self.listbox.curselection())
-        if messagebox.askyesno("Confirm", f"Delete '{category}'?"):
-            self.data['categories'].remove(category)
-            if category in self.data['budgets']: del self.data['budgets'][category]
-            self.controller.refresh_all_frames()
-
-    def update_styles(self, theme):
-        super().update_styles(theme)
-        self.header_label.configure(style="Header.TLabel")
-        self.listbox.configure(bg=theme["INPUT_BG"], fg=theme["TEXT"], font=FONT_BODY, selectbackground=theme["LISTBOX_SELECT_BG"])
-        self.add_frame.configure(style="TFrame")
-        for child in self.add_frame.winfo_children():
-            if isinstance(child, ttk.Label): child.configure(style="TLabel")
-
-class BudgetsFrame(BaseFrame):
-    def __init__(self, parent, controller):
-        super().__init__(parent, controller)
-        self.header_label = ttk.Label(self, text="Set Monthly Budgets", style="Header.TLabel")
-        self.header_label.pack(pady=10)
-
-        self.container = ttk.Frame(self, padding="10")
-        self.container.pack(fill=tk.BOTH, expand=True, padx=20)
-        self.budget_entries = {}
-        
-        ttk.Button(self, text="Save Budgets", command=self.save_budgets).pack(pady=20)
-
-    def refresh_data(self):
-        for widget in self.container.winfo_children(): widget.destroy()
-        self.budget_entries.clear()
-        
-        ttk.Label(self.container, text="Category").grid(row=0, column=0, padx=5, pady=5)
-        ttk.Label(self.container, text="Budget Amount").grid(row=0, column=1, padx=5, pady=5)
-
-        for row, category in enumerate(sorted(self.data['categories']), 1):
-            ttk.Label(self.container, text=category).grid(row=row, column=0, sticky='w', padx=5, pady=3)
-            entry = ttk.Entry(self.container, width=15)
-            entry.grid(row=row, column=1, sticky='e', padx=5, pady=3)
-            entry.insert(0, str(self.data['budgets'].get(category, "")))
-            self.budget_entries[category] = entry
-
-    def save_budgets(self):
-        for category, entry in self.budget_entries.items():
-            value = entry.get().strip()
-            if value:
-                try: self.data['budgets'][category] = float(value)
-                except ValueError: messagebox.showerror("Invalid Input", f"Enter a valid number for '{category}'."); return
-            elif category in self.data['budgets']: del self.data['budgets'][category]
-        messagebox.showinfo("Success", "Budgets updated.")
-        self.controller.refresh_all_frames()
-
-    def update_styles(self, theme):
-        super().update_styles(theme)
-        self.header_label.configure(style="Header.TLabel")
-        for child in self.container.winfo_children():
-            if isinstance(child, ttk.Label): child.configure(style="TLabel")
-
-class LoansFrame(BaseFrame):
-    def __init__(self, parent, controller):
-        super().__init__(parent, controller)
-        self.header_label = ttk.Label(self, text="Manage Loans", style="Header.TLabel")
-        self.header_label.pack(pady=10)
-
-        tree_frame = ttk.Frame(self, padding=10)
-        tree_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-        
-        cols = ('Loan Name', 'Total Amount', 'Remaining Balance')
-        self.tree = ttk.Treeview(tree_frame, columns=cols, show='headings')
-        for col in cols: self.tree.heading(col, text=col)
-        self.tree.pack(fill=tk.BOTH, expand=True)
-
-        self.button_frame = ttk.Frame(self)
-        self.button_frame.pack(pady=10)
-        
-        ttk.Button(self.button_frame, text="Add Loan", command=self.add_loan).pack(side=tk.LEFT, padx=10)
-        ttk.Button(self.button_frame, text="Edit Selected", command=self.edit_loan).pack(side=tk.LEFT, padx=10)
-        ttk.Button(self.button_frame, text="Delete Selected", command=self.delete_loan).pack(side=tk.LEFT, padx=10)
-
-    def refresh_data(self):
-        self.tree.delete(*self.tree.get_children())
-        for loan in self.data['loans']:
-            self.tree.insert("", "end", values=(loan['name'], f"{loan['total_amount']:,.2f}", f"{loan['remaining_balance']:,.2f}"))
-
-    def add_loan(self):
-        self.show_loan_popup("Add New Loan")
-
-    def edit_loan(self):
-        if not self.tree.focus(): messagebox.showwarning("No Selection", "Please select a loan to edit."); return
-        loan_name = self.tree.item(self.tree.focus())['values'][0]
-        loan_data = next((l for l in self.data['loans'] if l['name'] == loan_name), None)
-        if loan_data: self.show_loan_popup("Edit Loan", loan_data=loan_data)
-        else: messagebox.showerror("Error", "Could not find selected loan.")
-
-    def delete_loan(self):
-        if not self.tree.focus(): messagebox.showwarning("No Selection", "Please select a loan to delete."); return
-        loan_name = self.tree.item(self.tree.focus())['values'][0]
-        if messagebox.askyesno("Confirm", f"Delete loan '{loan_name}'?"):
-            self.data['loans'] = [l for l in self.data['loans'] if l['name'] != loan_name]
-            self.controller.refresh_all_frames()
-
-    def show_loan_popup(self, title, loan_data=None):
-        popup = tk.Toplevel(self); popup.title(title); popup.geometry("350x200")
-        popup.transient(self.controller); popup.grab_set()
-        theme = LIGHT_THEME if self.controller.theme_mode.get() == 'light' else DARK_THEME
-        popup.configure(bg=theme["FRAME"])
-        
-        frame = ttk.Frame(popup, padding=20); frame.pack(expand=True, fill=tk.BOTH)
-        ttk.Label(frame, text="Loan Name:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
-        name_entry = ttk.Entry(frame, width=25); name_entry.grid(row=0, column=1, padx=5, pady=5)
-        ttk.Label(frame, text="Total Amount:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
-        amount_entry = ttk.Entry(frame, width=25); amount_entry.grid(row=1, column=1, padx=5, pady=5)
-        
-        if loan_data: name_entry.insert(0, loan_data['name']); amount_entry.insert(0, loan_data['total_amount'])
-
-        def save():
-            new_name = name_entry.get().strip()
-            if not new_name: messagebox.showerror("Invalid Input", "Loan name cannot be empty.", parent=popup); return
-            try: new_total = float(amount_entry.get()); assert new_total > 0
-            except: messagebox.showerror("Invalid Input", "Enter a valid positive amount.", parent=popup); return
-            
-            is_new_name = loan_data is None or loan_data['name'] != new_name
-            if is_new_name and new_name in [l['name'] for l in self.data['loans']]:
-                messagebox.showerror("Duplicate", "Loan name already exists.", parent=popup); return
-
-            if loan_data: # Edit
-                old_name = loan_data['name']
-                paid_off = loan_data['total_amount'] - loan_data['remaining_balance']
-                loan_data.update({'name': new_name, 'total_amount': new_total, 'remaining_balance': new_total - paid_off})
-                if old_name != new_name:
-                    for t in self.data['transactions']:
-                        if t['category'] == f"Loan: {old_name}": t['category'] = f"Loan: {new_name}"
-            else: # Add
-                self.data['loans'].append({'name': new_name, 'total_amount': new_total, 'remaining_balance': new_total})
-            
-            self.controller.refresh_all_frames(); popup.destroy()
-
-        ttk.Button(frame, text="Save", command=save).grid(row=2, column=0, columnspan=2, pady=10)
-
-    def update_styles(self, theme):
-        super().update_styles(theme)
-        self.header_label.configure(style="Header.TLabel")
-        self.button_frame.configure(style="TFrame")
-
-# --- Main execution ---
-if __name__ == "__main__":
-    app = BudgetApp()
-    app.protocol("WM_DELETE_WINDOW", app.on_closing)
-    app.mainloop()
+import time
+STARTED_AT = time.perf_counter() # Startup phases are timed from here, before the heavier imports
+import tkinter as tk
+from tkinter import ttk, messagebox, filedialog
+import os
+import sys
+from datetime import datetime, timedelta
+import calendar
+import threading
+import argparse
+import asyncio
+
+from budget_tracker.api import ApiServer, TkBridge
+from budget_tracker.core import instrumentation
+from budget_tracker.core import (FREQUENCIES, REPORT_PERIODS, InsufficientFunds, Ledger, LedgerError, StatementError, cash_flow,
+                                 frequency_text, guess_columns, months_back, next_due, open_storage, read_csv_header, read_statement,
+                                 spending_trend)
+
+# --- Color Palettes ---
+LIGHT_THEME = {
+    "BACKGROUND": "#FFFFFF",
+    "FRAME": "#F0F0F0",
+    "TEXT": "#000000",
+    "INPUT_BG": "#EAEAEA",
+    "BUTTON": "#DDDDDD",
+    "ACCENT_GREEN": "#2E8B57",
+    "ACCENT_RED": "#DC143C",
+    "LISTBOX_SELECT_BG": "#0078D7" 
+}
+
+DARK_THEME = {
+    "BACKGROUND": "#000080",
+    "FRAME": "#0000CD",
+    "TEXT": "#FFFFFF",
+    "INPUT_BG": "#ADD8E6",
+    "BUTTON": "#4682B4",
+    "ACCENT_GREEN": "#00FF00",
+    "ACCENT_RED": "#FF4500",
+    "LISTBOX_SELECT_BG": "#4682B4"
+}
+
+# --- Font Definitions ---
+FONT_TITLE = ("Arial", 24, "bold")
+FONT_HEADER = ("Arial", 14, "bold")
+FONT_BODY = ("Arial", 12)
+FONT_BODY_BOLD = ("Arial", 12, "bold")
+
+# --- Helpers ---
+def resource_path(relative_path):
+    """ Get absolute path to resource, works for dev and for PyInstaller """
+    try:
+        base_path = sys._MEIPASS
+    except Exception:
+        base_path = os.path.abspath(".")
+    return os.path.join(base_path, relative_path)
+
+# --- Main Application Class ---
+STARTUP_REPORT = os.environ.get("BUDGET_TRACKER_STARTUP_REPORT") == "1" # Print how long each startup phase took
+LOAD_POLL_MS = 50
+RECURRING_CHECK_MS = 60 * 60 * 1000 # How often recurring payments are checked for ones that came due
+API_POLL_MS = 10 # How often API requests waiting for the ledger are run
+EXTERNAL_CHECK_MS = 1000 # How often the data files are checked for changes saved by another copy of the app
+
+class BudgetApp(tk.Tk):
+    def __init__(self, api_port=None):
+        super().__init__()
+        self.timings = {'import': time.perf_counter() - STARTED_AT}
+        self.api_port = api_port
+        self.api_error = None
+
+        # The data is read on a loader thread while the window is already up; pages are built when first shown.
+        self.storage = None
+        self.ledger = None
+        self.data = None
+        self.load_error = None
+        self.loader = threading.Thread(target=self.load_storage, name="StorageLoader", daemon=True)
+        self.loader.start()
+        self.theme_mode = tk.StringVar(value='light')
+
+        self.title("Finances")
+        self.geometry("1100x750")
+        try:
+            icon_path = resource_path("icon.ico")
+            self.iconbitmap(icon_path)
+        except tk.TclError:
+            print("Warning: Could not load application icon 'icon.ico'.")
+        
+        # Main layout
+        self.main_frame = tk.Frame(self)
+        self.main_frame.pack(fill=tk.BOTH, expand=True)
+
+        # Status bar at the bottom
+        self.status_frame = ttk.Frame(self.main_frame)
+        self.status_frame.pack(side=tk.BOTTOM, fill=tk.X, padx=10, pady=5)
+        
+        self.help_button = ttk.Button(self.status_frame, text="?", command=self.show_help_popup, width=2)
+        self.help_button.pack(side=tk.LEFT)
+
+        self.status_label = ttk.Label(self.status_frame, text="", font=("Arial", 8))
+        self.status_label.pack(side=tk.LEFT, padx=10)
+        
+        self.dev_label = ttk.Label(self.status_frame, text="Developed By: s25udylan", font=("Arial", 8))
+        self.dev_label.pack(side=tk.RIGHT)
+
+        # Top content frame
+        top_content_frame = ttk.Frame(self.main_frame)
+        top_content_frame.pack(side=tk.TOP, fill=tk.BOTH, expand=True)
+
+        self.title_label = ttk.Label(top_content_frame, text="Finances")
+        self.title_label.pack(pady=10)
+
+        # Theme toggle button
+        self.theme_toggle_button = ttk.Button(top_content_frame, text="Toggle Theme", command=self.toggle_theme)
+        self.theme_toggle_button.place(relx=0.98, y=10, anchor="ne")
+
+        # Navigation Buttons
+        self.nav_frame = ttk.Frame(top_content_frame)
+        self.nav_frame.pack(pady=10, fill=tk.X)
+        
+        self.frames = {}
+        self.current_frame = None
+        button_info = {
+            "Dashboard": DashboardFrame,
+            "Expenses": ExpensesFrame,
+            "Accounts": AccountsFrame,
+            "Categories": CategoriesFrame,
+            "Budgets": BudgetsFrame,
+            "Loans": LoansFrame,
+            "Reports": ReportsFrame,
+            "Recurring": RecurringFrame
+        }
+
+        self.nav_buttons = [self.theme_toggle_button]
+        for text, FrameClass in button_info.items():
+            btn = ttk.Button(self.nav_frame, text=text, command=lambda f=FrameClass: self.show_frame(f))
+            btn.pack(side=tk.LEFT, padx=5, expand=True)
+            self.nav_buttons.append(btn)
+        for btn in self.nav_buttons: btn.state(['disabled']) # Until the data has loaded
+        
+        self.container = ttk.Frame(top_content_frame)
+        self.container.pack(fill=tk.BOTH, expand=True, pady=10, padx=10)
+        self.container.grid_rowconfigure(0, weight=1)
+        self.container.grid_columnconfigure(0, weight=1)
+        self.loading_label = ttk.Label(self.container, text="Loading your data...")
+        self.loading_label.grid(row=0, column=0)
+        
+        self.apply_theme() # Apply initial theme
+        self.timings['window'] = time.perf_counter() - STARTED_AT - self.timings['import']
+        self.after(LOAD_POLL_MS, self.check_loaded)
+
+    def load_storage(self):
+        """Runs on the loader thread. Tk is only touched from the main thread, which polls in check_loaded()."""
+        started = time.perf_counter()
+        try: self.storage = open_storage()
+        except Exception as e: self.load_error = e
+        self.timings['load'] = time.perf_counter() - started
+
+    def check_loaded(self):
+        if self.loader.is_alive():
+            self.after(LOAD_POLL_MS, self.check_loaded)
+            return
+        if self.load_error is not None:
+            messagebox.showerror("Load Failed", f"Your data could not be loaded:\n{self.load_error}")
+            self.destroy()
+            return
+        self.ledger = Ledger(self.storage)
+        self.data = self.storage.data
+        self.loading_label.destroy()
+        for btn in self.nav_buttons: btn.state(['!disabled'])
+        if self.data.get('theme', 'light') != self.theme_mode.get():
+            self.theme_mode.set(self.data.get('theme', 'light'))
+            self.apply_theme()
+        self.show_frame(DashboardFrame)
+        self.after_idle(self.report_startup)
+        self.loaded_count = self.unshown_count = 0
+        if self.storage.loading: self.after(LOAD_POLL_MS, self.load_pending)
+        else: self.check_recurring()
+        self.after(EXTERNAL_CHECK_MS, self.check_external)
+        if self.api_port: self.start_api()
+
+    def start_api(self):
+        """Serves the local API from a thread of its own. Requests only touch the ledger through the bridge, which
+        runs them on this thread between events, so the API and the window never change the data at the same time."""
+        self.api_bridge = TkBridge()
+        server = ApiServer(self.ledger, self.api_bridge.run_in_owner, lambda collections: self.notify_changed(*collections),
+                           token=os.environ.get("BUDGET_TRACKER_API_TOKEN"))
+        def serve():
+            try: asyncio.run(server.serve("127.0.0.1", self.api_port))
+            except OSError as e: self.api_error = e
+        threading.Thread(target=serve, name="api", daemon=True).start()
+        self.poll_api()
+
+    def poll_api(self):
+        if self.api_error is not None:
+            self.status_label.configure(text=f"API not started: {self.api_error.strerror}"); return
+        self.api_bridge.poll()
+        self.after(API_POLL_MS, self.poll_api)
+
+    def load_pending(self):
+        """Moves transactions the storage is still reading into the store. Pages are refreshed each time
+        the number loaded doubles, so the refreshes cost about as much as a single one would in total."""
+        added = self.storage.load_pending()
+        self.loaded_count += added
+        self.unshown_count += added
+        if self.unshown_count and (self.unshown_count >= self.loaded_count - self.unshown_count or not self.storage.loading):
+            self.unshown_count = 0
+            self.refresh_watchers(('transactions',))
+        if self.storage.loading:
+            self.status_label.configure(text=f"Loading transactions... {self.loaded_count:,}")
+            self.after(LOAD_POLL_MS if not added else 1, self.load_pending)
+        else:
+            self.status_label.configure(text="")
+            self.check_recurring()
+
+    def check_external(self):
+        """Polls for changes another window or the command line saved; checking costs a stat of the journal (or
+        SQLite's data_version) when nothing changed."""
+        self.pull_external()
+        self.after(EXTERNAL_CHECK_MS, self.check_external)
+
+    def pull_external(self):
+        """Takes in changes saved by other copies of the app and refreshes the pages showing them."""
+        result = self.ledger.sync()
+        if result.changed:
+            self.refresh_watchers(result.changed)
+            self.status_label.configure(text="Updated with changes saved elsewhere.")
+        if result.overridden:
+            messagebox.showwarning("Changed Elsewhere", "These changes of yours were made at the same time in another window, "
+                                   "whose version was kept:\n" + "\n".join(result.overridden))
+
+    def check_recurring(self):
+        """Posts due recurring payments once everything has loaded, then hourly, so they keep being posted while the app is open."""
+        self.post_recurring()
+        self.after(RECURRING_CHECK_MS, self.check_recurring)
+
+    def post_recurring(self):
+        """Files the recurring payments that have come due, including any that did while the app was closed."""
+        self.pull_external() # Payments another copy already posted aren't posted again
+        result = self.ledger.post_due_payments()
+        if result.changed: self.notify_changed(*result.changed)
+        if result.posted: self.status_label.configure(text=f"Posted {result.posted:,} recurring payment(s).")
+
+    def report_startup(self):
+        self.update_idletasks() # Lets the first page finish drawing
+        self.timings['first paint'] = time.perf_counter() - STARTED_AT
+        if STARTUP_REPORT:
+            phases = ('import', 'window', 'load', 'build', 'first paint')
+            print("Startup times: " + ", ".join(f"{phase} {self.timings[phase]:.3f}s" for phase in phases if phase in self.timings))
+
+    def toggle_theme(self):
+        new_mode = 'dark' if self.theme_mode.get() == 'light' else 'light'
+        self.theme_mode.set(new_mode)
+        self.data['theme'] = new_mode
+        self.apply_theme()
+        
+    def show_help_popup(self):
+        popup = tk.Toplevel(self)
+        popup.title("Help")
+        popup.geometry("600x650")
+        theme = LIGHT_THEME if self.theme_mode.get() == 'light' else DARK_THEME
+        popup.configure(bg=theme["FRAME"])
+        popup.transient(self)
+        popup.grab_set()
+
+        help_text = """
+        **How to Use the 'Finances' App**
+
+        **IMPORTANT: Your Data**
+        - All your data is stored in a file named 'finances_data.json'
+          which is located in the same directory as the application.
+        - DO NOT delete this file unless you want to permanently erase
+          all your accounts, transactions, and settings.
+        - It's a good idea to back up this file periodically.
+
+        **Dashboard:**
+        - A quick overview of your finances.
+        - View total account balances and total loan amounts, and when the loans with a monthly payment are paid off.
+        - See the progress of your monthly budgets.
+        - Use the '< Prev Month' and 'Next Month >' buttons to view historical data.
+
+        **Expenses:**
+        - Log all your payments, including regular expenses and loan payments.
+        - To add a payment: Fill in the date, amount, category, account, and description, then click 'Add Payment'.
+        - To edit a payment: Select a transaction, click 'Edit Selected', make changes, and click 'Save Changes'.
+        - To delete a payment: Select a transaction and click 'Delete Selected'.
+        - Use the filter options to search for specific transactions; the list updates as you type.
+          Date and amount ranges include both ends; leave either end empty for no limit.
+          Each word you type matches the start of a word in the description (e.g. 'gro sup' finds 'Grocery Supplies').
+
+        **Accounts:**
+        - Manage your different accounts (e.g., bank, wallet).
+        - 'Add Account': Creates a new account with an initial balance.
+        - 'Add Funds': Select an account and add money to it.
+        - 'Transfer Funds': Move money between two of your accounts.
+        - 'Delete Selected': Removes the selected account.
+        - 'Check Balances': Recomputes every account and loan balance from its history and reports any that disagree.
+
+        **Categories:**
+        - Manage your spending categories (e.g., Food, Shopping). These are used for expenses and budgets.
+
+        **Budgets:**
+        - Set a monthly spending limit for each of your categories.
+
+        **Loans:**
+        - Track money you owe. Edit a loan's name, total amount, interest rate and monthly payment (or the months left,
+          to have the payment worked out).
+        - With a payment set, the table shows when the loan is paid off and the interest still to pay.
+          'Payoff Schedule' lists every payment to come, and how much sooner an extra amount each month would clear it.
+        - Pay off loans by creating a payment in the 'Expenses' tab and selecting the loan from the category dropdown.
+
+        **Reports:**
+        - Spending per category or per account for each of the last 12, 24 or 60 months, with totals.
+        - The cash flow table shows the money added to accounts, the spending, the difference, and the total
+          balance at the end of each month, worked out from every change recorded on that date or before.
+
+        **Recurring:**
+        - Payments that repeat, such as rent, subscriptions or loan installments, every so many days, weeks, months or years.
+        - Each is filed as an ordinary payment when it comes due, including any that came due while the app was closed.
+        - 'Upcoming' lists what falls due in the next 30, 90 or 365 days.
+        - Deleting a recurring payment stops it; what it has filed already stays.
+
+        **Theme:**
+        - Click 'Toggle Theme' to switch between light and dark mode.
+        """
+        
+        text_widget = tk.Text(popup, wrap=tk.WORD, bg=theme["FRAME"], fg=theme["TEXT"], font=FONT_BODY, relief=tk.FLAT, bd=0, padx=10, pady=10)
+        text_widget.insert(tk.END, help_text)
+        text_widget.config(state=tk.DISABLED) # Make it read-only
+        text_widget.pack(expand=True, fill=tk.BOTH)
+
+        close_button = ttk.Button(popup, text="Close", command=popup.destroy)
+        close_button.pack(pady=10)
+
+    def apply_theme(self):
+        theme = LIGHT_THEME if self.theme_mode.get() == 'light' else DARK_THEME
+        
+        # Configure main window
+        self.configure(bg=theme["BACKGROUND"])
+        self.main_frame.configure(bg=theme["BACKGROUND"])
+        
+        # Configure styles
+        style = ttk.Style(self)
+        style.theme_use("clam")
+        
+        style.configure("TFrame", background=theme["FRAME"])
+        style.configure("TLabel", background=theme["FRAME"], foreground=theme["TEXT"], font=FONT_BODY)
+        style.configure("Header.TLabel", background=theme["FRAME"], font=FONT_HEADER, foreground=theme["TEXT"])
+        style.configure("Title.TLabel", background=theme["BACKGROUND"], font=FONT_TITLE, foreground=theme["TEXT"])
+        style.configure("Background.TFrame", background=theme["BACKGROUND"])
+
+        style.configure("TButton", background=theme["BUTTON"], foreground=theme["TEXT"], font=FONT_BODY_BOLD, borderwidth=1)
+        style.map("TButton", background=[("active", theme["INPUT_BG"])])
+        
+        style.configure("TEntry", fieldbackground=theme["INPUT_BG"], foreground=theme["TEXT"], font=FONT_BODY)
+        style.configure("Treeview", 
+                        background=theme["INPUT_BG"], 
+                        foreground=theme["TEXT"], 
+                        fieldbackground=theme["INPUT_BG"],
+                        font=FONT_BODY,
+                        rowheight=25)
+        style.configure("Treeview.Heading", font=FONT_BODY_BOLD, background=theme["BUTTON"], foreground=theme["TEXT"])
+        style.map("Treeview.Heading", background=[("active", theme["INPUT_BG"])])
+        
+        style.configure("Vertical.TScrollbar", background=theme["BUTTON"], troughcolor=theme["FRAME"])
+        style.configure("TProgressbar", troughcolor=theme["FRAME"], background=theme["ACCENT_GREEN"])
+        style.configure("TLabelframe", background=theme["FRAME"], relief="groove", borderwidth=2)
+        style.configure("TLabelframe.Label", background=theme["FRAME"], foreground=theme["TEXT"], font=FONT_BODY_BOLD)
+        
+        # Update progress bar styles
+        s = ttk.Style()
+        s.configure("Green.Horizontal.TProgressbar", background=theme["ACCENT_GREEN"])
+        s.configure("Red.Horizontal.TProgressbar", background=theme["ACCENT_RED"])
+
+        # Update all frames and their specific widgets
+        self.nav_frame.configure(style="Background.TFrame")
+        self.status_frame.configure(style="Background.TFrame")
+        self.dev_label.configure(style="TLabel", background=theme["BACKGROUND"])
+        self.status_label.configure(style="TLabel", background=theme["BACKGROUND"])
+        self.help_button.configure(style="TButton")
+
+        for frame in self.frames.values():
+            frame.update_styles(theme)
+
+    def show_frame(self, cont):
+        frame = self.frames.get(cont)
+        if frame is None: frame = self.frames[cont] = self.build_frame(cont)
+        if frame.stale:
+            frame.refresh_data()
+            frame.stale = False
+        frame.tkraise()
+        self.current_frame = frame
+
+    def build_frame(self, cont):
+        """Creates a page the first time it is shown."""
+        started = time.perf_counter()
+        frame = cont(self.container, self)
+        frame.grid(row=0, column=0, sticky="nsew")
+        frame.update_styles(LIGHT_THEME if self.theme_mode.get() == 'light' else DARK_THEME)
+        self.timings.setdefault('build', time.perf_counter() - started)
+        return frame
+
+    def notify_changed(self, *collections):
+        """Saves the touched collections and refreshes the frames that watch them; hidden frames refresh when next shown."""
+        self.storage.commit(collections)
+        error = self.storage.writer.take_error()
+        if error: messagebox.showerror("Save Failed", f"Your latest changes could not be saved:\n{error}")
+        self.refresh_watchers(collections)
+
+    def refresh_watchers(self, collections):
+        for frame in self.frames.values():
+            if not frame.watches.isdisjoint(collections):
+                if frame is self.current_frame: frame.refresh_data()
+                else: frame.stale = True
+    
+    def on_closing(self):
+        self.loader.join() # Closing while loading still has to release what was opened
+        if self.ledger is not None: self.ledger.close() # Settles changes saved elsewhere before the last write
+        elif self.storage is not None: self.storage.close()
+        self.destroy()
+
+# --- Widgets ---
+class VirtualTreeview(ttk.Treeview):
+    """Treeview over a Python-side sequence of rows that only creates items for the rows currently in view."""
+    def __init__(self, parent, render_row, **kwargs):
+        super().__init__(parent, **kwargs)
+        self.render_row = render_row # row -> (key, values)
+        self.rows = []
+        self.offset = 0
+        self.page_size = 1
+        self.selected_key = None
+        self.scrollbar = None
+        self.bind('<Configure>', self.on_resize)
+        self.bind('<MouseWheel>', lambda e: self.scroll_rows(-3 if e.delta > 0 else 3))
+        self.bind('<Button-4>', lambda e: self.scroll_rows(-3))
+        self.bind('<Button-5>', lambda e: self.scroll_rows(3))
+        self.bind('<Prior>', lambda e: self.scroll_rows(-self.page_size))
+        self.bind('<Next>', lambda e: self.scroll_rows(self.page_size))
+        self.bind('<Up>', lambda e: self.step_selection(-1))
+        self.bind('<Down>', lambda e: self.step_selection(1))
+
+    def attach_scrollbar(self, scrollbar):
+        self.scrollbar = scrollbar
+        scrollbar.configure(command=self.yview)
+
+    def set_rows(self, rows):
+        self.rows = rows
+        self.offset = 0
+        self.render()
+
+    def fractions(self):
+        if not self.rows: return 0.0, 1.0
+        return self.offset / len(self.rows), min(1.0, (self.offset + self.page_size) / len(self.rows))
+
+    def yview(self, *args):
+        """Scrollbar protocol; moves the window of rendered rows rather than scrolling Tk items."""
+        if not args: return self.fractions()
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.rows)))
+        elif args[0] == 'scroll':
+            self.scroll_to(self.offset + int(args[1]) * (self.page_size if args[2] == 'pages' else 1))
+
+    def scroll_rows(self, count):
+        self.scroll_to(self.offset + count)
+        return "break"
+
+    def scroll_to(self, offset):
+        offset = max(0, min(offset, len(self.rows) - self.page_size))
+        if offset != self.offset:
+            self.offset = offset
+            self.render()
+
+    def step_selection(self, delta):
+        """Arrow keys move the selection inside the window and scroll it at the edges."""
+        slots, selection = self.get_children(), self.selection()
+        if not slots or not selection or 0 <= slots.index(selection[0]) + delta < len(slots): return None
+        self.scroll_to(self.offset + delta)
+        target = self.get_children()[0 if delta < 0 else -1]
+        self.selection_set(target); self.focus(target)
+        return "break"
+
+    def on_resize(self, event):
+        rowheight = int(ttk.Style(self).lookup('Treeview', 'rowheight') or 20)
+        page_size = max(1, event.height // rowheight - 1) # One row's worth of height goes to the headings
+        if page_size != self.page_size:
+            self.page_size = page_size
+            self.offset = max(0, min(self.offset, len(self.rows) - page_size))
+            self.render()
+
+    def clear_selection(self):
+        self.selected_key = None
+        if self.selection(): self.selection_remove(self.selection())
+
+    def render(self):
+        selection = self.selection()
+        if selection: self.selected_key = str(self.item(selection[0], 'text'))
+        window = self.rows[self.offset:self.offset + self.page_size]
+        slots = self.get_children()
+        selected_slot = None
+        for i, row in enumerate(window):
+            key, values = self.render_row(row)
+            if i < len(slots): self.item(slots[i], text=key, values=values)
+            else: self.insert("", "end", iid=f"slot{i}", text=key, values=values)
+            if str(key) == self.selected_key: selected_slot = f"slot{i}" if i >= len(slots) else slots[i]
+        if len(slots) > len(window): self.delete(*slots[len(window):])
+        instrumentation.count('treeview rows rendered', len(window))
+        if selected_slot: self.selection_set(selected_slot); self.focus(selected_slot)
+        elif self.selection(): self.selection_remove(self.selection())
+        super().yview_moveto(0)
+        if self.scrollbar: self.scrollbar.set(*self.fractions())
+
+class RowPool:
+    """Rows of widgets kept per key across refreshes. sync() creates rows only for new keys, destroys the rows of keys
+    that are gone, updates the others in place and re-places rows only when the order of the keys has changed."""
+    def __init__(self, create, update, place):
+        self.create = create # key -> row, a tuple of widgets, all destroyed when the key goes
+        self.update = update # (row, value) -> None
+        self.place = place # (row, position) -> None
+        self.rows = {}
+        self.order = []
+
+    def sync(self, items):
+        """items: (key, value) pairs in display order."""
+        keys = [key for key, _ in items]
+        for key in self.rows.keys() - set(keys):
+            for widget in self.rows.pop(key): widget.destroy()
+        for key, value in items:
+            row = self.rows.get(key)
+            if row is None: row = self.rows[key] = self.create(key)
+            self.update(row, value)
+        if keys != self.order:
+            for position, key in enumerate(keys): self.place(self.rows[key], position)
+            self.order = keys
+
+    def widgets(self):
+        return [widget for row in self.rows.values() for widget in row]
+
+# --- Base Frame Class ---
+class BaseFrame(ttk.Frame):
+    watches = frozenset() # Data collections whose changes require a refresh_data()
+
+    def __init__(self, parent, controller):
+        super().__init__(parent)
+        self.controller = controller
+        self.data = controller.data
+        self.stale = True
+
+    def refresh_data(self):
+        pass
+
+    def update_styles(self, theme):
+        self.configure(style="TFrame")
+        for widget in self.winfo_children():
+            if isinstance(widget, (ttk.Frame, ttk.Label, ttk.Button, ttk.Entry, ttk.Combobox, ttk.Treeview)):
+                pass
+
+# --- Page Frames ---
+class DashboardFrame(BaseFrame):
+    watches = frozenset({'accounts', 'categories', 'budgets', 'transactions', 'loans'})
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, controller)
+        
+        self.view_date = datetime.now()
+
+        # Header with month navigation
+        self.header_frame = ttk.Frame(self)
+        self.header_frame.pack(pady=10)
+        
+        self.prev_month_btn = ttk.Button(self.header_frame, text="< Prev Month", command=self.go_to_previous_month)
+        self.prev_month_btn.pack(side=tk.LEFT, padx=20)
+        
+        self.month_label = ttk.Label(self.header_frame, text="", style="Header.TLabel")
+        self.month_label.pack(side=tk.LEFT, expand=True)
+        
+        self.next_month_btn = ttk.Button(self.header_frame, text="Next Month >", command=self.go_to_next_month)
+        self.next_month_btn.pack(side=tk.RIGHT, padx=20)
+        
+        top_frame = ttk.Frame(self)
+        top_frame.pack(fill=tk.X, expand=True, padx=20, pady=10)
+
+        # Account Balances Section
+        self.accounts_container = ttk.Frame(top_frame, padding=10)
+        self.accounts_container.pack(side=tk.LEFT, fill=tk.BOTH, expand=True, padx=5)
+        self.accounts_header_label = ttk.Label(self.accounts_container, text="Account Balances", font=FONT_HEADER)
+        self.accounts_header_label.pack(pady=(0,5))
+        
+        accounts_scroll_frame = ttk.Frame(self.accounts_container, height=100)
+        accounts_scroll_frame.pack(fill=tk.X, expand=True)
+        accounts_scroll_frame.propagate(False)
+        self.accounts_display = tk.Text(accounts_scroll_frame, wrap=tk.NONE, relief=tk.FLAT, bd=0)
+        accounts_scrollbar = ttk.Scrollbar(accounts_scroll_frame, orient="vertical", command=self.accounts_display.yview)
+        self.accounts_display.configure(yscrollcommand=accounts_scrollbar.set)
+        accounts_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.accounts_display.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.accounts_total_label = ttk.Label(self.accounts_container, text="", font=FONT_BODY_BOLD)
+        self.accounts_total_label.pack(pady=(5,0))
+
+        # Loan Status Section
+        self.loans_container = ttk.Frame(top_frame, padding=10)
+        self.loans_container.pack(side=tk.RIGHT, fill=tk.BOTH, expand=True, padx=5)
+        self.loans_header_label = ttk.Label(self.loans_container, text="Loan Balances", font=FONT_HEADER)
+        self.loans_header_label.pack(pady=(0,5))
+
+        loans_scroll_frame = ttk.Frame(self.loans_container, height=100)
+        loans_scroll_frame.pack(fill=tk.X, expand=True)
+        loans_scroll_frame.propagate(False)
+        self.loans_display = tk.Text(loans_scroll_frame, wrap=tk.NONE, relief=tk.FLAT, bd=0)
+        loans_scrollbar = ttk.Scrollbar(loans_scroll_frame, orient="vertical", command=self.loans_display.yview)
+        self.loans_display.configure(yscrollcommand=loans_scrollbar.set)
+        loans_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.loans_display.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        self.loans_total_label = ttk.Label(self.loans_container, text="", font=FONT_BODY_BOLD)
+        self.loans_total_label.pack(pady=(5,0))
+        
+        # Budget Status Section
+        self.budgets_frame_container = ttk.Frame(self, padding=10)
+        self.budgets_frame_container.pack(pady=10, padx=20, fill=tk.BOTH, expand=True)
+        self.budgets_frame_container.columnconfigure(0, weight=1)
+        self.budget_header_label = ttk.Label(self.budgets_frame_container, text="Monthly Budget Status", font=FONT_HEADER)
+        self.budget_header_label.grid(row=0, column=0)
+        self.budget_bars = RowPool(self.create_budget_bar, self.update_budget_bar,
+                                   lambda row, position: row[0].grid(row=position + 1, column=0, sticky="ew", pady=2))
+
+    def go_to_previous_month(self):
+        self.view_date = self.view_date.replace(day=1) - timedelta(days=1)
+        self.refresh_data()
+
+    def go_to_next_month(self):
+        _, last_day = calendar.monthrange(self.view_date.year, self.view_date.month)
+        self.view_date = self.view_date.replace(day=1) + timedelta(days=last_day)
+        self.refresh_data()
+
+    def refresh_data(self):
+        self.month_label.config(text=self.view_date.strftime("%B %Y"))
+        now = datetime.now()
+        self.next_month_btn.config(state=tk.DISABLED if self.view_date.year == now.year and self.view_date.month == now.month else tk.NORMAL)
+        
+        # Accounts
+        self.accounts_display.config(state=tk.NORMAL)
+        self.accounts_display.delete('1.0', tk.END)
+        total_balance = self.controller.ledger.total_balance()
+        for acc in self.data['accounts']:
+            self.accounts_display.insert(tk.END, f"{acc['name']}: {acc.get('balance', 0):,.2f}\n")
+        self.accounts_display.config(state=tk.DISABLED)
+        self.accounts_total_label.config(text=f"Total Balance: {total_balance:,.2f}")
+
+        # Loans
+        self.loans_display.config(state=tk.NORMAL)
+        self.loans_display.delete('1.0', tk.END)
+        total_debt = self.controller.ledger.total_debt()
+        projections = self.controller.ledger.loan_projections()
+        for loan in self.data['loans']:
+            projection = projections[loan['name']]
+            payoff = f" (paid off {projection.payoff})" if projection and projection.payoff and loan.get('remaining_balance', 0) > 0 else ""
+            self.loans_display.insert(tk.END, f"{loan['name']}: {loan.get('remaining_balance', 0):,.2f}{payoff}\n")
+        self.loans_display.config(state=tk.DISABLED)
+        debt_free = self.controller.ledger.debt_free_month() if total_debt > 0 else None
+        self.loans_total_label.config(text=f"Total Owed: {total_debt:,.2f}" + (f" - debt-free by {debt_free}" if debt_free else ""))
+
+        # Budgets
+        report = self.controller.ledger.budget_report(self.view_date.year, self.view_date.month)
+        self.budget_bars.sync([(line[0], line) for line in report])
+
+    def create_budget_bar(self, category):
+        p_frame = ttk.Frame(self.budgets_frame_container, padding=5)
+        label = ttk.Label(p_frame)
+        label.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        pb = ttk.Progressbar(p_frame, orient=tk.HORIZONTAL, length=200, mode='determinate')
+        pb.pack(side=tk.RIGHT)
+        return p_frame, label, pb
+
+    def update_budget_bar(self, row, line):
+        _, label, pb = row
+        category, spent, budget_amount, percentage = line
+        label.configure(text=f"{category}: Spent {spent:,.2f} of {budget_amount:,.2f}")
+        pb.configure(value=percentage, style="Red.Horizontal.TProgressbar" if percentage > 100 else "Green.Horizontal.TProgressbar")
+
+    def update_styles(self, theme):
+        super().update_styles(theme)
+        self.header_frame.configure(style="TFrame")
+        self.month_label.configure(style="Header.TLabel")
+        self.accounts_container.configure(style="TFrame")
+        self.loans_container.configure(style="TFrame")
+        self.budgets_frame_container.configure(style="TFrame")
+
+        self.accounts_header_label.configure(style="Header.TLabel")
+        self.loans_header_label.configure(style="Header.TLabel")
+        self.budget_header_label.configure(style="Header.TLabel")
+
+        self.accounts_display.configure(bg=theme["FRAME"], fg=theme["TEXT"])
+        self.loans_display.configure(bg=theme["FRAME"], fg=theme["TEXT"])
+        self.accounts_total_label.configure(style="TLabel")
+        self.loans_total_label.configure(style="TLabel")
+        for widget in self.budget_bars.widgets():
+            if isinstance(widget, ttk.Frame): widget.configure(style="TFrame")
+            elif isinstance(widget, ttk.Label): widget.configure(style="TLabel")
+
+
+class ExpensesFrame(BaseFrame):
+    watches = frozenset({'accounts', 'categories', 'transactions', 'loans'})
+    SORT_FIELDS = {'Date': 'date', 'Description': 'description', 'Category': 'category', 'Amount': 'amount', 'Account': 'account_name'}
+    FILTER_DELAY_MS = 200 # The filter is applied once typing pauses for this long
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, controller)
+
+        # Top section for controls
+        controls_frame = ttk.Frame(self, padding=10)
+        controls_frame.pack(fill=tk.X, padx=20, pady=5)
+        
+        # Add payment form
+        self.add_frame = ttk.LabelFrame(controls_frame, text="Add/Edit Payment", padding=10)
+        self.add_frame.grid(row=0, column=0, sticky="ns", padx=(0, 20))
+        
+        ttk.Label(self.add_frame, text="Date (YYYY-MM-DD):").grid(row=0, column=0, sticky="w", padx=5)
+        self.date_entry = ttk.Entry(self.add_frame, width=15)
+        self.date_entry.grid(row=0, column=1, sticky="ew", padx=5)
+        self.date_entry.insert(0, datetime.now().strftime("%Y-%m-%d"))
+
+        ttk.Label(self.add_frame, text="Amount:").grid(row=1, column=0, sticky="w", padx=5)
+        self.amount_entry = ttk.Entry(self.add_frame, width=15)
+        self.amount_entry.grid(row=1, column=1, sticky="ew", padx=5)
+        
+        ttk.Label(self.add_frame, text="Type/Category:").grid(row=2, column=0, sticky="w", padx=5)
+        self.category_var = tk.StringVar()
+        self.category_menu = ttk.Combobox(self.add_frame, textvariable=self.category_var, state='readonly', width=20)
+        self.category_menu.grid(row=2, column=1, sticky="ew", padx=5, pady=2)
+
+        ttk.Label(self.add_frame, text="Account:").grid(row=3, column=0, sticky="w", padx=5)
+        self.account_var = tk.StringVar()
+        self.account_menu = ttk.Combobox(self.add_frame, textvariable=self.account_var, state='readonly', width=20)
+        self.account_menu.grid(row=3, column=1, sticky="ew", padx=5, pady=2)
+        
+        ttk.Label(self.add_frame, text="Description:").grid(row=4, column=0, sticky="w", padx=5)
+        self.desc_entry = ttk.Entry(self.add_frame, width=30)
+        self.desc_entry.grid(row=4, column=1, sticky="ew", padx=5, pady=2)
+
+        self.add_button = ttk.Button(self.add_frame, text="Add Payment", command=self.add_payment)
+        self.add_button.grid(row=5, column=1, pady=10)
+        self.selected_transaction_id = None
+
+        # Filter section
+        self.filter_frame = ttk.LabelFrame(controls_frame, text="Filter Transactions", padding=10)
+        self.filter_frame.grid(row=0, column=1, sticky="ns")
+
+        ttk.Label(self.filter_frame, text="Filter by Category:").grid(row=0, column=0, sticky="w")
+        self.filter_cat_var = tk.StringVar()
+        self.filter_cat_menu = ttk.Combobox(self.filter_frame, textvariable=self.filter_cat_var, state='readonly')
+        self.filter_cat_menu.grid(row=1, column=0, padx=5, pady=2, sticky="ew")
+        self.filter_cat_menu.bind('<<ComboboxSelected>>', lambda e: self.schedule_filter())
+
+        ttk.Label(self.filter_frame, text="Filter by Description:").grid(row=2, column=0, sticky="w")
+        self.filter_desc_entry = ttk.Entry(self.filter_frame)
+        self.filter_desc_entry.grid(row=3, column=0, padx=5, pady=2, sticky="ew")
+        self.filter_desc_entry.bind('<KeyRelease>', lambda e: self.schedule_filter())
+        self.filter_job = None
+
+        ttk.Label(self.filter_frame, text="Date Range (YYYY-MM-DD):").grid(row=4, column=0, sticky="w")
+        date_range_frame = ttk.Frame(self.filter_frame)
+        date_range_frame.grid(row=5, column=0, padx=5, pady=2, sticky="ew")
+        self.filter_date_from_entry = ttk.Entry(date_range_frame, width=11)
+        self.filter_date_from_entry.pack(side=tk.LEFT)
+        ttk.Label(date_range_frame, text=" to ").pack(side=tk.LEFT)
+        self.filter_date_to_entry = ttk.Entry(date_range_frame, width=11)
+        self.filter_date_to_entry.pack(side=tk.LEFT)
+
+        ttk.Label(self.filter_frame, text="Amount Range:").grid(row=6, column=0, sticky="w")
+        amount_range_frame = ttk.Frame(self.filter_frame)
+        amount_range_frame.grid(row=7, column=0, padx=5, pady=2, sticky="ew")
+        self.filter_amount_min_entry = ttk.Entry(amount_range_frame, width=11)
+        self.filter_amount_min_entry.pack(side=tk.LEFT)
+        ttk.Label(amount_range_frame, text=" to ").pack(side=tk.LEFT)
+        self.filter_amount_max_entry = ttk.Entry(amount_range_frame, width=11)
+        self.filter_amount_max_entry.pack(side=tk.LEFT)
+        self.range_entries = (self.filter_date_from_entry, self.filter_date_to_entry, self.filter_amount_min_entry, self.filter_amount_max_entry)
+        for entry in self.range_entries: entry.bind('<KeyRelease>', lambda e: self.schedule_filter())
+
+        filter_button_frame = ttk.Frame(self.filter_frame)
+        filter_button_frame.grid(row=8, column=0, pady=10)
+        ttk.Button(filter_button_frame, text="Apply Filter", command=self.filter_transactions).pack(side=tk.LEFT, padx=5)
+        ttk.Button(filter_button_frame, text="Clear", command=self.clear_filters).pack(side=tk.LEFT)
+
+        # Frame for transactions tree
+        trans_frame = ttk.Frame(self, padding=10)
+        trans_frame.pack(fill=tk.BOTH, expand=True, pady=5, padx=20)
+        
+        cols = ('Date', 'Description', 'Category', 'Amount', 'Account')
+        self.tree = VirtualTreeview(trans_frame, self.render_row, columns=cols, show='headings', selectmode="browse")
+        self.tree.column("#0", width=0, stretch=tk.NO)
+        for col in cols:
+            self.tree.heading(col, text=col, command=lambda c=col: self.sort_treeview(c, False))
+            self.tree.column(col, width=150, anchor=tk.CENTER)
+        self.tree.column('Description', width=250)
+        
+        self.tree.bind('<<TreeviewSelect>>', self.on_item_select)
+        
+        vsb = ttk.Scrollbar(trans_frame, orient="vertical")
+        vsb.pack(side='right', fill='y')
+        self.tree.attach_scrollbar(vsb)
+        self.active_filter = {}
+        self.active_sort = {}
+        
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        # Buttons for tree actions
+        self.tree_button_frame = ttk.Frame(self)
+        self.tree_button_frame.pack(pady=5)
+        ttk.Button(self.tree_button_frame, text="Edit Selected", command=self.edit_payment).pack(side=tk.LEFT, padx=10)
+        ttk.Button(self.tree_button_frame, text="Delete Selected", command=self.delete_payment).pack(side=tk.LEFT, padx=10)
+        ttk.Button(self.tree_button_frame, text="Import Statement...", command=self.import_statement).pack(side=tk.LEFT, padx=10)
+
+    def on_item_select(self, event):
+        if not self.tree.selection(): return
+        self.selected_transaction_id = self.tree.item(self.tree.selection()[0], "text")
+
+    def sort_treeview(self, col, reverse):
+        self.active_sort = {'sort_by': self.SORT_FIELDS[col], 'reverse': reverse}
+        self.populate_tree(self.controller.storage.find_transactions(**self.active_filter, **self.active_sort))
+        self.tree.heading(col, command=lambda: self.sort_treeview(col, not reverse))
+
+    def render_row(self, trans):
+        return trans['id'], (trans['date'], trans['description'], trans['category'], f"{trans['amount']:.2f}", trans['account_name'])
+
+    def populate_tree(self, transactions):
+        self.tree.set_rows(transactions)
+
+    def refresh_data(self):
+        """Also runs for changes saved elsewhere, so a half-filled form and the filter are kept; only the user's own
+        save or clear resets them."""
+        all_options = self.controller.ledger.payment_categories()
+        self.category_menu['values'] = all_options
+        self.filter_cat_menu['values'] = [""] + all_options
+        if all_options and self.category_var.get() not in all_options: self.category_var.set(all_options[0])
+
+        account_names = [acc['name'] for acc in self.data['accounts']]
+        self.account_menu['values'] = account_names
+        if account_names and self.account_var.get() not in account_names: self.account_var.set(account_names[0])
+
+        self.populate_tree(self.controller.storage.find_transactions(**self.active_filter, **self.active_sort))
+
+    def read_range_filters(self):
+        """Returns the date and amount bounds typed in the filter, None for each one left empty. Raises ValueError if one is invalid."""
+        date_from, date_to, amount_min, amount_max = (entry.get().strip() or None for entry in self.range_entries)
+        for bound in (date_from, date_to):
+            if bound: datetime.strptime(bound, "%Y-%m-%d")
+        return {'date_from': date_from, 'date_to': date_to,
+                'amount_min': float(amount_min) if amount_min else None, 'amount_max': float(amount_max) if amount_max else None}
+
+    def schedule_filter(self):
+        if self.filter_job is not None: self.after_cancel(self.filter_job)
+        self.filter_job = self.after(self.FILTER_DELAY_MS, lambda: self.filter_transactions(live=True))
+
+    def filter_transactions(self, live=False):
+        if self.filter_job is not None: self.after_cancel(self.filter_job); self.filter_job = None
+        cat_filter = self.filter_cat_var.get()
+        desc_filter = self.filter_desc_entry.get().lower()
+        try: range_filters = self.read_range_filters()
+        except ValueError:
+            if live: return # Probably still being typed
+            messagebox.showerror("Invalid Input", "Check the date range (YYYY-MM-DD) and amount range (numbers).")
+            return
+
+        new_filter = {'category': cat_filter, 'text': desc_filter, **range_filters}
+        if new_filter == self.active_filter: return
+        self.active_filter, self.active_sort = new_filter, {}
+        self.populate_tree(self.controller.storage.find_transactions(**self.active_filter))
+
+    def clear_filters(self):
+        if self.filter_job is not None: self.after_cancel(self.filter_job); self.filter_job = None
+        self.filter_cat_var.set("")
+        self.filter_desc_entry.delete(0, tk.END)
+        for entry in self.range_entries: entry.delete(0, tk.END)
+        self.active_filter, self.active_sort = {}, {}
+        self.populate_tree(self.controller.storage.find_transactions())
+
+    def clear_form(self):
+        self.selected_transaction_id = None
+        self.date_entry.delete(0, tk.END); self.date_entry.insert(0, datetime.now().strftime("%Y-%m-%d"))
+        self.amount_entry.delete(0, tk.END)
+        self.desc_entry.delete(0, tk.END)
+        self.add_button.config(text="Add Payment", command=self.add_payment)
+        self.tree.clear_selection()
+
+    def add_payment(self):
+        try:
+            amount = float(self.amount_entry.get())
+            changed = self.controller.ledger.add_payment(self.date_entry.get(), amount, self.category_var.get(), self.account_var.get(),
+                                                         self.desc_entry.get() or "N/A")
+        except LedgerError as e:
+            messagebox.showerror("Invalid Input", str(e)); return
+        except ValueError:
+            messagebox.showerror("Invalid Input", "Check date (YYYY-MM-DD) and amount (positive number)."); return
+        messagebox.showinfo("Success", "Payment added.")
+        self.controller.notify_changed(*changed)
+        self.clear_form()
+
+    def edit_payment(self):
+        if not self.selected_transaction_id:
+            messagebox.showwarning("No Selection", "Please select a transaction to edit.")
+            return
+        
+        trans_to_edit = self.controller.storage.get_transaction(self.selected_transaction_id)
+        if not trans_to_edit:
+            messagebox.showerror("Error", "Could not find selected transaction."); self.clear_form(); return
+        
+        self.date_entry.delete(0, tk.END); self.date_entry.insert(0, trans_to_edit['date'])
+        self.amount_entry.delete(0, tk.END); self.amount_entry.insert(0, trans_to_edit['amount'])
+        self.category_var.set(trans_to_edit['category'])
+        self.account_var.set(trans_to_edit['account_name'])
+        self.desc_entry.delete(0, tk.END); self.desc_entry.insert(0, trans_to_edit['description'])
+        self.add_button.config(text="Save Changes", command=self.save_edited_payment)
+    
+    def save_edited_payment(self):
+        if not self.controller.storage.get_transaction(self.selected_transaction_id):
+            messagebox.showerror("Error", "Transaction not found."); self.clear_form(); return
+        try:
+            new_amount = float(self.amount_entry.get())
+            changed = self.controller.ledger.edit_payment(self.selected_transaction_id, self.date_entry.get(), new_amount,
+                                                          self.category_var.get(), self.account_var.get(), self.desc_entry.get() or "N/A")
+        except LedgerError as e:
+            messagebox.showerror("Invalid Input", str(e)); return
+        except ValueError:
+            messagebox.showerror("Invalid Input", "Check date and amount."); return
+        messagebox.showinfo("Success", "Transaction updated.")
+        self.controller.notify_changed(*changed)
+        self.clear_form()
+
+    def delete_payment(self):
+        if not self.selected_transaction_id:
+            messagebox.showwarning("No Selection", "Please select a transaction to delete.")
+            return
+
+        trans_to_delete = self.controller.storage.get_transaction(self.selected_transaction_id)
+        if not trans_to_delete:
+            messagebox.showerror("Error", "Could not find transaction."); return
+
+        if messagebox.askyesno("Confirm Deletion", f"Delete transaction: {trans_to_delete['description']} ({trans_to_delete['amount']:.2f})?"):
+            try: changed = self.controller.ledger.delete_payment(trans_to_delete['id'])
+            except LedgerError as e: # Deleted by another copy while the question was open
+                messagebox.showerror("Error", str(e)); self.clear_form(); return
+            messagebox.showinfo("Success", "Transaction deleted.")
+            self.controller.notify_changed(*changed)
+            self.clear_form()
+    
+    def import_statement(self):
+        path = filedialog.askopenfilename(parent=self, title="Import Bank Statement",
+                                          filetypes=[("Bank statements", "*.csv *.ofx *.qfx"), ("All files", "*.*")])
+        if not path: return
+        if not self.data['accounts']: messagebox.showwarning("No Accounts", "Add the account the statement belongs to first."); return
+        is_ofx = os.path.splitext(path)[1].lower() in ('.ofx', '.qfx')
+        try: header = [] if is_ofx else read_csv_header(path)
+        except (OSError, UnicodeDecodeError) as e: messagebox.showerror("Import Failed", f"Could not read the file: {e}"); return
+        self.show_import_popup(path, header)
+
+    def show_import_popup(self, path, header):
+        popup = tk.Toplevel(self); popup.title("Import Bank Statement"); popup.geometry("420x420")
+        popup.transient(self.controller); popup.grab_set()
+        theme = LIGHT_THEME if self.controller.theme_mode.get() == 'light' else DARK_THEME
+        popup.configure(bg=theme["FRAME"])
+
+        frame = ttk.Frame(popup, padding=20); frame.pack(expand=True, fill=tk.BOTH)
+        ttk.Label(frame, text=os.path.basename(path)).grid(row=0, column=0, columnspan=2, padx=5, pady=5)
+        account_var = tk.StringVar(value=self.data['accounts'][0]['name'])
+        category_var = tk.StringVar(value="Misc")
+        fields = [("Account:", account_var, [acc['name'] for acc in self.data['accounts']], 'readonly'),
+                  ("Default Category:", category_var, self.controller.ledger.payment_categories(), 'normal')]
+
+        # CSV column mapping, prefilled from the header; OFX files name their fields themselves
+        column_vars, guessed = {}, guess_columns(header)
+        for field, label in (('date', "Date Column:"), ('amount', "Amount Column:"), ('description', "Description Column:"),
+                             ('category', "Category Column:")):
+            if not header: break
+            column_vars[field] = tk.StringVar(value=guessed.get(field, ""))
+            fields.append((label, column_vars[field], ([""] if field in ('description', 'category') else []) + header, 'readonly'))
+        for row, (label, var, values, state) in enumerate(fields, 1):
+            ttk.Label(frame, text=label).grid(row=row, column=0, padx=5, pady=5, sticky="w")
+            ttk.Combobox(frame, textvariable=var, values=values, state=state, width=22).grid(row=row, column=1, padx=5, pady=5)
+        date_format_entry = ttk.Entry(frame, width=25)
+        if header:
+            row += 1
+            ttk.Label(frame, text="Date Format (optional):").grid(row=row, column=0, padx=5, pady=5, sticky="w")
+            date_format_entry.grid(row=row, column=1, padx=5, pady=5)
+        payments_positive = tk.BooleanVar(value=False)
+        ttk.Checkbutton(frame, text="Payments are positive amounts", variable=payments_positive).grid(row=row + 1, column=0, columnspan=2, pady=5)
+
+        def run_import():
+            columns = {field: var.get() for field, var in column_vars.items() if var.get()}
+            try:
+                lines = read_statement(path, columns, date_format_entry.get().strip() or None)
+                result = self.controller.ledger.import_statement(lines, account_var.get(), category_var.get().strip() or "Misc",
+                                                                 payments_positive.get())
+            except (StatementError, LedgerError) as e: messagebox.showerror("Import Failed", str(e), parent=popup); return
+            except (OSError, UnicodeDecodeError) as e: messagebox.showerror("Import Failed", f"Could not read the file: {e}", parent=popup); return
+            popup.destroy()
+            if result.changed: self.controller.notify_changed(*result.changed)
+            messagebox.showinfo("Import Complete", f"Imported {result.imported:,} payments.\n"
+                                f"Skipped {result.duplicates:,} already recorded and {result.skipped:,} incoming or zero amounts.",
+                                parent=self.controller)
+
+        ttk.Button(frame, text="Import", command=run_import).grid(row=row + 2, column=0, columnspan=2, pady=10)
+
+    def update_styles(self, theme):
+        super().update_styles(theme)
+        self.add_frame.configure(style="TLabelframe")
+        self.filter_frame.configure(style="TLabelframe")
+        self.tree_button_frame.configure(style="TFrame")
+        for child in self.add_frame.winfo_children():
+            if isinstance(child, ttk.Label): child.configure(style="TLabel")
+        for child in self.filter_frame.winfo_children():
+            if isinstance(child, ttk.Label): child.configure(style="TLabel")
+        
+class AccountsFrame(BaseFrame):
+    watches = frozenset({'accounts'})
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, controller)
+        self.header_label = ttk.Label(self, text="Manage Accounts", style="Header.TLabel")
+        self.header_label.pack(pady=10)
+
+        tree_frame = ttk.Frame(self, padding=10)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        
+        cols = ('Account Name', 'Current Balance')
+        self.tree = ttk.Treeview(tree_frame, columns=cols, show='headings')
+        self.tree.heading('Account Name', text='Account Name')
+        self.tree.heading('Current Balance', text='Current Balance')
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        self.button_frame = ttk.Frame(self)
+        self.button_frame.pack(pady=10)
+        
+        ttk.Button(self.button_frame, text="Add Account", command=self.add_account).pack(side=tk.LEFT, padx=10)
+        ttk.Button(self.button_frame, text="Add Funds", command=self.add_funds).pack(side=tk.LEFT, padx=10)
+        ttk.Button(self.button_frame, text="Transfer Funds", command=self.transfer_funds).pack(side=tk.LEFT, padx=10)
+        ttk.Button(self.button_frame, text="Delete Selected", command=self.delete_account).pack(side=tk.LEFT, padx=10)
+        ttk.Button(self.button_frame, text="Check Balances", command=self.check_balances).pack(side=tk.LEFT, padx=10)
+
+    def refresh_data(self):
+        self.tree.delete(*self.tree.get_children())
+        for acc in self.data['accounts']:
+            self.tree.insert("", "end", values=(acc['name'], f"{acc['balance']:,.2f}"))
+
+    def add_account(self):
+        self.show_account_popup("Add New Account")
+    
+    def delete_account(self):
+        if not self.tree.focus(): messagebox.showwarning("No Selection", "Please select an account."); return
+        account_name = self.tree.item(self.tree.focus())['values'][0]
+        if messagebox.askyesno("Confirm", f"Delete account '{account_name}'?"):
+            self.controller.notify_changed(*self.controller.ledger.delete_account(account_name))
+
+    def check_balances(self):
+        if self.controller.storage.loading:
+            messagebox.showinfo("Still Loading", "Transactions are still loading; try again in a moment."); return
+        problems = self.controller.ledger.check_integrity()
+        if problems: messagebox.showwarning("Balances Disagree", "\n".join(problems))
+        else: messagebox.showinfo("Balances Check Out", "Every account and loan balance matches its history.")
+
+    def add_funds(self):
+        if not self.tree.focus(): messagebox.showwarning("No Selection", "Please select an account."); return
+        self.show_funds_popup(self.tree.item(self.tree.focus())['values'][0])
+
+    def transfer_funds(self):
+        if len(self.data['accounts']) < 2:
+            messagebox.showwarning("Not Enough Accounts", "You need at least two accounts."); return
+        self.show_transfer_popup()
+    
+    def show_transfer_popup(self):
+        popup = tk.Toplevel(self); popup.title("Transfer Funds"); popup.geometry("400x250")
+        popup.transient(self.controller); popup.grab_set()
+        
+        theme = LIGHT_THEME if self.controller.theme_mode.get() == 'light' else DARK_THEME
+        popup.configure(bg=theme["FRAME"])
+        
+        frame = ttk.Frame(popup, padding=20)
+        frame.pack(expand=True, fill=tk.BOTH)
+        
+        account_names = [acc['name'] for acc in self.data['accounts']]
+        ttk.Label(frame, text="From Account:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        from_var = tk.StringVar(); from_menu = ttk.Combobox(frame, textvariable=from_var, values=account_names, state='readonly')
+        from_menu.grid(row=0, column=1, padx=5, pady=5)
+        
+        ttk.Label(frame, text="To Account:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        to_var = tk.StringVar(); to_menu = ttk.Combobox(frame, textvariable=to_var, values=account_names, state='readonly')
+        to_menu.grid(row=1, column=1, padx=5, pady=5)
+
+        ttk.Label(frame, text="Amount:").grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        amount_entry = ttk.Entry(frame, width=20); amount_entry.grid(row=2, column=1, padx=5, pady=5); amount_entry.focus()
+
+        def save():
+            from_name, to_name = from_var.get(), to_var.get()
+            if not from_name or not to_name: messagebox.showerror("Invalid Input", "Select both accounts.", parent=popup); return
+            try: changed = self.controller.ledger.transfer(from_name, to_name, float(amount_entry.get()))
+            except InsufficientFunds as e: messagebox.showerror("Insufficient Funds", str(e), parent=popup); return
+            except LedgerError as e: messagebox.showerror("Invalid Input", str(e), parent=popup); return
+            except ValueError: messagebox.showerror("Invalid Input", "Enter a valid positive amount.", parent=popup); return
+            self.controller.notify_changed(*changed); messagebox.showinfo("Success", "Transfer complete.", parent=self.controller); popup.destroy()
+
+        ttk.Button(frame, text="Transfer", command=save).grid(row=3, column=0, columnspan=2, pady=20)
+    
+    def show_funds_popup(self, account_name):
+        popup = tk.Toplevel(self); popup.title("Add Funds"); popup.geometry("350x150")
+        popup.transient(self.controller); popup.grab_set()
+        theme = LIGHT_THEME if self.controller.theme_mode.get() == 'light' else DARK_THEME
+        popup.configure(bg=theme["FRAME"])
+        
+        frame = ttk.Frame(popup, padding=20); frame.pack(expand=True, fill=tk.BOTH)
+        ttk.Label(frame, text=f"Account: {account_name}").grid(row=0, column=0, columnspan=2, padx=5, pady=5)
+        ttk.Label(frame, text="Amount to Add:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        amount_entry = ttk.Entry(frame, width=25); amount_entry.grid(row=1, column=1, padx=5, pady=5); amount_entry.focus()
+
+        def save():
+            try: changed = self.controller.ledger.add_funds(account_name, float(amount_entry.get()))
+            except ValueError: messagebox.showerror("Invalid Input", "Enter valid positive amount.", parent=popup); return
+            self.controller.notify_changed(*changed); messagebox.showinfo("Success", "Funds added.", parent=self.controller); popup.destroy()
+
+        ttk.Button(frame, text="Add Funds", command=save).grid(row=2, column=0, columnspan=2, pady=10)
+
+    def show_account_popup(self, title):
+        popup = tk.Toplevel(self); popup.title(title); popup.geometry("350x200")
+        popup.transient(self.controller); popup.grab_set()
+        theme = LIGHT_THEME if self.controller.theme_mode.get() == 'light' else DARK_THEME
+        popup.configure(bg=theme["FRAME"])
+        
+        frame = ttk.Frame(popup, padding=20); frame.pack(expand=True, fill=tk.BOTH)
+        ttk.Label(frame, text="Account Name:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        name_entry = ttk.Entry(frame, width=25); name_entry.grid(row=0, column=1, padx=5, pady=5)
+        ttk.Label(frame, text="Initial Balance:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        balance_entry = ttk.Entry(frame, width=25); balance_entry.grid(row=1, column=1, padx=5, pady=5)
+        
+        def save():
+            if not name_entry.get().strip(): messagebox.showerror("Invalid Input", "Name cannot be empty.", parent=popup); return
+            try: balance = float(balance_entry.get())
+            except ValueError: messagebox.showerror("Invalid Input", "Enter a valid balance.", parent=popup); return
+            try: changed = self.controller.ledger.add_account(name_entry.get(), balance)
+            except LedgerError as e: messagebox.showerror("Duplicate", str(e), parent=popup); return
+            self.controller.notify_changed(*changed); popup.destroy()
+
+        ttk.Button(frame, text="Save", command=save).grid(row=2, column=0, columnspan=2, pady=10)
+
+    def update_styles(self, theme):
+        super().update_styles(theme)
+        self.header_label.configure(style="Header.TLabel")
+        self.button_frame.configure(style="TFrame")
+
+class CategoriesFrame(BaseFrame):
+    watches = frozenset({'categories'})
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, controller)
+        self.header_label = ttk.Label(self, text="Manage Expense Categories", style="Header.TLabel")
+        self.header_label.pack(pady=10)
+        
+        main_frame = ttk.Frame(self)
+        main_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        
+        self.listbox = tk.Listbox(main_frame, relief="flat", highlightthickness=0)
+        self.listbox.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+        
+        scrollbar = ttk.Scrollbar(main_frame, orient="vertical", command=self.listbox.yview)
+        scrollbar.pack(side=tk.RIGHT, fill="y")
+        self.listbox.config(yscrollcommand=scrollbar.set)
+        
+        self.add_frame = ttk.Frame(self, padding=10)
+        self.add_frame.pack(pady=5)
+        
+        ttk.Label(self.add_frame, text="New Category:").pack(side=tk.LEFT, padx=5)
+        self.new_cat_entry = ttk.Entry(self.add_frame, width=20)
+        self.new_cat_entry.pack(side=tk.LEFT, padx=5)
+        ttk.Button(self.add_frame, text="Add", command=self.add_category).pack(side=tk.LEFT)
+        
+        ttk.Button(self, text="Delete Selected Category", command=self.delete_category).pack(pady=10)
+
+    def refresh_data(self):
+        self.listbox.delete(0, tk.END)
+        for cat in sorted(self.data['categories']):
+            self.listbox.insert(tk.END, cat)
+
+    def add_category(self):
+        try: changed = self.controller.ledger.add_category(self.new_cat_entry.get())
+        except LedgerError as e: messagebox.showwarning("Input Error", str(e)); return
+        self.new_cat_entry.delete(0, tk.END)
+        self.controller.notify_changed(*changed)
+
+    def delete_category(self):
+        if not self.listbox.curselection(): messagebox.showwarning("No Selection", "Please select a category."); return
+        category = self.listbox.get(self.listbox.curselection())
+        if messagebox.askyesno("Confirm", f"Delete '{category}'?"):
+            try: changed = self.controller.ledger.delete_category(category)
+            except LedgerError as e: messagebox.showerror("Error", str(e)); self.refresh_data(); return
+            self.controller.notify_changed(*changed)
+
+    def update_styles(self, theme):
+        super().update_styles(theme)
+        self.header_label.configure(style="Header.TLabel")
+        self.listbox.configure(bg=theme["INPUT_BG"], fg=theme["TEXT"], font=FONT_BODY, selectbackground=theme["LISTBOX_SELECT_BG"])
+        self.add_frame.configure(style="TFrame")
+        for child in self.add_frame.winfo_children():
+            if isinstance(child, ttk.Label): child.configure(style="TLabel")
+
+class BudgetsFrame(BaseFrame):
+    watches = frozenset({'categories', 'budgets'})
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, controller)
+        self.header_label = ttk.Label(self, text="Set Monthly Budgets", style="Header.TLabel")
+        self.header_label.pack(pady=10)
+
+        self.container = ttk.Frame(self, padding="10")
+        self.container.pack(fill=tk.BOTH, expand=True, padx=20)
+        ttk.Label(self.container, text="Category").grid(row=0, column=0, padx=5, pady=5)
+        ttk.Label(self.container, text="Budget Amount").grid(row=0, column=1, padx=5, pady=5)
+        self.budget_rows = RowPool(self.create_budget_row, self.update_budget_row, self.place_budget_row)
+        self.shown = {} # Category -> the stored budget its entry was last filled with
+        
+        ttk.Button(self, text="Save Budgets", command=self.save_budgets).pack(pady=20)
+
+    def refresh_data(self):
+        self.budget_rows.sync([(category, (category, self.data['budgets'].get(category, ""))) for category in sorted(self.data['categories'])])
+        for category in self.shown.keys() - self.budget_rows.rows.keys(): del self.shown[category] # Rows destroyed with their category
+
+    def create_budget_row(self, category):
+        return ttk.Label(self.container, text=category), ttk.Entry(self.container, width=15)
+
+    def update_budget_row(self, row, value):
+        """Leaves an entry being typed in, or holding an edit not saved yet, as it is: refreshes also come while other
+        copies of the app save."""
+        (category, budget), entry = value, row[1]
+        text = str(budget)
+        if str(self.tk.call('focus')) == str(entry) or entry.get() != self.shown.get(category, entry.get()): return
+        if entry.get() != text: entry.delete(0, tk.END); entry.insert(0, text)
+        self.shown[category] = text
+
+    def place_budget_row(self, row, position):
+        label, entry = row
+        label.grid(row=position + 1, column=0, sticky='w', padx=5, pady=3)
+        entry.grid(row=position + 1, column=1, sticky='e', padx=5, pady=3)
+
+    def save_budgets(self):
+        budgets = {}
+        for category, (_, entry) in self.budget_rows.rows.items():
+            value = entry.get().strip()
+            try: budgets[category] = float(value) if value else None
+            except ValueError: messagebox.showerror("Invalid Input", f"Enter a valid number for '{category}'."); return
+        changed = self.controller.ledger.set_budgets(budgets)
+        messagebox.showinfo("Success", "Budgets updated.")
+        self.shown.clear() # The edits are saved; show the stored values again
+        self.controller.notify_changed(*changed)
+
+    def update_styles(self, theme):
+        super().update_styles(theme)
+        self.header_label.configure(style="Header.TLabel")
+        for child in self.container.winfo_children():
+            if isinstance(child, ttk.Label): child.configure(style="TLabel")
+
+class LoansFrame(BaseFrame):
+    watches = frozenset({'loans'})
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, controller)
+        self.header_label = ttk.Label(self, text="Manage Loans", style="Header.TLabel")
+        self.header_label.pack(pady=10)
+
+        tree_frame = ttk.Frame(self, padding=10)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        
+        cols = ('Loan Name', 'Total Amount', 'Remaining Balance', 'Rate', 'Monthly Payment', 'Paid Off', 'Interest Left')
+        self.tree = ttk.Treeview(tree_frame, columns=cols, show='headings')
+        for col in cols: self.tree.heading(col, text=col); self.tree.column(col, width=120)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        self.button_frame = ttk.Frame(self)
+        self.button_frame.pack(pady=10)
+        
+        ttk.Button(self.button_frame, text="Add Loan", command=self.add_loan).pack(side=tk.LEFT, padx=10)
+        ttk.Button(self.button_frame, text="Edit Selected", command=self.edit_loan).pack(side=tk.LEFT, padx=10)
+        ttk.Button(self.button_frame, text="Delete Selected", command=self.delete_loan).pack(side=tk.LEFT, padx=10)
+        ttk.Button(self.button_frame, text="Payoff Schedule", command=self.show_schedule).pack(side=tk.LEFT, padx=10)
+
+    def refresh_data(self):
+        self.tree.delete(*self.tree.get_children())
+        projections = self.controller.ledger.loan_projections()
+        for loan in self.data['loans']:
+            projection = projections[loan['name']]
+            if projection is None: plan = ("-", "-", "-")
+            elif projection.months is None: plan = (f"{loan['payment']:,.2f}", "Never", "-")
+            else: plan = (f"{loan['payment']:,.2f}", projection.payoff, f"{projection.interest:,.2f}")
+            self.tree.insert("", "end", values=(loan['name'], f"{loan['total_amount']:,.2f}", f"{loan['remaining_balance']:,.2f}",
+                                                f"{loan.get('rate', 0):.2f}%", *plan))
+
+    def add_loan(self):
+        self.show_loan_popup("Add New Loan")
+
+    def edit_loan(self):
+        if not self.tree.focus(): messagebox.showwarning("No Selection", "Please select a loan to edit."); return
+        loan_name = self.tree.item(self.tree.focus())['values'][0]
+        loan_data = next((l for l in self.data['loans'] if l['name'] == loan_name), None)
+        if loan_data: self.show_loan_popup("Edit Loan", loan_data=loan_data)
+        else: messagebox.showerror("Error", "Could not find selected loan.")
+
+    def delete_loan(self):
+        if not self.tree.focus(): messagebox.showwarning("No Selection", "Please select a loan to delete."); return
+        loan_name = self.tree.item(self.tree.focus())['values'][0]
+        if messagebox.askyesno("Confirm", f"Delete loan '{loan_name}'?"):
+            self.controller.notify_changed(*self.controller.ledger.delete_loan(loan_name))
+
+    def show_schedule(self):
+        if not self.tree.focus(): messagebox.showwarning("No Selection", "Please select a loan."); return
+        loan_name = self.tree.item(self.tree.focus())['values'][0]
+        ledger = self.controller.ledger
+        if ledger.loan_projection(loan_name) is None:
+            messagebox.showinfo("No Repayment Plan", "Edit the loan to set its monthly payment or term first."); return
+        popup = tk.Toplevel(self); popup.title(f"Payoff Schedule: {loan_name}"); popup.geometry("640x520")
+        popup.transient(self.controller)
+        theme = LIGHT_THEME if self.controller.theme_mode.get() == 'light' else DARK_THEME
+        popup.configure(bg=theme["FRAME"])
+
+        frame = ttk.Frame(popup, padding=10); frame.pack(expand=True, fill=tk.BOTH)
+        controls = ttk.Frame(frame); controls.pack(fill=tk.X)
+        ttk.Label(controls, text="Extra each month:").pack(side=tk.LEFT, padx=5)
+        extra_entry = ttk.Entry(controls, width=10); extra_entry.pack(side=tk.LEFT, padx=5); extra_entry.insert(0, "0")
+        summary_label = ttk.Label(frame, text=""); summary_label.pack(fill=tk.X, pady=5)
+        cols = ('Month', 'Payment', 'Interest', 'Principal', 'Balance')
+        tree = ttk.Treeview(frame, columns=cols, show='headings')
+        for col in cols: tree.heading(col, text=col); tree.column(col, width=110, anchor='e')
+        scrollbar = ttk.Scrollbar(frame, orient="vertical", command=tree.yview)
+        tree.configure(yscrollcommand=scrollbar.set)
+        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        tree.pack(fill=tk.BOTH, expand=True)
+
+        def show():
+            try: extra = float(extra_entry.get() or 0)
+            except ValueError: messagebox.showerror("Invalid Input", "Enter the extra payment as a number.", parent=popup); return
+            if extra < 0: messagebox.showerror("Invalid Input", "The extra payment cannot be negative.", parent=popup); return
+            plan, scenario = ledger.loan_projection(loan_name), ledger.loan_projection(loan_name, extra)
+            if scenario.months is None: summary_label.configure(text="The payment does not cover the interest; this loan is never paid off.")
+            elif extra and plan.months is not None:
+                summary_label.configure(text=f"Paid off {scenario.payoff}, {plan.months - scenario.months} month(s) sooner, "
+                                             f"saving {plan.interest - scenario.interest:,.2f} in interest.")
+            else: summary_label.configure(text=f"Paid off {scenario.payoff} after {scenario.months} payment(s), "
+                                                f"{scenario.interest:,.2f} in interest.")
+            tree.delete(*tree.get_children())
+            for month, payment, interest, principal, balance in ledger.loan_schedule(loan_name, extra):
+                tree.insert("", "end", values=(month, f"{payment:,.2f}", f"{interest:,.2f}", f"{principal:,.2f}", f"{balance:,.2f}"))
+
+        ttk.Button(controls, text="Show", command=show).pack(side=tk.LEFT, padx=5)
+        extra_entry.bind('<Return>', lambda e: show())
+        show()
+
+    def show_loan_popup(self, title, loan_data=None):
+        popup = tk.Toplevel(self); popup.title(title); popup.geometry("380x300")
+        popup.transient(self.controller); popup.grab_set()
+        theme = LIGHT_THEME if self.controller.theme_mode.get() == 'light' else DARK_THEME
+        popup.configure(bg=theme["FRAME"])
+        
+        frame = ttk.Frame(popup, padding=20); frame.pack(expand=True, fill=tk.BOTH)
+        ttk.Label(frame, text="Loan Name:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        name_entry = ttk.Entry(frame, width=25); name_entry.grid(row=0, column=1, padx=5, pady=5)
+        ttk.Label(frame, text="Total Amount:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        amount_entry = ttk.Entry(frame, width=25); amount_entry.grid(row=1, column=1, padx=5, pady=5)
+        ttk.Label(frame, text="Interest Rate (% a year):").grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        rate_entry = ttk.Entry(frame, width=25); rate_entry.grid(row=2, column=1, padx=5, pady=5)
+        ttk.Label(frame, text="Term (months left):").grid(row=3, column=0, padx=5, pady=5, sticky="w")
+        term_entry = ttk.Entry(frame, width=25); term_entry.grid(row=3, column=1, padx=5, pady=5)
+        ttk.Label(frame, text="Monthly Payment:").grid(row=4, column=0, padx=5, pady=5, sticky="w")
+        payment_entry = ttk.Entry(frame, width=25); payment_entry.grid(row=4, column=1, padx=5, pady=5)
+        ttk.Label(frame, text="Leave the payment empty to work it out from the term.").grid(row=5, column=0, columnspan=2, padx=5)
+
+        if loan_data:
+            name_entry.insert(0, loan_data['name']); amount_entry.insert(0, loan_data['total_amount'])
+            rate_entry.insert(0, loan_data.get('rate') or 0)
+            if loan_data.get('term_months'): term_entry.insert(0, loan_data['term_months'])
+            if loan_data.get('payment'): payment_entry.insert(0, loan_data['payment'])
+
+        def save():
+            ledger = self.controller.ledger
+            try:
+                new_total = float(amount_entry.get())
+                rate = float(rate_entry.get() or 0)
+                term = int(term_entry.get()) if term_entry.get().strip() else None
+                payment = float(payment_entry.get()) if payment_entry.get().strip() else None
+                if loan_data: changed = ledger.edit_loan(loan_data['name'], name_entry.get(), new_total, rate, term, payment)
+                else: changed = ledger.add_loan(name_entry.get(), new_total, rate, term, payment)
+            except LedgerError as e: messagebox.showerror("Invalid Input", str(e), parent=popup); return
+            except ValueError: messagebox.showerror("Invalid Input", "Enter valid positive numbers; the term in whole months.", parent=popup); return
+            self.controller.notify_changed(*changed); popup.destroy()
+
+        ttk.Button(frame, text="Save", command=save).grid(row=6, column=0, columnspan=2, pady=10)
+
+    def update_styles(self, theme):
+        super().update_styles(theme)
+        self.header_label.configure(style="Header.TLabel")
+        self.button_frame.configure(style="TFrame")
+
+class ReportsFrame(BaseFrame):
+    watches = frozenset({'accounts', 'categories', 'transactions', 'loans', 'balance_events'})
+    GROUPINGS = {'Category': 'category', 'Account': 'account'}
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, controller)
+        self.header_label = ttk.Label(self, text="Reports", style="Header.TLabel")
+        self.header_label.pack(pady=10)
+
+        self.controls_frame = ttk.Frame(self)
+        self.controls_frame.pack(pady=5)
+        ttk.Label(self.controls_frame, text="Period:").pack(side=tk.LEFT, padx=5)
+        self.period_var = tk.StringVar(value=f"{REPORT_PERIODS[0]} months")
+        period_menu = ttk.Combobox(self.controls_frame, textvariable=self.period_var, state='readonly', width=12,
+                                   values=[f"{months} months" for months in REPORT_PERIODS])
+        period_menu.pack(side=tk.LEFT, padx=5)
+        ttk.Label(self.controls_frame, text="Group by:").pack(side=tk.LEFT, padx=5)
+        self.grouping_var = tk.StringVar(value="Category")
+        grouping_menu = ttk.Combobox(self.controls_frame, textvariable=self.grouping_var, values=list(self.GROUPINGS), state='readonly', width=12)
+        grouping_menu.pack(side=tk.LEFT, padx=5)
+        for menu in (period_menu, grouping_menu): menu.bind("<<ComboboxSelected>>", lambda e: self.refresh_data())
+
+        trend_frame = ttk.Frame(self, padding=10)
+        trend_frame.pack(fill=tk.BOTH, expand=True, padx=20)
+        self.trend_tree = ttk.Treeview(trend_frame, show='headings', height=10)
+        trend_scrollbar = ttk.Scrollbar(trend_frame, orient="horizontal", command=self.trend_tree.xview)
+        self.trend_tree.configure(xscrollcommand=trend_scrollbar.set)
+        trend_scrollbar.pack(side=tk.BOTTOM, fill=tk.X)
+        self.trend_tree.pack(fill=tk.BOTH, expand=True)
+
+        flow_frame = ttk.Frame(self, padding=10)
+        flow_frame.pack(fill=tk.BOTH, expand=True, padx=20)
+        cols = ('Month', 'Added', 'Spent', 'Net', 'Balance at Month End')
+        self.flow_tree = ttk.Treeview(flow_frame, columns=cols, show='headings', height=8)
+        for col in cols: self.flow_tree.heading(col, text=col)
+        flow_scrollbar = ttk.Scrollbar(flow_frame, orient="vertical", command=self.flow_tree.yview)
+        self.flow_tree.configure(yscrollcommand=flow_scrollbar.set)
+        flow_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.flow_tree.pack(fill=tk.BOTH, expand=True)
+
+    def refresh_data(self):
+        today = datetime.now()
+        months = months_back(today.year, today.month, int(self.period_var.get().split()[0]))
+        trend = spending_trend(self.controller.storage, months, self.GROUPINGS[self.grouping_var.get()])
+
+        cols = (self.grouping_var.get(), *months, 'Total')
+        self.trend_tree.delete(*self.trend_tree.get_children())
+        self.trend_tree['columns'] = cols
+        for col in cols:
+            self.trend_tree.heading(col, text=col)
+            self.trend_tree.column(col, width=140 if col == cols[0] else 80, anchor='w' if col == cols[0] else 'e', stretch=False)
+        for name, totals in sorted(trend.items()):
+            self.trend_tree.insert("", "end", values=(name, *(f"{total:,.2f}" for total in totals), f"{sum(totals):,.2f}"))
+        if trend:
+            month_totals = [sum(column) for column in zip(*trend.values())]
+            self.trend_tree.insert("", "end", values=("Total", *(f"{total:,.2f}" for total in month_totals), f"{sum(month_totals):,.2f}"))
+
+        self.flow_tree.delete(*self.flow_tree.get_children())
+        if self.controller.storage.loading: return # Balances need every transaction; the page refreshes when loading ends
+        for row in reversed(cash_flow(self.controller.ledger, months)):
+            self.flow_tree.insert("", "end", values=(row[0], *(f"{value:,.2f}" for value in row[1:])))
+
+    def update_styles(self, theme):
+        super().update_styles(theme)
+        self.header_label.configure(style="Header.TLabel")
+        self.controls_frame.configure(style="TFrame")
+
+class RecurringFrame(BaseFrame):
+    watches = frozenset({'accounts', 'loans', 'recurring'})
+    WINDOWS = {'Next 30 days': 30, 'Next 90 days': 90, 'Next 365 days': 365}
+
+    def __init__(self, parent, controller):
+        super().__init__(parent, controller)
+        self.header_label = ttk.Label(self, text="Recurring Payments", style="Header.TLabel")
+        self.header_label.pack(pady=10)
+
+        tree_frame = ttk.Frame(self, padding=10)
+        tree_frame.pack(fill=tk.BOTH, expand=True, padx=20)
+        cols = ('Description', 'Amount', 'Category', 'Account', 'Repeats', 'Next Due')
+        self.tree = ttk.Treeview(tree_frame, columns=cols, show='headings', height=8)
+        for col in cols: self.tree.heading(col, text=col)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+
+        self.button_frame = ttk.Frame(self)
+        self.button_frame.pack(pady=5)
+        ttk.Button(self.button_frame, text="Add Recurring", command=self.show_recurring_popup).pack(side=tk.LEFT, padx=10)
+        ttk.Button(self.button_frame, text="Delete Selected", command=self.delete_recurring).pack(side=tk.LEFT, padx=10)
+
+        self.controls_frame = ttk.Frame(self)
+        self.controls_frame.pack(pady=5)
+        ttk.Label(self.controls_frame, text="Upcoming:").pack(side=tk.LEFT, padx=5)
+        self.window_var = tk.StringVar(value=next(iter(self.WINDOWS)))
+        window_menu = ttk.Combobox(self.controls_frame, textvariable=self.window_var, values=list(self.WINDOWS), state='readonly', width=14)
+        window_menu.pack(side=tk.LEFT, padx=5)
+        window_menu.bind("<<ComboboxSelected>>", lambda e: self.refresh_upcoming())
+
+        upcoming_frame = ttk.Frame(self, padding=10)
+        upcoming_frame.pack(fill=tk.BOTH, expand=True, padx=20)
+        cols = ('Date', 'Description', 'Amount', 'Category', 'Account')
+        self.upcoming_tree = ttk.Treeview(upcoming_frame, columns=cols, show='headings', height=8)
+        for col in cols: self.upcoming_tree.heading(col, text=col)
+        upcoming_scrollbar = ttk.Scrollbar(upcoming_frame, orient="vertical", command=self.upcoming_tree.yview)
+        self.upcoming_tree.configure(yscrollcommand=upcoming_scrollbar.set)
+        upcoming_scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        self.upcoming_tree.pack(fill=tk.BOTH, expand=True)
+
+    def refresh_data(self):
+        self.tree.delete(*self.tree.get_children())
+        for rule in self.data['recurring']:
+            due = next_due(rule)
+            self.tree.insert("", "end", iid=rule['id'], values=(rule['description'], f"{rule['amount']:,.2f}", rule['category'],
+                             rule['account_name'], frequency_text(rule), due.isoformat() if due else "Ended"))
+        self.refresh_upcoming()
+
+    def refresh_upcoming(self):
+        """Works out only the occurrences inside the chosen window."""
+        today = datetime.now()
+        last = today + timedelta(days=self.WINDOWS[self.window_var.get()])
+        self.upcoming_tree.delete(*self.upcoming_tree.get_children())
+        for day, rule in self.controller.ledger.upcoming_payments(today.strftime("%Y-%m-%d"), last.strftime("%Y-%m-%d")):
+            self.upcoming_tree.insert("", "end", values=(day.isoformat(), rule['description'], f"{rule['amount']:,.2f}",
+                                                         rule['category'], rule['account_name']))
+
+    def delete_recurring(self):
+        if not self.tree.focus(): messagebox.showwarning("No Selection", "Please select a recurring payment."); return
+        description = self.tree.item(self.tree.focus())['values'][0]
+        if messagebox.askyesno("Confirm", f"Stop the recurring payment '{description}'? Payments already made stay."):
+            self.controller.notify_changed(*self.controller.ledger.delete_recurring(int(self.tree.focus())))
+
+    def show_recurring_popup(self):
+        if not self.data['accounts']: messagebox.showwarning("No Accounts", "Add an account first."); return
+        popup = tk.Toplevel(self); popup.title("Add Recurring Payment"); popup.geometry("420x360")
+        popup.transient(self.controller); popup.grab_set()
+        theme = LIGHT_THEME if self.controller.theme_mode.get() == 'light' else DARK_THEME
+        popup.configure(bg=theme["FRAME"])
+
+        frame = ttk.Frame(popup, padding=20); frame.pack(expand=True, fill=tk.BOTH)
+        ttk.Label(frame, text="Description:").grid(row=0, column=0, padx=5, pady=5, sticky="w")
+        desc_entry = ttk.Entry(frame, width=25); desc_entry.grid(row=0, column=1, padx=5, pady=5); desc_entry.focus()
+        ttk.Label(frame, text="Amount:").grid(row=1, column=0, padx=5, pady=5, sticky="w")
+        amount_entry = ttk.Entry(frame, width=25); amount_entry.grid(row=1, column=1, padx=5, pady=5)
+        ttk.Label(frame, text="Type/Category:").grid(row=2, column=0, padx=5, pady=5, sticky="w")
+        category_var = tk.StringVar()
+        ttk.Combobox(frame, textvariable=category_var, values=self.controller.ledger.payment_categories(), state='readonly',
+                     width=23).grid(row=2, column=1, padx=5, pady=5)
+        ttk.Label(frame, text="Account:").grid(row=3, column=0, padx=5, pady=5, sticky="w")
+        account_var = tk.StringVar(value=self.data['accounts'][0]['name'])
+        ttk.Combobox(frame, textvariable=account_var, values=[acc['name'] for acc in self.data['accounts']], state='readonly',
+                     width=23).grid(row=3, column=1, padx=5, pady=5)
+        ttk.Label(frame, text="Repeat every:").grid(row=4, column=0, padx=5, pady=5, sticky="w")
+        repeat_frame = ttk.Frame(frame); repeat_frame.grid(row=4, column=1, padx=5, pady=5, sticky="w")
+        interval_entry = ttk.Entry(repeat_frame, width=4); interval_entry.pack(side=tk.LEFT); interval_entry.insert(0, "1")
+        frequency_var = tk.StringVar(value='monthly')
+        ttk.Combobox(repeat_frame, textvariable=frequency_var, values=FREQUENCIES, state='readonly', width=10).pack(side=tk.LEFT, padx=5)
+        ttk.Label(frame, text="First Date (YYYY-MM-DD):").grid(row=5, column=0, padx=5, pady=5, sticky="w")
+        start_entry = ttk.Entry(frame, width=25); start_entry.grid(row=5, column=1, padx=5, pady=5)
+        start_entry.insert(0, datetime.now().strftime("%Y-%m-%d"))
+        ttk.Label(frame, text="Last Date (optional):").grid(row=6, column=0, padx=5, pady=5, sticky="w")
+        end_entry = ttk.Entry(frame, width=25); end_entry.grid(row=6, column=1, padx=5, pady=5)
+
+        def save():
+            ledger = self.controller.ledger
+            try:
+                changed = ledger.add_recurring(start_entry.get(), float(amount_entry.get()), category_var.get(), account_var.get(),
+                                               frequency_var.get(), int(interval_entry.get()), end_entry.get().strip() or None,
+                                               desc_entry.get() or "N/A")
+            except LedgerError as e: messagebox.showerror("Invalid Input", str(e), parent=popup); return
+            except ValueError: messagebox.showerror("Invalid Input", "Enter a positive amount and a whole number of repeats.", parent=popup); return
+            self.controller.notify_changed(*changed); popup.destroy()
+            self.controller.post_recurring() # A first date in the past is caught up on straight away
+
+        ttk.Button(frame, text="Save", command=save).grid(row=7, column=0, columnspan=2, pady=10)
+
+    def update_styles(self, theme):
+        super().update_styles(theme)
+        self.header_label.configure(style="Header.TLabel")
+        self.button_frame.configure(style="TFrame")
+        self.controls_frame.configure(style="TFrame")
+
+# --- Instrumentation ---
+def time_commands(widget_class):
+    """Times the command of every widget_class created or configured from now on, under the widget's text."""
+    original_init, original_configure = widget_class.__init__, widget_class.configure
+    def wrap(options, text):
+        if callable(options.get('command')): options['command'] = instrumentation.timed(f"command[{text}]")(options['command'])
+    def init(self, master=None, **options):
+        wrap(options, options.get('text', ""))
+        original_init(self, master, **options)
+    def configure(self, cnf=None, **options):
+        wrap(options, options.get('text') or self.cget('text'))
+        return original_configure(self, cnf, **options)
+    widget_class.__init__, widget_class.configure, widget_class.config = init, configure, configure
+
+def install_instrumentation():
+    """Hooks the timers and counters into the Tk side of the app. Only called when instrumentation is on."""
+    for frame_class in BaseFrame.__subclasses__(): instrumentation.instrument_methods(frame_class, 'refresh_data')
+    instrumentation.instrument_methods(BudgetApp, 'apply_theme', 'notify_changed')
+    time_commands(ttk.Button)
+
+    original_setup, original_destroy, original_insert = tk.BaseWidget._setup, tk.BaseWidget.destroy, ttk.Treeview.insert
+    def setup(self, master, cnf):
+        instrumentation.count(f"widgets created ({type(self).__name__})")
+        return original_setup(self, master, cnf)
+    def destroy(self):
+        instrumentation.count(f"widgets destroyed ({type(self).__name__})")
+        return original_destroy(self)
+    def insert(self, parent, index, iid=None, **kw):
+        instrumentation.count('treeview items inserted')
+        return original_insert(self, parent, index, iid, **kw)
+    tk.BaseWidget._setup, tk.BaseWidget.destroy, ttk.Treeview.insert = setup, destroy, insert
+
+# --- Main execution ---
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Finances")
+    parser.add_argument('--instrument', action='store_true', help="Log how long refreshes, saves and button commands take")
+    parser.add_argument('--profile', metavar='FILE', help="Write a cProfile dump of the session to FILE")
+    parser.add_argument('--api-port', type=int, default=int(os.environ.get("BUDGET_TRACKER_API_PORT") or 0) or None,
+                        help="Serve the local HTTP/JSON API on this port while the app runs (see budget_tracker/api.py)")
+    options, _ = parser.parse_known_args()
+    if options.instrument or options.profile: instrumentation.enable(profile_to=options.profile)
+    else: instrumentation.enable_from_environment()
+    if instrumentation.enabled: install_instrumentation()
+
+    app = BudgetApp(options.api_port)
+    app.protocol("WM_DELETE_WINDOW", app.on_closing)
+    app.mainloop()
@@ -0,0 +1,143 @@
+"""Two copies of the app sharing one set of data files (JsonStorage.sync and reload, merging.py, persistence.Journal).
+
+Each test opens two ledgers on a generated data set in a temporary directory, has them change it at the same time,
+lets them take in each other's records, and checks that both copies and a fresh one agree and that every balance
+still adds up."""
+import pytest
+
+from benchmarks.generate import generate
+from budget_tracker.core import Ledger, persistence
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # The data files are looked up relative to the working directory
+    generate(str(tmp_path), 300, seed=1)
+    return tmp_path
+
+@pytest.fixture
+def copies(data_dir):
+    first, second = Ledger.open('json'), Ledger.open('json')
+    first.balance_history() # Accounts from before balance events were kept get their opening events
+    settle(first, second)
+    yield first, second
+    for ledger in (first, second): ledger.storage.writer.close(); ledger.storage.journal.close()
+
+def settle(*ledgers):
+    """Has each copy write its records and take in the others' until none is left waiting."""
+    overridden = []
+    for _ in range(3):
+        for ledger in ledgers:
+            ledger.storage.writer.flush()
+            overridden += ledger.sync().overridden
+            ledger.storage.writer.flush()
+    return overridden
+
+def state(ledger):
+    transactions = sorted((t['id'], t['date'], t['amount'], t['category'], t['account_name'], t['description'])
+                          for t in ledger.storage.find_transactions())
+    return (transactions, sorted((acc['name'], round(acc['balance'], 6)) for acc in ledger.data['accounts']),
+            sorted((loan['name'], round(loan['remaining_balance'], 6)) for loan in ledger.data['loans']),
+            ledger.data['budgets'], sorted(ledger.data['categories']), ledger.data['balance_events'])
+
+def assert_agree(first, second):
+    """Both copies and a copy opened afresh hold the same data, and every balance matches its history."""
+    settle(first, second)
+    assert state(first) == state(second)
+    fresh = Ledger.open('json')
+    try:
+        assert state(fresh) == state(first)
+        for ledger in (first, second, fresh): assert ledger.check_integrity() == []
+    finally: fresh.storage.writer.close(); fresh.storage.journal.close()
+
+def test_concurrent_adds_take_different_ids(copies):
+    first, second = copies
+    first.commit(*first.add_payment("2025-03-01", 12.5, "Category 1", "Account 1", "First"))
+    second.commit(*second.add_payment("2025-03-02", 7.25, "Category 2", "Account 2", "Second"))
+    assert_agree(first, second)
+    added = [t for t in first.storage.find_transactions() if t['description'] in ("First", "Second")]
+    assert len(added) == 2 and added[0]['id'] != added[1]['id']
+
+def test_edit_against_delete(copies):
+    first, second = copies
+    trans = dict(first.storage.find_transactions(category="Category 3")[0])
+    first.commit(*first.edit_payment(trans['id'], trans['date'], trans['amount'] + 10, "Category 4", trans['account_name']))
+    second.commit(*second.delete_payment(trans['id']))
+    assert_agree(first, second)
+    assert first.storage.get_transaction(trans['id']) is None # A deleted payment stays deleted
+
+def test_later_edit_wins(copies):
+    first, second = copies
+    trans = dict(first.storage.find_transactions(category="Category 5")[0])
+    first.commit(*first.edit_payment(trans['id'], trans['date'], trans['amount'] + 5, "Category 6", trans['account_name']))
+    first.storage.writer.flush()
+    second.commit(*second.edit_payment(trans['id'], trans['date'], trans['amount'] + 1, trans['category'], trans['account_name'],
+                                       "Renamed"))
+    assert_agree(first, second) # The balances count the payment once, as second left it
+    merged = first.storage.get_transaction(trans['id'])
+    assert (merged['amount'], merged['category'], merged['description']) == (trans['amount'] + 1, trans['category'], "Renamed")
+
+def test_recategorize_against_payment(copies):
+    first, second = copies
+    loan = first.loan("Loan 1")
+    first.commit(*first.edit_loan("Loan 1", "Car", loan['total_amount']))
+    second.commit(*second.add_payment("2025-04-01", 100.0, "Category 1", "Account 1", "Groceries"))
+    assert_agree(first, second)
+    assert not first.storage.find_transactions(category="Loan: Loan 1")
+    assert first.storage.find_transactions(category="Loan: Car")
+
+def test_budget_conflict_keeps_first_saved(copies):
+    first, second = copies
+    first.commit(*first.set_budgets({"Category 1": 100}))
+    first.storage.writer.flush()
+    second.commit(*second.set_budgets({"Category 1": 200, "Category 2": 50}))
+    overridden = settle(second, first)
+    assert_agree(first, second)
+    assert first.data['budgets']["Category 1"] == 100 and first.data['budgets']["Category 2"] == 50
+    assert overridden == ["budgets: Category 1"]
+
+def test_concurrent_funds_both_counted(copies):
+    first, second = copies
+    before = first.account("Account 1")['balance']
+    first.commit(*first.add_funds("Account 1", 40))
+    second.commit(*second.add_funds("Account 1", 2))
+    assert_agree(first, second)
+    assert first.account("Account 1")['balance'] == pytest.approx(before + 42)
+
+def test_balance_events_appended_one_record_each(copies):
+    first, second = copies
+    events = len(first.data['balance_events'])
+    first.commit(*first.add_funds("Account 1", 40))
+    second.commit(*second.transfer("Account 2", "Account 3", 15))
+    assert_agree(first, second)
+    assert len(first.data['balance_events']) == events + 3 # Funds, and both sides of the transfer
+    with open(persistence.JOURNAL_FILE) as f: journal = f.read()
+    assert '"op":"set","key":"balance_events"' not in journal.replace(' ', '')
+
+def test_opening_events_recorded_once(data_dir):
+    first, second = Ledger.open('json'), Ledger.open('json')
+    try:
+        first.balance_history(); second.balance_history() # Both open the accounts from before balance events were kept
+        assert_agree(first, second)
+        assert sum(e['kind'] == 'open' for e in first.data['balance_events']) == len(first.data['accounts'])
+    finally:
+        for ledger in (first, second): ledger.storage.writer.close(); ledger.storage.journal.close()
+
+def test_reload_after_other_copy_compacted(copies, monkeypatch):
+    first, second = copies
+    monkeypatch.setattr(persistence, 'JOURNAL_COMPACT_THRESHOLD', 5)
+    trans = dict(first.storage.find_transactions(category="Category 6")[0])
+    first.commit(*first.add_funds("Account 3", 1))
+    first.storage.writer.flush()
+    # second's records wait behind first's, which it hasn't read, while first folds the journal into a new snapshot
+    second.commit(*second.edit_payment(trans['id'], trans['date'], trans['amount'] + 1, trans['category'], trans['account_name']))
+    second.commit(*second.add_payment("2025-05-01", 3.0, "Category 7", "Account 2", "Second's"))
+    second.commit(*second.add_funds("Account 1", 4))
+    second.storage.writer.flush()
+    assert second.storage.journal.pending
+    for day in range(1, 8):
+        first.commit(*first.add_payment(f"2025-06-0{day}", float(day), "Category 8", "Account 3", "First's"))
+        first.storage.writer.flush()
+    assert second.storage.journal.poll() and second.storage.journal.missed
+    assert_agree(first, second)
+    assert first.storage.get_transaction(trans['id'])['amount'] == pytest.approx(trans['amount'] + 1)
+    assert len(first.storage.find_transactions(text="Second's")) == 1
@@ -0,0 +1,80 @@
+"""The binary snapshot (binary.py) and the columnar store (indexes.ColumnarTransactionStore) against their plain forms."""
+from itertools import compress
+
+import pytest
+
+from benchmarks.generate import generate
+from budget_tracker.core import Ledger, persistence
+from budget_tracker.core.indexes import ColumnarTransactionStore, TransactionStore
+
+@pytest.fixture
+def data_dir(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path) # The data files are looked up relative to the working directory
+    generate(str(tmp_path), 500, seed=1)
+    return tmp_path
+
+def test_binary_round_trip(data_dir):
+    original = persistence.read_snapshot(persistence.DATA_FILE)
+    assert persistence.convert_snapshot(True) == persistence.BINARY_FILE
+    assert persistence.read_snapshot(persistence.BINARY_FILE) == original
+    persistence.convert_snapshot(False)
+    assert persistence.read_snapshot(persistence.DATA_FILE) == original
+
+def test_binary_keeps_unusual_values(data_dir):
+    """Values the fixed-width fields can't hold go in each record's extra JSON and come back unchanged."""
+    transactions = [{"id": 3, "date": "2025-02-30", "description": "Not a day", "amount": 5, "category": "A", "account_name": "B"},
+                    {"id": 2, "date": None, "description": 7, "amount": "12.50", "category": "A", "account_name": "B", "note": [1]},
+                    {"id": 1, "date": "2025-01-01", "description": "Plain", "amount": -0.1, "category": "A", "account_name": "B"}]
+    snapshot = {"accounts": [], "journal_seq": 4, "transactions": transactions}
+    persistence.write_snapshot("unusual.bin", snapshot, binary=True)
+    loaded = persistence.read_snapshot("unusual.bin")
+    assert loaded == snapshot
+    assert [type(t['amount']) for t in loaded['transactions']] == [int, str, float]
+
+def test_ledger_reads_binary_like_json(data_dir):
+    ledger = Ledger.open('json')
+    expected = list(ledger.storage.find_transactions()), ledger.data['accounts']
+    ledger.close()
+    persistence.convert_snapshot(True)
+    ledger = Ledger.open('json')
+    try:
+        assert (list(ledger.storage.find_transactions()), ledger.data['accounts']) == expected
+        assert ledger.check_integrity() == []
+    finally: ledger.close()
+
+QUERIES = [{}, {'category': "Category 2"}, {'date_from': "2024-03-01", 'date_to': "2024-03-31"}, {'date_to': "2022-01-15"},
+           {'amount_min': 20, 'amount_max': 40}, {'sort_by': 'amount', 'reverse': False}, {'sort_by': 'category'},
+           {'ids': [5, 3, 400, 9999], 'sort_by': 'date', 'reverse': False}, {'category': "Category 1", 'date_from': "2025-06-01"}]
+
+def matches(store, plain):
+    for query in QUERIES: assert [t['id'] for t in store.find(**query)] == [t['id'] for t in plain.find(**query)], query
+    assert sorted(store, key=lambda t: t['id']) == sorted(plain, key=lambda t: t['id'])
+
+@pytest.fixture
+def transactions(data_dir):
+    return persistence.read_snapshot(persistence.DATA_FILE)['transactions']
+
+def test_columnar_store_matches_dict_store(transactions):
+    store, plain = ColumnarTransactionStore(transactions), TransactionStore(transactions)
+    matches(store, plain)
+    assert store.spending_by_month().keys() == plain.spending_by_month().keys()
+    for month, cells in plain.spending_by_month().items(): assert store.spending_by_month()[month] == pytest.approx(cells)
+
+def test_columnar_store_follows_changes(transactions):
+    store, plain = ColumnarTransactionStore(transactions), TransactionStore(transactions)
+    frozen = store.snapshot()
+    for target in (store, plain):
+        target.add({"id": None, "date": "2024-03-31", "description": "Added", "amount": 12.0, "category": "New", "account_name": "Account 1"})
+        target.update(10, {"date": "2024-03-01", "amount": 30.5, "category": "Category 2"})
+        for trans_id in range(20, 300): target.delete(trans_id) # Past half the rows, so the columns are compacted
+        target.rename_category("Category 1", "Category 2")
+    assert store.next_id == plain.next_id
+    matches(store, plain)
+    assert len(frozen) == len(transactions) and frozen.get(25) is not None # The snapshot doesn't see later changes
+
+def test_columnar_date_mask_matches_find(transactions):
+    store = ColumnarTransactionStore(transactions)
+    days = sorted({t['date'] for t in transactions}) # Bounds that have transactions on them
+    for start, end in ((days[10], days[40]), (None, days[5]), (days[-3], None), (days[20], days[20])):
+        masked = sorted(compress(store.ids, store.mask_date_range(start, end)))
+        assert masked == sorted(t['id'] for t in store.find(date_from=start, date_to=end)), (start, end)